@@ -0,0 +1,217 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import models, schemas
+from .cache import TTLCache
+from .database import get_session_factory
+
+# Аутентификация Telegram Mini App. Клиент передаёт initData в заголовке
+# "Authorization: tma <initData>" (или X-Telegram-Init-Data); подпись — HMAC-SHA256
+# отсортированных полей ключом, производным от токена бота.
+#
+# Проверенные подписи кэшируются по (hash, auth_date) до истечения initData:
+# повторные запросы той же сессии не разбирают строку и не считают HMAC. По
+# кэшированному ключу возвращается пользователь из проверенных данных, поэтому
+# подмена остальных полей при том же hash ничего не даёт. Пользователь Telegram
+# сопоставляется со строкой users тоже через кэш.
+#
+# Семья по умолчанию (id = 1, данные до включения авторизации) достаётся
+# DEFAULT_FAMILY_OWNER, а если он не задан — первому вошедшему пользователю.
+# Остальные получают свою семью и могут перейти в общую по приглашению:
+# код подписан ключом от токена бота и действует FAMILY_INVITE_TTL секунд.
+#
+# Без BOT_TOKEN проверка выключена (локальный запуск, тесты), и все запросы
+# относятся к семье по умолчанию.
+
+BOT_TOKEN = os.getenv("BOT_TOKEN") or None
+# Сколько секунд initData считается действительной после auth_date
+INIT_DATA_MAX_AGE = int(os.getenv("INIT_DATA_MAX_AGE", "86400"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Привязка пользователя к семье меняется редко
+USER_CACHE_TTL = 300
+# Telegram id владельца семьи по умолчанию; пусто — первый вошедший пользователь
+DEFAULT_FAMILY_OWNER = int(os.getenv("DEFAULT_FAMILY_OWNER")) if os.getenv("DEFAULT_FAMILY_OWNER") else None
+FAMILY_INVITE_TTL = int(os.getenv("FAMILY_INVITE_TTL", "172800"))
+
+verified_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=INIT_DATA_MAX_AGE)
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+@lru_cache(maxsize=4)
+def _secret_key(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def sign_init_data(fields: dict, bot_token: str) -> str:
+    # Подпись в формате Telegram: для тестов и локальной отладки без клиента
+    check = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    digest = hmac.new(_secret_key(bot_token), check.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, "hash": digest})
+
+
+def verify_init_data(
+    init_data: str, bot_token: str, max_age: int = INIT_DATA_MAX_AGE, now: Optional[float] = None
+) -> Tuple[dict, int]:
+    # Возвращает поле user и auth_date; ValueError — подпись неверна или устарела
+    pairs = parse_qsl(init_data, keep_blank_values=True, strict_parsing=True)
+    fields = dict(pairs)
+    if len(fields) != len(pairs):
+        raise ValueError("duplicate fields")
+    received = fields.pop("hash", "")
+    check = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    expected = hmac.new(_secret_key(bot_token), check.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        raise ValueError("bad signature")
+    now = time.time() if now is None else now
+    auth_date = int(fields.get("auth_date", "0"))
+    if now - auth_date > max_age:
+        raise ValueError("expired")
+    user = json.loads(fields.get("user") or "null")
+    if not isinstance(user, dict) or not isinstance(user.get("id"), int):
+        raise ValueError("no user")
+    return user, auth_date
+
+
+def _invite_signature(family_id: int, expires: int, bot_token: str) -> str:
+    key = hmac.new(b"FamilyInvite", bot_token.encode(), hashlib.sha256).digest()
+    return hmac.new(key, f"{family_id}.{expires}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def make_invite(family_id: int, bot_token: str, now: Optional[float] = None) -> Tuple[str, int]:
+    # Код приглашения "<семья>.<срок>.<подпись>" и срок действия (unix time)
+    expires = int(time.time() if now is None else now) + FAMILY_INVITE_TTL
+    return f"{family_id}.{expires}.{_invite_signature(family_id, expires, bot_token)}", expires
+
+
+def check_invite(code: str, bot_token: str, now: Optional[float] = None) -> int:
+    # Семья из кода приглашения; ValueError — код неверен или истёк
+    family_id, expires, signature = code.strip().split(".")
+    family_id, expires = int(family_id), int(expires)
+    if not hmac.compare_digest(_invite_signature(family_id, expires, bot_token).encode(), signature.encode()):
+        raise ValueError("bad signature")
+    if (time.time() if now is None else now) > expires:
+        raise ValueError("expired")
+    return family_id
+
+
+def _field(init_data: str, name: str) -> Optional[str]:
+    # Значение поля без разбора всей строки: hash и auth_date не URL-кодируются
+    prefix = name + "="
+    for part in init_data.split("&"):
+        if part.startswith(prefix):
+            return part[len(prefix):]
+    return None
+
+
+def _init_data(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization", "")
+    scheme, _, value = authorization.partition(" ")
+    if scheme.lower() == "tma" and value:
+        return value
+    return request.headers.get("x-telegram-init-data")
+
+
+async def _unclaimed_default_family(session, telegram_id: int) -> Optional[int]:
+    # Семья по умолчанию для нового пользователя, если она ему положена
+    if DEFAULT_FAMILY_OWNER is not None and telegram_id != DEFAULT_FAMILY_OWNER:
+        return None
+    family = await session.get(models.Family, models.DEFAULT_FAMILY_ID)
+    if family is None:
+        return None
+    if DEFAULT_FAMILY_OWNER is None:
+        res = await session.execute(
+            select(models.User.id).where(models.User.family_id == models.DEFAULT_FAMILY_ID).limit(1)
+        )
+        if res.scalar() is not None:
+            return None
+    return family.id
+
+
+async def _load_user(session_factory, tg_user: dict) -> schemas.CurrentUser:
+    # Строка users для пользователя Telegram; при первом входе — вместе с
+    # семьёй по умолчанию или новой семьёй
+    telegram_id = tg_user["id"]
+    async with session_factory() as session:
+        res = await session.execute(select(models.User).where(models.User.telegram_id == telegram_id))
+        user = res.scalar()
+        if user is None:
+            family_id = await _unclaimed_default_family(session, telegram_id)
+            if family_id is None:
+                family = models.Family(name=f"Семья {tg_user.get('first_name') or tg_user.get('username') or telegram_id}")
+                session.add(family)
+                await session.flush()
+                family_id = family.id
+            dialect_insert = sqlite.insert if session.bind.dialect.name == "sqlite" else postgresql.insert
+            res = await session.execute(
+                dialect_insert(models.User)
+                .values(
+                    telegram_id=telegram_id,
+                    family_id=family_id,
+                    first_name=tg_user.get("first_name"),
+                    username=tg_user.get("username"),
+                )
+                .on_conflict_do_nothing(index_elements=[models.User.telegram_id])
+                .returning(models.User.id)
+            )
+            if res.scalar() is None:
+                # Параллельный первый запрос того же пользователя успел раньше:
+                # своя семья не нужна
+                await session.rollback()
+            else:
+                await session.commit()
+            res = await session.execute(select(models.User).where(models.User.telegram_id == telegram_id))
+            user = res.scalar_one()
+        return schemas.CurrentUser.model_validate(user)
+
+
+async def resolve_user(session_factory, tg_user: dict) -> schemas.CurrentUser:
+    # Общая точка для Mini App и бота: поле user из initData и поле from
+    # сообщения бота имеют одинаковую форму
+    user = user_cache.get(tg_user["id"])
+    if user is None:
+        user = await _load_user(session_factory, tg_user)
+        user_cache.set(tg_user["id"], user)
+    return user
+
+
+async def join_family(session_factory, user: schemas.CurrentUser, family_id: int) -> schemas.CurrentUser:
+    # Данные прежней семьи остаются в ней
+    async with session_factory() as session:
+        if await session.get(models.Family, family_id) is None:
+            raise ValueError("no family")
+        await session.execute(update(models.User).where(models.User.id == user.id).values(family_id=family_id))
+        await session.commit()
+    user_cache.pop(user.telegram_id)
+    return user.model_copy(update={"family_id": family_id})
+
+
+async def get_current_user(
+    request: Request, session_factory=Depends(get_session_factory)
+) -> Optional[schemas.CurrentUser]:
+    if BOT_TOKEN is None:
+        return None
+    init_data = _init_data(request)
+    if not init_data:
+        raise HTTPException(status_code=401, detail="Требуется авторизация Telegram")
+
+    key = (_field(init_data, "hash"), _field(init_data, "auth_date"))
+    tg_user = verified_cache.get(key)
+    if tg_user is None:
+        try:
+            tg_user, auth_date = verify_init_data(init_data, BOT_TOKEN)
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Недействительные данные авторизации Telegram")
+        # Запись живёт не дольше самой initData
+        verified_cache.set(key, tg_user, ttl=auth_date + INIT_DATA_MAX_AGE - time.time())
+
+    return await resolve_user(session_factory, tg_user)
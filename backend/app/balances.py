@@ -0,0 +1,61 @@
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Баланс меняется одним условным UPDATE ... RETURNING: без чтения счёта в
+# Python, без потерянных обновлений при параллельных запросах, а проверка
+# остатка и списание происходят атомарно под блокировкой строки.
+
+
+async def change_balance(
+    session: AsyncSession, family_id: int, account_id: int, delta: Decimal, require_funds: bool = False
+) -> Optional[Decimal]:
+    # Возвращает новый баланс или None, если счёта нет в семье либо не хватает средств
+    stmt = (
+        update(models.Account)
+        .where(models.Account.id == account_id, models.Account.family_id == family_id)
+        .values(balance=models.Account.balance + delta)
+        .returning(models.Account.balance)
+    )
+    if require_funds:
+        stmt = stmt.where(models.Account.balance + delta >= 0)
+    res = await session.execute(stmt)
+    return res.scalar()
+
+
+async def balance_error(
+    session: AsyncSession,
+    family_id: int,
+    account_id: int,
+    not_found: str = "Счет не найден",
+    insufficient: str = "Insufficient funds on account",
+) -> HTTPException:
+    # Медленный путь: выясняем, почему change_balance ничего не обновил
+    res = await session.execute(
+        select(models.Account.id).where(models.Account.id == account_id, models.Account.family_id == family_id)
+    )
+    if res.scalar() is None:
+        return HTTPException(status_code=404, detail=not_found)
+    return HTTPException(status_code=400, detail=insufficient)
+
+
+async def transfer_balance(
+    session: AsyncSession, family_id: int, from_account_id: int, to_account_id: int, amount: Decimal
+):
+    # Строки счетов блокируются в порядке возрастания id, поэтому встречные
+    # переводы между одной парой счетов не могут взаимно заблокироваться
+    steps = sorted([
+        (from_account_id, -amount, True),
+        (to_account_id, amount, False),
+    ])
+    for account_id, delta, require_funds in steps:
+        if await change_balance(session, family_id, account_id, delta, require_funds) is None:
+            raise await balance_error(
+                session, family_id, account_id, not_found="Account not found", insufficient="Insufficient funds"
+            )
+
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import select
+
+from . import auth, models, schemas
+from .bulk import bulk_create
+
+# Вебхук Telegram-бота. Обработчик только кладёт update в ограниченную очередь
+# и сразу отвечает 200, поэтому задержки базы не влияют на таймауты и повторы
+# Telegram. Пул воркеров забирает из очереди пачку updates, разбирает команды
+# и записывает расходы одной пакетной вставкой на семью (app/bulk.py).
+#
+# Очередь живёт в памяти процесса: при переполнении update отбрасывается (и
+# учитывается в метриках), при остановке необработанные updates теряются.
+
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET") or None
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+# Сколько updates воркер забирает из очереди за один проход
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+
+HELP_TEXT = (
+    "Записать расход: /spent <сумма> [категория] [описание]\n"
+    "Например: /spent 500 продукты хлеб и молоко"
+)
+FAILURE_TEXT = "Не удалось записать расход, попробуйте позже"
+
+
+class TelegramClient:
+    # Отправка ответов через Bot API; без токена ответы только пишутся в лог
+    def __init__(self, bot_token: Optional[str], base_url: str = TELEGRAM_API_URL):
+        self.bot_token = bot_token
+        self.base_url = base_url
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def send_message(self, chat_id: int, text: str):
+        if self.bot_token is None:
+            logging.info("Bot reply to %s skipped (no BOT_TOKEN): %s", chat_id, text)
+            return
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10)
+        response = await self._http.post(
+            f"{self.base_url}/bot{self.bot_token}/sendMessage", json={"chat_id": chat_id, "text": text}
+        )
+        response.raise_for_status()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def parse_command(text: str) -> Tuple[Optional[str], str]:
+    # "/spent@family_bot 500 еда" -> ("spent", "500 еда")
+    if not text.startswith("/"):
+        return None, text
+    head, _, rest = text.strip().partition(" ")
+    command = head[1:].split("@", 1)[0].lower()
+    return command, rest.strip()
+
+
+def parse_amount(value: str) -> Optional[Decimal]:
+    try:
+        amount = Decimal(value.replace(",", "."))
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount <= 0 or amount.as_tuple().exponent < -2 or amount >= Decimal("1e12"):
+        return None
+    return amount
+
+
+def match_category(rest: str, categories: Dict[str, int]) -> Tuple[Optional[int], Optional[str]]:
+    # Категория — самое длинное имя категории семьи, с которого начинается
+    # остаток команды (без учёта регистра); остальное — описание
+    lowered = rest.lower()
+    best = None
+    for name in categories:
+        if (lowered == name or lowered.startswith(name + " ")) and (best is None or len(name) > len(best)):
+            best = name
+    if best is None:
+        return None, rest or None
+    return categories[best], rest[len(best):].strip() or None
+
+
+class WebhookDispatcher:
+    def __init__(self, session_factory, client, queue_size: int = WEBHOOK_QUEUE_SIZE):
+        self.session_factory = session_factory
+        self.client = client
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def enqueue(self, update: dict) -> bool:
+        self.received += 1
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logging.warning("Webhook queue is full, update %s dropped", update.get("update_id"))
+            return False
+        return True
+
+    def start(self, workers: int = WEBHOOK_WORKERS) -> List[asyncio.Task]:
+        return [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    def status(self) -> dict:
+        return {
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "received": self.received,
+            "dropped": self.dropped,
+            "processed": self.processed,
+        }
+
+    async def _worker(self):
+        while True:
+            updates = [await self.queue.get()]
+            while len(updates) < WEBHOOK_BATCH_SIZE:
+                try:
+                    updates.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self.process(updates)
+            except Exception:
+                logging.exception("Webhook batch of %d updates failed", len(updates))
+            finally:
+                self.processed += len(updates)
+                for _ in updates:
+                    self.queue.task_done()
+
+    async def process(self, updates: List[dict]):
+        replies = []
+        # Расходы группируются по семье: одна транзакция и одна вставка на семью
+        spent = defaultdict(list)
+        for update in updates:
+            # Ошибка одного обновления (база, странный payload) не должна
+            # терять остальные обновления пачки
+            chat_id = None
+            try:
+                message = update.get("message") or {}
+                text = message.get("text")
+                chat_id = (message.get("chat") or {}).get("id")
+                sender = message.get("from")
+                if not text or chat_id is None or not isinstance(sender, dict) or not isinstance(sender.get("id"), int):
+                    continue
+                command, rest = parse_command(text)
+                if command == "spent":
+                    amount_text, _, rest = rest.partition(" ")
+                    amount = parse_amount(amount_text)
+                    if amount is None:
+                        replies.append((chat_id, HELP_TEXT))
+                        continue
+                    user = await auth.resolve_user(self.session_factory, sender)
+                    spent[user.family_id].append((chat_id, amount, rest.strip()))
+                elif command in ("start", "help"):
+                    replies.append((chat_id, HELP_TEXT))
+            except Exception:
+                logging.exception("Bot update %s not processed", update.get("update_id") if isinstance(update, dict) else None)
+                if chat_id is not None:
+                    replies.append((chat_id, FAILURE_TEXT))
+
+        for family_id, commands in spent.items():
+            try:
+                replies.extend(await self._record_expenses(family_id, commands))
+            except Exception:
+                logging.exception("Bot expenses of family %s not recorded", family_id)
+                replies.extend((chat_id, FAILURE_TEXT) for chat_id, _, _ in commands)
+
+        results = await asyncio.gather(
+            *(self.client.send_message(chat_id, text) for chat_id, text in replies), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logging.warning("Bot reply failed: %s", result)
+
+    async def _record_expenses(self, family_id: int, commands: List[tuple]) -> List[Tuple[int, str]]:
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(models.Account.id, models.Account.balance)
+                .where(models.Account.family_id == family_id)
+                .order_by(models.Account.id)
+                .limit(1)
+            )
+            account = res.first()
+            if account is None:
+                return [(chat_id, "Сначала создайте счёт в приложении") for chat_id, _, _ in commands]
+            account_id, available = account
+            res = await session.execute(
+                select(models.Category.name, models.Category.id).where(models.Category.family_id == family_id)
+            )
+            rows = res.all()
+            categories = {name.lower(): category_id for name, category_id in rows}
+            names = {category_id: name for name, category_id in rows}
+
+            # bulk_create отклоняет списания со счёта целиком, если пакет не
+            # помещается в остаток; сообщения разных людей независимы, поэтому
+            # лишние отсекаются заранее по порядку прихода. Под блокировкой
+            # bulk_create проверяет остаток ещё раз
+            errors = {}
+            items = []
+            for index, (_, amount, rest) in enumerate(commands):
+                category_id, description = match_category(rest, categories)
+                items.append(schemas.ExpenseCreate(
+                    amount=amount, account_id=account_id, category_id=category_id, description=description,
+                ))
+                if amount > available:
+                    errors[index] = "Insufficient funds on account"
+                else:
+                    available -= amount
+            accepted = [index for index in range(len(items)) if index not in errors]
+            if accepted:
+                result = await bulk_create(session, family_id, models.Expense, [items[i] for i in accepted], sign=-1)
+                errors.update((accepted[row.index], row.error) for row in result.results if row.error is not None)
+
+        replies = []
+        for index, ((chat_id, amount, _), item) in enumerate(zip(commands, items)):
+            if index in errors:
+                replies.append((chat_id, f"Расход {amount} не записан: {errors[index]}"))
+            else:
+                text = f"Записан расход {amount}"
+                if item.category_id is not None:
+                    text += f" — {names[item.category_id]}"
+                if item.description:
+                    text += f" ({item.description})"
+                replies.append((chat_id, text))
+        return replies
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import List
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import events, models, schemas
+from .checkpoints import shift_checkpoints
+from .partitions import PARTITIONED_TABLES
+from .rollup import apply_rollup
+from .versions import bump_versions, history
+
+
+async def bulk_create(session: AsyncSession, family_id: int, model, items: List, sign: int) -> schemas.BulkResult:
+    # Пакетная вставка расходов (sign=-1) или доходов (sign=+1):
+    # проверка пакета, один multi-row INSERT и одно изменение баланса на счёт,
+    # всё в одной транзакции
+    account_ids = {item.account_id for item in items}
+    category_ids = {item.category_id for item in items if item.category_id is not None}
+
+    res = await session.execute(
+        select(models.Account.id, models.Account.balance)
+        .where(models.Account.id.in_(account_ids), models.Account.family_id == family_id)
+        .order_by(models.Account.id)
+        .with_for_update()
+    )
+    balances = dict(res.all())
+    known_categories = set()
+    if category_ids:
+        res = await session.execute(
+            select(models.Category.id)
+            .where(models.Category.id.in_(category_ids), models.Category.family_id == family_id)
+        )
+        known_categories = set(res.scalars().all())
+
+    errors = {}
+    deltas = defaultdict(Decimal)
+    for index, item in enumerate(items):
+        if item.account_id not in balances:
+            errors[index] = "Счет не найден"
+        elif item.category_id is not None and item.category_id not in known_categories:
+            errors[index] = "Категория не найдена"
+        else:
+            deltas[item.account_id] += item.amount
+
+    if sign < 0:
+        # Списание проверяется суммарно по счёту: пакет либо помещается в остаток целиком, либо нет
+        overdrawn = {acc_id for acc_id, total in deltas.items() if balances[acc_id] < total}
+        for index, item in enumerate(items):
+            if index not in errors and item.account_id in overdrawn:
+                errors[index] = "Insufficient funds on account"
+        for acc_id in overdrawn:
+            del deltas[acc_id]
+
+    valid = [(index, item) for index, item in enumerate(items) if index not in errors]
+    ids = {}
+    if valid:
+        # Вместе с id возвращается и время операции — ключ секционирования
+        # для последующих запросов по вставленным строкам
+        ts = getattr(model, PARTITIONED_TABLES[model.__tablename__])
+        res = await session.execute(
+            insert(model).returning(model.id, ts, sort_by_parameter_order=True),
+            [{**item.model_dump(exclude_none=True), "family_id": family_id} for _, item in valid],
+        )
+        keys = {index: tuple(row) for (index, _), row in zip(valid, res.all())}
+        ids = {index: row_id for index, (row_id, _) in keys.items()}
+        await apply_rollup(session, model, keys.values(), sign=1)
+        # Операции с явной датой могут попасть в уже закрытые месяцы
+        await shift_checkpoints(session, model, keys.values(), sign)
+
+    for acc_id, total in deltas.items():
+        await session.execute(
+            update(models.Account)
+            .where(models.Account.id == acc_id)
+            .values(balance=models.Account.balance + sign * total)
+        )
+    if ids:
+        await bump_versions(session, family_id, model.__tablename__, history(model.__tablename__), "accounts")
+        # Строки пакета в событие не входят: клиент перечитывает список
+        await events.record(session, family_id, model.__tablename__, "bulk", accounts=deltas.keys())
+    await session.commit()
+
+    return schemas.BulkResult(
+        created=len(ids),
+        results=[
+            schemas.BulkRowResult(index=index, id=ids.get(index), error=errors.get(index))
+            for index in range(len(items))
+        ],
+    )
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    # Ограниченный по размеру LRU-кэш с временем жизни записей.
+    # Используется из одного event loop, поэтому без блокировок.
+    # on_evict вызывается для значений, вытесненных по времени, размеру или при очистке.
+    def __init__(self, maxsize: int, ttl: float, on_evict: Optional[Callable[[Any], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self._evicted(value)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._evicted(self._data.popitem(last=False)[1][1])
+
+    def expire(self) -> int:
+        # Удаляет просроченные записи, к которым больше не обращались
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            self._evicted(self._data.pop(key)[1])
+        return len(expired)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self):
+        values = [value for _, value in self._data.values()]
+        self._data.clear()
+        for value in values:
+            self._evicted(value)
+
+    def _evicted(self, value: Any):
+        if self.on_evict is not None:
+            self.on_evict(value)
+
+    def __len__(self) -> int:
+        return len(self._data)
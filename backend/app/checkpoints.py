@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import select, update, func, cast, null, union_all, Date, Numeric
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .partitions import by_key
+from .rollup import month_start
+
+# Контрольные точки остатков счетов на начало каждого месяца. Остаток на
+# произвольный момент считается от ближайшей точки плюс операции между ними,
+# так что запрос читает не больше месяца операций, а не всю историю счёта.
+# Точки создаются при закрытии месяца (close_months), а операции, добавленные
+# или удалённые задним числом, сдвигают их в той же транзакции (shift_checkpoints).
+
+# Период фонового закрытия месяцев, секунд; 0 — выключить
+CHECKPOINT_INTERVAL = float(os.getenv("BALANCE_CHECKPOINT_INTERVAL", "3600"))
+
+
+def _boundary(month: date) -> datetime:
+    return datetime.combine(month, time.min, tzinfo=timezone.utc)
+
+
+def _prev_month(month: date) -> date:
+    return date(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _ledger(account_id: Optional[int] = None, ts_from: Optional[datetime] = None, ts_to: Optional[datetime] = None):
+    # Все движения по счетам как (счёт, время, сумма со знаком)
+    e, i, t = models.Expense, models.Income, models.Transfer
+    sources = [
+        (e.account_id, e.spent_at, -e.amount),
+        (i.account_id, i.received_at, i.amount),
+        (t.to_account_id, t.transferred_at, t.amount),
+        (t.from_account_id, t.transferred_at, -t.amount),
+    ]
+    branches = []
+    for account_col, ts, amount in sources:
+        branch = select(account_col.label("account_id"), ts.label("occurred_at"), amount.label("amount"))
+        if account_id is not None:
+            branch = branch.where(account_col == account_id)
+        else:
+            branch = branch.where(account_col.is_not(None))
+        if ts_from is not None:
+            branch = branch.where(ts >= ts_from)
+        if ts_to is not None:
+            branch = branch.where(ts < ts_to)
+        branches.append(branch)
+    return union_all(*branches).subquery("ledger")
+
+
+async def close_months(session: AsyncSession, now: Optional[datetime] = None) -> int:
+    # Дописывает недостающие точки до начала текущего месяца включительно.
+    # Возвращает число созданных точек
+    now = now or datetime.now(timezone.utc)
+    current_month = date(now.year, now.month, 1)
+    cp = models.AccountBalanceCheckpoint
+
+    res = await session.execute(select(cp.account_id, func.max(cp.month)).group_by(cp.account_id))
+    latest = dict(res.all())
+    res = await session.execute(select(models.Account.id))
+    pending = {
+        acc_id: latest.get(acc_id)
+        for acc_id in res.scalars().all()
+        if latest.get(acc_id) is None or latest[acc_id] < current_month
+    }
+    if not pending:
+        return 0
+
+    # Текущие остатки и помесячные суммы движений одним запросом, то есть из
+    # одного снимка данных. Счетам без точек нужна вся история
+    known = [month for month in pending.values() if month is not None]
+    since = _boundary(min(known)) if len(known) == len(pending) else None
+    ledger = _ledger(ts_from=since)
+    month = month_start(ledger.c.occurred_at, session.bind.dialect.name)
+    balances = select(models.Account.id, cast(null(), Date), models.Account.balance).where(
+        models.Account.id.in_(pending)
+    )
+    monthly = (
+        select(ledger.c.account_id, month, func.sum(ledger.c.amount))
+        .where(ledger.c.account_id.in_(pending))
+        .group_by(ledger.c.account_id, month)
+    )
+    res = await session.execute(union_all(balances, monthly))
+
+    current = {}
+    deltas = defaultdict(dict)
+    for acc_id, month_value, amount in res.all():
+        if month_value is None:
+            current[acc_id] = amount
+        else:
+            deltas[acc_id][month_value] = amount
+
+    rows = []
+    for acc_id, last in pending.items():
+        months = deltas[acc_id]
+        # Остаток на начало текущего месяца — текущий минус всё, что было после
+        balance = current[acc_id] - sum((v for m, v in months.items() if m >= current_month), Decimal(0))
+        first = _next_month(last) if last else min((m for m in months if m < current_month), default=current_month)
+        boundary = current_month
+        while boundary >= first:
+            rows.append({"account_id": acc_id, "month": boundary, "balance": balance})
+            boundary = _prev_month(boundary)
+            balance -= months.get(boundary, 0)
+
+    if rows:
+        dialect_insert = sqlite.insert if session.bind.dialect.name == "sqlite" else postgresql.insert
+        await session.execute(dialect_insert(cp).on_conflict_do_nothing(), rows)
+    await session.commit()
+    return len(rows)
+
+
+async def shift_checkpoints(session: AsyncSession, model, keys: Iterable[Tuple[int, datetime]], sign: int):
+    # Учитывает в точках после операции её влияние на остаток: sign=-1 для
+    # нового расхода, +1 для удалённого и наоборот для доходов. Операции
+    # задаются парами (id, время). Для удаления вызывать до удаления строк
+    keys = list(keys)
+    if not keys:
+        return
+    operations = by_key(session, model, keys)
+    cp = models.AccountBalanceCheckpoint
+    ts = model.spent_at if model is models.Expense else model.received_at
+    # Месяц операции по UTC, как границы точек (_boundary): сравнение
+    # timestamptz с DATE привело бы дату к поясу сессии
+    month = month_start(ts, session.bind.dialect.name)
+    delta = (
+        select(func.coalesce(func.sum(model.amount), 0))
+        .where(operations, model.account_id == cp.account_id, month < cp.month)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(cp)
+        .where(cp.account_id.in_(select(model.account_id).where(operations)))
+        .values(balance=cp.balance + sign * delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def balance_at(
+    session: AsyncSession, family_id: int, account_id: int, at: datetime
+) -> Optional[Tuple[Decimal, Optional[date]]]:
+    # Остаток счёта с учётом операций строго раньше at и точка, от которой он
+    # посчитан. None — счёта нет в семье
+    at = at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at.astimezone(timezone.utc)
+    cp = models.AccountBalanceCheckpoint
+    for_account = cp.account_id == account_id
+    res = await session.execute(select(
+        select(models.Account.id)
+        .where(models.Account.id == account_id, models.Account.family_id == family_id)
+        .scalar_subquery(),
+        select(func.max(cp.month)).where(for_account, cp.month <= at.date()).scalar_subquery(),
+        select(func.min(cp.month)).where(for_account, cp.month > at.date()).scalar_subquery(),
+    ))
+    exists, lower, upper = res.one()
+    if exists is None:
+        return None
+
+    # От ближайшей точки: вперёд от предыдущей или назад от следующей.
+    # Без точек — назад от текущего остатка
+    if lower is not None and (upper is None or at - _boundary(lower) <= _boundary(upper) - at):
+        base, sign, ledger = lower, 1, _ledger(account_id, _boundary(lower), at)
+    elif upper is not None:
+        base, sign, ledger = upper, -1, _ledger(account_id, at, _boundary(upper))
+    else:
+        base, sign, ledger = None, -1, _ledger(account_id, at)
+
+    if base is not None:
+        start = select(cp.balance).where(for_account, cp.month == base).scalar_subquery()
+    else:
+        start = select(models.Account.balance).where(models.Account.id == account_id).scalar_subquery()
+    delta = select(func.coalesce(func.sum(ledger.c.amount), 0)).scalar_subquery()
+    res = await session.execute(select(cast(start + sign * delta, Numeric(14, 2))))
+    return res.scalar(), base
+
+
+async def run_periodically(session_factory, interval: float = CHECKPOINT_INTERVAL):
+    # Фоновая задача приложения: закрывает месяцы по мере их окончания
+    while True:
+        try:
+            async with session_factory() as session:
+                created = await close_months(session)
+            if created:
+                logging.info("Balance checkpoints created: %d", created)
+        except Exception as e:
+            logging.warning("Balance checkpoints failed: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def _main():
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        created = await close_months(session)
+    logging.info("Balance checkpoints created: %d", created)
+
+
+if __name__ == "__main__":
+    # python -m app.checkpoints — создать недостающие точки
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from pydantic import BaseModel
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Лента изменений для /api/events. Роутер перед фиксацией вызывает record():
+# событие (сущность, id, операция, новые остатки затронутых счетов и, где есть,
+# строка ответа) откладывается в session.info и после COMMIT раздаётся
+# подписчикам семьи в этом процессе. При откате события пропадают вместе с
+# транзакцией.
+#
+# С несколькими процессами uvicorn (EVENTS_NOTIFY=true, только Postgres)
+# событие вместо этого уходит через pg_notify в той же транзакции: Postgres
+# доставляет его только после COMMIT, и каждый процесс раздаёт полученное
+# своим подписчикам через LISTEN (listen()). Payload NOTIFY ограничен 8000
+# байт, поэтому слишком большое событие уходит без строки data: клиент
+# перечитывает её сам, как при событии без data.
+
+EVENTS_NOTIFY = os.getenv("EVENTS_NOTIFY", "false").lower() in ("1", "true", "yes")
+EVENTS_CHANNEL = "fb_events"
+# Предел payload pg_notify в байтах с запасом до 8000
+NOTIFY_PAYLOAD_LIMIT = 7900
+# Событий в очереди одного подписчика; отстающий клиент получает reset
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+# Период комментариев-пингов в потоке, секунд: прокси не закрывают простаивающее соединение
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+
+PENDING_KEY = "pending_events"
+# Клиенту нужно перечитать данные целиком: события были потеряны
+RESET = {"entity": "all", "op": "reset", "id": None, "accounts": []}
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, family_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[family_id].add(queue)
+        return queue
+
+    def unsubscribe(self, family_id: int, queue: asyncio.Queue):
+        queues = self.subscribers.get(family_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[family_id]
+
+    def publish(self, family_id: int, change: dict):
+        for queue in list(self.subscribers.get(family_id, ())):
+            try:
+                queue.put_nowait(change)
+            except asyncio.QueueFull:
+                # Очередь отстающего клиента заменяется одним reset
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET)
+
+    def reset_all(self):
+        for family_id in list(self.subscribers):
+            self.publish(family_id, RESET)
+
+    def status(self) -> dict:
+        return {
+            "families": len(self.subscribers),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+        }
+
+
+broker = EventBroker()
+
+
+def _uses_notify(session: AsyncSession) -> bool:
+    return EVENTS_NOTIFY and session.bind.dialect.name == "postgresql"
+
+
+async def record(
+    session: AsyncSession,
+    family_id: int,
+    entity: str,
+    op: str,
+    entity_id: Optional[int] = None,
+    data: Optional[BaseModel] = None,
+    accounts: Iterable[Optional[int]] = (),
+):
+    # Вызывать после изменения остатков и до commit: остатки читаются в той же транзакции
+    account_ids = sorted({account_id for account_id in accounts if account_id is not None})
+    balances = []
+    if account_ids:
+        res = await session.execute(
+            select(models.Account.id, models.Account.balance)
+            .where(models.Account.id.in_(account_ids), models.Account.family_id == family_id)
+            .order_by(models.Account.id)
+        )
+        balances = [{"id": account_id, "balance": str(balance)} for account_id, balance in res.all()]
+    change = {"entity": entity, "op": op, "id": entity_id, "accounts": balances}
+    if data is not None:
+        change["data"] = data.model_dump(mode="json")
+    if _uses_notify(session):
+        payload = notify_payload(family_id, change)
+        await session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": EVENTS_CHANNEL, "payload": payload})
+    else:
+        session.info.setdefault(PENDING_KEY, []).append((family_id, change))
+
+
+def notify_payload(family_id: int, change: dict) -> str:
+    payload = json.dumps({"family_id": family_id, "event": change}, ensure_ascii=False)
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT and "data" in change:
+        change = {key: value for key, value in change.items() if key != "data"}
+        payload = json.dumps({"family_id": family_id, "event": change}, ensure_ascii=False)
+    return payload
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session):
+    for family_id, change in session.info.pop(PENDING_KEY, ()):
+        broker.publish(family_id, change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def format_event(change: dict) -> str:
+    return f"event: change\ndata: {json.dumps(change, ensure_ascii=False)}\n\n"
+
+
+async def listen(db_engine: AsyncEngine, retry_delay: float = 5):
+    # Приём NOTIFY от всех процессов; держит одно соединение пула
+    def on_notify(connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+            broker.publish(message["family_id"], message["event"])
+        except (ValueError, KeyError) as e:
+            logging.warning("Malformed change event: %s", e)
+
+    while True:
+        try:
+            async with db_engine.connect() as conn:
+                driver = (await conn.get_raw_connection()).driver_connection
+                await driver.add_listener(EVENTS_CHANNEL, on_notify)
+                logging.info("Listening for change events on %s", EVENTS_CHANNEL)
+                try:
+                    while not driver.is_closed():
+                        await asyncio.sleep(EVENTS_KEEPALIVE)
+                finally:
+                    if not driver.is_closed():
+                        await driver.remove_listener(EVENTS_CHANNEL, on_notify)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning("Change event listener failed: %s", e)
+        # Пока соединения не было, события могли пройти мимо
+        broker.reset_all()
+        await asyncio.sleep(retry_delay)
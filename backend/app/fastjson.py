@@ -0,0 +1,95 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from starlette.responses import Response
+from typing_extensions import TypedDict
+
+from . import models
+
+# Быстрый путь для списков: вместо ORM-объектов и повторной валидации через
+# response_model выбираются только нужные колонки, а строки сериализуются
+# одним вызовом заранее построенного TypeAdapter (сериализатор pydantic-core).
+# Формат JSON совпадает со схемами из schemas.py: Decimal — строкой,
+# datetime — в ISO 8601, порядок полей тот же.
+
+FAST_LIST_RESPONSES = os.getenv("FAST_LIST_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+
+class CategoryRow(TypedDict):
+    id: int
+    name: str
+
+class ExpenseRow(TypedDict):
+    id: int
+    amount: Decimal
+    category: Optional[CategoryRow]
+    account_id: Optional[int]
+    description: Optional[str]
+    spent_at: datetime
+
+class IncomeRow(TypedDict):
+    id: int
+    amount: Decimal
+    category: Optional[CategoryRow]
+    account_id: Optional[int]
+    description: Optional[str]
+    received_at: datetime
+
+class AccountRow(TypedDict):
+    id: int
+    name: str
+    balance: Decimal
+
+class TransferRow(TypedDict):
+    id: int
+    from_account_id: Optional[int]
+    to_account_id: Optional[int]
+    amount: Decimal
+    description: Optional[str]
+    transferred_at: datetime
+
+
+expense_rows = TypeAdapter(List[ExpenseRow])
+income_rows = TypeAdapter(List[IncomeRow])
+account_rows = TypeAdapter(List[AccountRow])
+transfer_rows = TypeAdapter(List[TransferRow])
+
+
+async def fetch_rows(session, stmt):
+    # Выполнение через Core-соединение сессии, минуя ORM-загрузку строк
+    conn = await session.connection()
+    res = await conn.execute(stmt)
+    return res.all()
+
+
+def select_with_category(model, ts):
+    # Колонки ExpenseOut/IncomeOut и имя категории одним LEFT JOIN
+    return select(
+        model.id, model.amount, model.category_id, models.Category.name.label("category_name"),
+        model.account_id, model.description, ts,
+    ).outerjoin(models.Category, models.Category.id == model.category_id)
+
+
+def rows_with_category(rows, ts_name: str) -> List[dict]:
+    # Распаковка строки как кортежа заметно быстрее доступа к атрибутам Row
+    return [
+        {
+            "id": row_id,
+            "amount": amount,
+            "category": {"id": category_id, "name": category_name} if category_name is not None else None,
+            "account_id": account_id,
+            "description": description,
+            ts_name: ts,
+        }
+        for row_id, amount, category_id, category_name, account_id, description, ts in rows
+    ]
+
+
+def json_rows(adapter: TypeAdapter, rows: List[dict], response: Response) -> Response:
+    # Заголовки, выставленные эндпоинтом и зависимостями (курсор, ETag), FastAPI
+    # не переносит в возвращённый Response сам — копируем их
+    return Response(adapter.dump_json(rows), media_type="application/json", headers=dict(response.headers))
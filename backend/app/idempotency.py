@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import Header, HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Idempotency-Key для операций, двигающих деньги. Ключ и снимок ответа
+# записываются в idempotency_keys в одной транзакции с операцией, поэтому
+# повтор запроса (клиент не дождался ответа и отправил ещё раз) возвращает
+# сохранённый ответ без второго изменения остатка. Проверка — один запрос по
+# первичному ключу (family_id, key). Два одновременных запроса с одним ключом
+# сталкиваются на первичном ключе при фиксации: второй откатывается целиком и
+# отдаёт ответ первого. Ответы с ошибкой не сохраняются — операция не
+# состоялась, и повтор выполняется заново.
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Период удаления просроченных ключей, секунд; 0 — не удалять в фоне
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def get_idempotency_key(idempotency_key: Optional[str] = Header(None, max_length=255)) -> Optional[str]:
+    return idempotency_key or None
+
+
+def request_hash(route: str, payload: BaseModel) -> str:
+    return hashlib.sha256(f"{route}\n{payload.model_dump_json()}".encode()).hexdigest()
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite возвращает время без пояса
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+async def find_response(
+    session: AsyncSession, family_id: int, key: Optional[str], fingerprint: str
+) -> Optional[Response]:
+    if key is None:
+        return None
+    stored = models.IdempotencyKey
+    res = await session.execute(
+        select(stored.request_hash, stored.status_code, stored.response, stored.expires_at)
+        .where(stored.family_id == family_id, stored.key == key)
+    )
+    row = res.first()
+    if row is None:
+        return None
+    if _utc(row.expires_at) <= datetime.now(timezone.utc):
+        # Просроченный ключ освобождается в транзакции новой операции
+        await session.execute(delete(stored).where(stored.family_id == family_id, stored.key == key))
+        return None
+    if row.request_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="Ключ Idempotency-Key уже использован для другого запроса")
+    return Response(
+        content=row.response,
+        status_code=row.status_code,
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+async def commit_with_response(
+    session: AsyncSession, family_id: int, key: Optional[str], fingerprint: str, body: BaseModel, status_code: int = 200
+) -> Optional[Response]:
+    # Фиксирует операцию вместе со снимком ответа. None — ответ нужно отдать
+    # как обычно; Response — ключ уже занят параллельным запросом, операция
+    # откатена и возвращается его ответ
+    if key is None:
+        await session.commit()
+        return None
+    session.add(models.IdempotencyKey(
+        family_id=family_id,
+        key=key,
+        request_hash=fingerprint,
+        status_code=status_code,
+        response=body.model_dump_json(),
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL),
+    ))
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        replay = await find_response(session, family_id, key, fingerprint)
+        if replay is None:
+            raise
+        return replay
+    return None
+
+
+async def purge_expired(session: AsyncSession) -> int:
+    stored = models.IdempotencyKey
+    res = await session.execute(delete(stored).where(stored.expires_at <= datetime.now(timezone.utc)))
+    await session.commit()
+    return res.rowcount
+
+
+async def run_periodically(session_factory, interval: float = IDEMPOTENCY_PURGE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as session:
+                purged = await purge_expired(session)
+            if purged:
+                logging.info("Expired idempotency keys purged: %d", purged)
+        except Exception as e:
+            logging.warning("Idempotency key purge failed: %s", e)
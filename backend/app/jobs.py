@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from .cache import TTLCache
+
+# Фоновые задачи для тяжёлых отчётов. Запрос только ставит задачу в
+# ограниченную очередь и возвращает её id; JOB_WORKERS воркеров выполняют
+# задачи вне запроса, поэтому одновременно занято не больше JOB_WORKERS
+# соединений пула, а HTTP-запрос не висит десятки секунд. Готовые результаты
+# хранятся JOB_RESULT_TTL секунд, файлы выгрузок лежат во временном каталоге
+# (JOB_FILE_DIR) и удаляются вместе с результатом. Одинаковые задачи (семья, тип, параметры),
+# поставленные, пока первая ещё в очереди или выполняется, получают её id.
+#
+# Всё хранится в памяти процесса: с несколькими воркерами uvicorn статус
+# задачи виден только в процессе, который её принял.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+JOB_CACHE_SIZE = 1000
+# Каталог файлов результатов; по умолчанию системный временный каталог
+JOB_FILE_DIR = os.getenv("JOB_FILE_DIR") or None
+
+
+class Job:
+    def __init__(self, kind: str, family_id: int, params, key: Hashable):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.family_id = family_id
+        self.params = params
+        self.key = key
+        self.status = "queued"
+        self.progress = 0.0
+        # Обработано строк, для задач, которые идут по строкам
+        self.processed = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        # Файл результата (путь, media type, имя) для выгрузок
+        self.file: Optional[tuple] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+
+    def discard(self):
+        # Удаляет файл результата; вызывается при вытеснении задачи из results
+        if self.file is not None:
+            path, self.file = self.file[0], None
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+# Исполнитель получает задачу и фабрику сессий, обновляет job.progress и
+# возвращает результат (JSON-совместимый)
+Runner = Callable[[Job, Any], Awaitable[Any]]
+
+
+class JobManager:
+    def __init__(self, queue_size: int = JOB_QUEUE_SIZE, result_ttl: float = JOB_RESULT_TTL):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.results = TTLCache(maxsize=JOB_CACHE_SIZE, ttl=result_ttl, on_evict=Job.discard)
+        # Задачи в очереди и в работе: по ключу для объединения и по id для статуса
+        self.active: Dict[Hashable, Job] = {}
+        self.active_ids: Dict[str, Job] = {}
+
+    def submit(self, kind: str, family_id: int, params, runner: Runner, session_factory) -> Optional[Job]:
+        # None — очередь заполнена
+        key = (family_id, kind, params.model_dump_json())
+        job = self.active.get(key)
+        if job is not None:
+            return job
+        job = Job(kind, family_id, params, key)
+        try:
+            self.queue.put_nowait((job, runner, session_factory))
+        except asyncio.QueueFull:
+            return None
+        self.active[key] = job
+        self.active_ids[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.active_ids.get(job_id) or self.results.get(job_id)
+
+    def start(self, workers: int = JOB_WORKERS) -> List[asyncio.Task]:
+        tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        return tasks + [asyncio.create_task(self._sweep())]
+
+    def close(self):
+        # Остановка процесса: файлы результатов больше никто не заберёт
+        self.results.clear()
+
+    def status(self) -> dict:
+        return {
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "active": len(self.active),
+            "finished": len(self.results),
+        }
+
+    async def _worker(self):
+        while True:
+            job, runner, session_factory = await self.queue.get()
+            job.status = "running"
+            try:
+                job.result = await runner(job, session_factory)
+                job.status = "done"
+                job.progress = 1.0
+            except Exception as e:
+                logging.exception("Job %s (%s) failed", job.id, job.kind)
+                job.status = "failed"
+                job.error = str(e) or type(e).__name__
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+                self.results.set(job.id, job)
+                self.active.pop(job.key, None)
+                self.active_ids.pop(job.id, None)
+                self.queue.task_done()
+
+    async def _sweep(self):
+        # Просроченные результаты, которые никто не запрашивал, иначе их файлы
+        # лежали бы до вытеснения по размеру
+        while True:
+            await asyncio.sleep(min(60.0, self.results.ttl))
+            self.results.expire()
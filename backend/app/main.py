@@ -1,12 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routers import expenses, categories, accounts, incomes, transfers, budgets
+from .routers import expenses, categories, accounts, incomes, transfers, budgets, export, dashboard, analytics, events, family, jobs, webhook
 
-import logging, time
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.middleware.base import BaseHTTPMiddleware
+import logging
+from starlette.responses import PlainTextResponse
+
+from .metrics import MetricsMiddleware, registry, render_gauges, render_labelled_gauges
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,17 +16,19 @@ logging.basicConfig(
 
 app = FastAPI(title="Family Budget API")
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start = time.time()
-        response: Response = await call_next(request)
-        duration_ms = (time.time() - start) * 1000
-        logging.info("%s %s -> %d %.1fms", request.method, request.url.path, response.status_code, duration_ms)
-        return response
+app.add_middleware(MetricsMiddleware)
 
-app.add_middleware(LoggingMiddleware)
+from .database import engine, replica_engine, Base, AsyncSessionLocal, ReadYourWritesMiddleware, pool_status
 
-from .database import engine, Base
+app.add_middleware(ReadYourWritesMiddleware)
+from . import auth, bot, checkpoints, idempotency, partitions, reconcile, tenancy
+from .jobs import JobManager
+from .events import EVENTS_NOTIFY, broker, listen as listen_for_events
+from .checkpoints import CHECKPOINT_INTERVAL
+from .idempotency import IDEMPOTENCY_PURGE_INTERVAL, REPLAYED_HEADER
+from .partitions import PARTITION_INTERVAL
+from .reconcile import RECONCILE_INTERVAL
+from .pagination import NEXT_CURSOR_HEADER
 
 @app.on_event("startup")
 async def on_startup():
@@ -41,6 +43,49 @@ async def on_startup():
         except Exception as e:
             logging.warning("DB not ready (%s), retry %d/10", e, attempt+1)
             await asyncio.sleep(2)
+    if auth.BOT_TOKEN is None:
+        logging.warning("BOT_TOKEN is not set: Telegram authentication is disabled, all requests use the default family")
+    try:
+        async with AsyncSessionLocal() as session:
+            await tenancy.ensure_default_family(session)
+    except Exception as e:
+        logging.warning("Default family not ensured: %s", e)
+    # Секция текущего месяца должна существовать до первых записей
+    try:
+        created = await partitions.ensure_partitions(engine)
+        if created:
+            logging.info("Partitions created: %s", ", ".join(created))
+    except Exception as e:
+        logging.warning("Partition maintenance failed: %s", e)
+    # Фоновые задачи обслуживания; интервал 0 выключает задачу
+    app.state.background_tasks = []
+    if CHECKPOINT_INTERVAL > 0:
+        app.state.background_tasks.append(asyncio.create_task(checkpoints.run_periodically(AsyncSessionLocal)))
+    if RECONCILE_INTERVAL > 0:
+        app.state.background_tasks.append(asyncio.create_task(reconcile.run_periodically(AsyncSessionLocal)))
+    if PARTITION_INTERVAL > 0:
+        app.state.background_tasks.append(asyncio.create_task(partitions.run_periodically(engine)))
+    if IDEMPOTENCY_PURGE_INTERVAL > 0:
+        app.state.background_tasks.append(asyncio.create_task(idempotency.run_periodically(AsyncSessionLocal)))
+    # Несколько процессов uvicorn обмениваются событиями ленты через LISTEN/NOTIFY
+    if EVENTS_NOTIFY and engine.dialect.name == "postgresql":
+        app.state.background_tasks.append(asyncio.create_task(listen_for_events(engine)))
+    # Очереди задач и вебхука создаются в цикле событий приложения
+    app.state.jobs = JobManager()
+    app.state.background_tasks.extend(app.state.jobs.start())
+    app.state.bot = bot.WebhookDispatcher(AsyncSessionLocal, bot.TelegramClient(auth.BOT_TOKEN))
+    app.state.background_tasks.extend(app.state.bot.start())
+    if bot.TELEGRAM_WEBHOOK_SECRET is None:
+        logging.warning("TELEGRAM_WEBHOOK_SECRET is not set: the Telegram webhook rejects all updates")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    if getattr(app.state, "jobs", None) is not None:
+        app.state.jobs.close()
+    if getattr(app.state, "bot", None) is not None:
+        await app.state.bot.client.close()
 
 # Allow dev frontend
 app.add_middleware(
@@ -49,6 +94,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER],
 )
 
 app.include_router(expenses.router)
@@ -57,7 +103,35 @@ app.include_router(accounts.router)
 app.include_router(incomes.router)
 app.include_router(transfers.router)
 app.include_router(budgets.router)
+app.include_router(export.router)
+app.include_router(dashboard.router)
+app.include_router(analytics.router)
+app.include_router(events.router)
+app.include_router(family.router)
+app.include_router(jobs.router)
+app.include_router(webhook.router)
 
 @app.get("/api/health")
 async def health():
     return {"status": "ok"}
+
+@app.get("/api/health/db")
+async def health_db():
+    # Заполненность пула соединений: занятые/свободные соединения и ожидание выдачи
+    status = pool_status()
+    if replica_engine is not None:
+        status["replica"] = pool_status(replica_engine)
+    return status
+
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics():
+    pools = {"primary": pool_status()}
+    if replica_engine is not None:
+        pools["replica"] = pool_status(replica_engine)
+    body = registry.render() + render_labelled_gauges("db_pool", "pool", pools)
+    body += render_gauges("events", broker.status())
+    if getattr(app.state, "jobs", None) is not None:
+        body += render_gauges("jobs", app.state.jobs.status())
+    if getattr(app.state, "bot", None) is not None:
+        body += render_gauges("bot_webhook", app.state.bot.status())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,146 @@
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Метрики HTTP в текстовом формате Prometheus без сторонних зависимостей.
+# Всё обновляется из одного event loop, поэтому блокировки не нужны.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метка для запросов, не попавших ни в один маршрут: сырой путь в метках
+# раздувал бы число временных рядов
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.latency_buckets: Dict[Tuple[str, str], list] = {}
+        self.latency_sum: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.latency_count: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.response_bytes: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: int):
+        key = (method, route)
+        self.requests[(method, route, status)] += 1
+        buckets = self.latency_buckets.setdefault(key, [0] * len(LATENCY_BUCKETS))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        self.latency_sum[key] += seconds
+        self.latency_count[key] += 1
+        self.response_bytes[key] += size
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being processed.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Completed requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), value in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {value}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), buckets in sorted(self.latency_buckets.items()):
+            for bound, value in zip(LATENCY_BUCKETS, buckets):
+                lines.append(
+                    f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {value}"
+                )
+            count = self.latency_count[(method, route)]
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {count}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {self.latency_sum[(method, route)]}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {count}")
+
+        lines += [
+            "# HELP http_response_size_bytes_total Response body bytes sent by route.",
+            "# TYPE http_response_size_bytes_total counter",
+        ]
+        for (method, route), value in sorted(self.response_bytes.items()):
+            lines.append(f"http_response_size_bytes_total{_labels(method=method, route=route)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix: str, values: dict) -> str:
+    lines = []
+    for name, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def render_labelled_gauges(prefix: str, label: str, groups: Dict[str, dict]) -> str:
+    # Одна метрика на показатель с меткой группы (например, pool="primary")
+    names = []
+    for values in groups.values():
+        names += [
+            name for name, value in values.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and name not in names
+        ]
+    lines = []
+    for name in names:
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        for group, values in groups.items():
+            if name in values:
+                lines.append(f"{prefix}_{name}{_labels(**{label: group})} {values[name]}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    # Чистый ASGI-middleware: без отдельной задачи на запрос, как у
+    # BaseHTTPMiddleware. Время — по монотонным часам. Заголовок Server-Timing
+    # содержит время до начала ответа.
+    def __init__(self, app: ASGIApp, metrics: MetricsRegistry = registry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f"app;dur={(time.perf_counter() - start) * 1000:.1f}")
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.in_flight -= 1
+            duration = time.perf_counter() - start
+            # FastAPI кладёт сработавший маршрут в scope — берём его шаблон пути
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            self.metrics.observe(scope["method"], route, status, duration, size)
+            logging.info("%s %s -> %d %.1fms", scope["method"], scope["path"], status, duration * 1000)
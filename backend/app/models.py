@@ -1,22 +1,65 @@
-from sqlalchemy import Column, Integer, Numeric, Text, ForeignKey, DateTime, Date, func
+from sqlalchemy import Column, Integer, BigInteger, Numeric, Text, ForeignKey, DateTime, Date, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 
 from .database import Base
 
+
+# Семья, к которой относятся данные, созданные до разделения по семьям
+DEFAULT_FAMILY_ID = 1
+
+
+def family_column():
+    # Ключ семьи (app/tenancy.py): первый столбец всех индексов таблицы.
+    # Роутеры всегда передают семью явно
+    return Column(
+        Integer, ForeignKey("families.id", ondelete="CASCADE"), nullable=False, default=DEFAULT_FAMILY_ID
+    )
+
+class Family(Base):
+    __tablename__ = "families"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class User(Base):
+    # Пользователь Telegram; при первом входе получает семью по умолчанию
+    # или новую (app/auth.py), в общую переходит по приглашению
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, unique=True, nullable=False)
+    family_id = family_column()
+    first_name = Column(Text)
+    username = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_users_family_id", "family_id"),
+    )
+
 class Category(Base):
     __tablename__ = "categories"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(Text, unique=True, nullable=False)
+    family_id = family_column()
+    name = Column(Text, nullable=False)
 
     expenses = relationship("Expense", back_populates="category")
     incomes = relationship("Income", back_populates="category")
     budgets = relationship("Budget", back_populates="category")
 
+    __table_args__ = (
+        UniqueConstraint("family_id", "name", name="uq_categories_family_name"),
+    )
+
 class Expense(Base):
+    # В Postgres таблица секционирована по месяцам spent_at (db/init.sql,
+    # app/partitions.py) с первичным ключом (id, spent_at); id уникален сам по себе
     __tablename__ = "expenses"
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = family_column()
     amount = Column(Numeric(14, 2), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"))
     account_id = Column(Integer, ForeignKey("accounts.id"))
@@ -26,11 +69,22 @@ class Expense(Base):
     category = relationship("Category", back_populates="expenses")
     account = relationship("Account", back_populates="expenses")
 
+    # Индексы под keyset-пагинацию и фильтры списка расходов
+    __table_args__ = (
+        Index("ix_expenses_family_spent_at_id", "family_id", "spent_at", "id"),
+        Index("ix_expenses_family_account_spent_at_id", "family_id", "account_id", "spent_at", "id"),
+        Index("ix_expenses_family_category_spent_at_id", "family_id", "category_id", "spent_at", "id"),
+    )
+    # Время, проставленное сервером, возвращается из INSERT (RETURNING):
+    # последующие запросы по строке отбирают её вместе с ключом секционирования
+    __mapper_args__ = {"eager_defaults": True}
+
 class Account(Base):
     __tablename__ = "accounts"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(Text, unique=True, nullable=False)
+    family_id = family_column()
+    name = Column(Text, nullable=False)
     balance = Column(Numeric(14, 2), nullable=False, default=0)
 
     incomes = relationship("Income", back_populates="account")
@@ -38,10 +92,16 @@ class Account(Base):
     transfers_out = relationship("Transfer", back_populates="from_account", foreign_keys="Transfer.from_account_id")
     transfers_in = relationship("Transfer", back_populates="to_account", foreign_keys="Transfer.to_account_id")
 
+    __table_args__ = (
+        UniqueConstraint("family_id", "name", name="uq_accounts_family_name"),
+    )
+
 class Income(Base):
+    # Секционирована по месяцам received_at, как и expenses
     __tablename__ = "incomes"
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = family_column()
     amount = Column(Numeric(14, 2), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"))
     account_id = Column(Integer, ForeignKey("accounts.id"))
@@ -51,10 +111,17 @@ class Income(Base):
     category = relationship("Category", back_populates="incomes")
     account = relationship("Account", back_populates="incomes")
 
+    __table_args__ = (
+        Index("ix_incomes_family_received_at_id", "family_id", "received_at", "id"),
+        Index("ix_incomes_family_account_received_at_id", "family_id", "account_id", "received_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
 class Transfer(Base):
     __tablename__ = "transfers"
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = family_column()
     from_account_id = Column(Integer, ForeignKey("accounts.id"))
     to_account_id = Column(Integer, ForeignKey("accounts.id"))
     amount = Column(Numeric(14, 2), nullable=False)
@@ -64,12 +131,85 @@ class Transfer(Base):
     from_account = relationship("Account", foreign_keys=[from_account_id], back_populates="transfers_out")
     to_account = relationship("Account", foreign_keys=[to_account_id], back_populates="transfers_in")
 
+    # Индексы под список и выписку по счёту: обе стороны перевода ищутся отдельно
+    __table_args__ = (
+        Index("ix_transfers_family_transferred_at_id", "family_id", "transferred_at", "id"),
+        Index("ix_transfers_family_from_account_transferred_at_id", "family_id", "from_account_id", "transferred_at", "id"),
+        Index("ix_transfers_family_to_account_transferred_at_id", "family_id", "to_account_id", "transferred_at", "id"),
+    )
+
 class Budget(Base):
     __tablename__ = "budgets"
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = family_column()
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     month = Column(Date, nullable=False)
     planned = Column(Numeric(14, 2), nullable=False)
 
     category = relationship("Category", back_populates="budgets")
+
+    __table_args__ = (
+        Index("ix_budgets_family_month", "family_id", "month"),
+    )
+
+class CategoryMonthRollup(Base):
+    # Помесячные итоги по (категория, счёт). 0 в category_id/account_id —
+    # «без категории»/«без счёта», чтобы ключ оставался уникальным без NULL
+    __tablename__ = "category_month_rollups"
+
+    family_id = Column(Integer, ForeignKey("families.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True, default=0)
+    account_id = Column(Integer, primary_key=True, default=0)
+    expense_total = Column(Numeric(14, 2), nullable=False, default=0)
+    income_total = Column(Numeric(14, 2), nullable=False, default=0)
+
+class AccountBalanceCheckpoint(Base):
+    # Остаток счёта на начало месяца (00:00 UTC первого числа): все операции
+    # раньше month учтены, начиная с month — нет. Семья не хранится: строки
+    # читаются только по счёту, а счёт уже принадлежит одной семье
+    __tablename__ = "account_balance_checkpoints"
+
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    balance = Column(Numeric(14, 2), nullable=False)
+
+class AccountReconciliation(Base):
+    # Последняя сверка счёта: подтверждённый остаток и наибольшие id операций,
+    # которые в нём уже учтены. Следующая сверка проверяет только более новые
+    __tablename__ = "account_reconciliations"
+
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    balance = Column(Numeric(14, 2), nullable=False)
+    expense_id = Column(Integer, nullable=False, default=0)
+    income_id = Column(Integer, nullable=False, default=0)
+    transfer_id = Column(Integer, nullable=False, default=0)
+    checked_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class IdempotencyKey(Base):
+    # Ключ Idempotency-Key и снимок ответа на запрос, который его принёс;
+    # пишется в одной транзакции с операцией. Поиск — по первичному ключу
+    __tablename__ = "idempotency_keys"
+
+    family_id = Column(Integer, ForeignKey("families.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(Text, primary_key=True)
+    # Маршрут и хэш тела: тот же ключ с другим запросом — ошибка клиента
+    request_hash = Column(Text, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+class TableVersion(Base):
+    # Счётчик изменений таблицы в пределах семьи; увеличивается каждой записью
+    # в роутерах и служит основой ETag для GET-запросов
+    __tablename__ = "table_versions"
+
+    family_id = Column(Integer, ForeignKey("families.id", ondelete="CASCADE"), primary_key=True)
+    name = Column(Text, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
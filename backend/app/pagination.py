@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, List
+
+from fastapi import HTTPException
+
+# Курсор — непрозрачная строка, кодирующая ключ последней строки страницы
+# (например, (timestamp, id)). Клиент передаёт её обратно как есть.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load(value: Any, type_: type) -> Any:
+    if type_ is datetime:
+        return datetime.fromisoformat(value)
+    return type_(value)
+
+
+def encode_cursor(*key: Any) -> str:
+    raw = json.dumps([_dump(part) for part in key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(parts, list) or len(parts) != len(types):
+            raise ValueError(cursor)
+        return [_load(part, type_) for part, type_ in zip(parts, types)]
+    except (ArithmeticError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
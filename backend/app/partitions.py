@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+# Помесячные секции expenses и incomes (Postgres, см. db/init.sql). Секции
+# создаются заранее на несколько месяцев вперёд; строки, попавшие в секцию
+# DEFAULT (импорт задним числом, данные до секционирования), переносятся в
+# собственную секцию месяца при следующем запуске.
+# Таблицы без секционирования (SQLite, базы, созданные через create_all)
+# пропускаются.
+
+PARTITIONED_TABLES = {"expenses": "spent_at", "incomes": "received_at"}
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Период фонового создания секций, секунд; 0 — только при старте приложения
+PARTITION_INTERVAL = float(os.getenv("PARTITION_INTERVAL", "86400"))
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def by_key(session: AsyncSession, model, keys: Iterable[Tuple[int, datetime]]):
+    # Отбор операций по парам (id, время). Условие на ключ секционирования
+    # позволяет Postgres читать только секции нужных месяцев вместо всех
+    # секций и DEFAULT. В SQLite секций нет, а время, проставленное сервером,
+    # хранится в другом текстовом формате и на равенство не сравнивается
+    ids, times = zip(*keys)
+    if session.bind.dialect.name != "postgresql":
+        return model.id.in_(ids)
+    ts = getattr(model, PARTITIONED_TABLES[model.__tablename__])
+    return and_(model.id.in_(ids), ts.in_(list(dict.fromkeys(times))))
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def plan_partitions(
+    table: str, existing: Set[str], default_months: Iterable[date], today: date, months_ahead: int
+) -> List[Tuple[date, bool]]:
+    # Месяцы, для которых нужна новая секция, и нужно ли переносить строки из DEFAULT
+    current = date(today.year, today.month, 1)
+    default_months = set(default_months)
+    wanted = {_add_months(current, i) for i in range(-1, months_ahead + 1)} | default_months
+    return [
+        (month, month in default_months)
+        for month in sorted(wanted)
+        if partition_name(table, month) not in existing
+    ]
+
+
+async def _is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    res = await conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+        {"table": table},
+    )
+    return res.scalar()
+
+
+async def _existing_partitions(conn: AsyncConnection, table: str) -> Set[str]:
+    res = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    )
+    return set(res.scalars().all())
+
+
+async def _create_partition(conn: AsyncConnection, table: str, column: str, month: date, move_from_default: bool):
+    name = partition_name(table, month)
+    default = f"{table}_default"
+    # Границы в UTC явно, чтобы не зависеть от TimeZone сессии
+    bounds = f"FROM ('{month.isoformat()} 00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00+00')"
+    in_month = f"{column} >= '{month.isoformat()} 00:00+00' AND {column} < '{_add_months(month, 1).isoformat()} 00:00+00'"
+    if not move_from_default:
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES {bounds}"))
+        return
+    # Секцию нельзя создать, пока подходящие строки лежат в DEFAULT: DEFAULT
+    # отсоединяется на время переноса (короткая эксклюзивная блокировка таблицы)
+    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+    await conn.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}"))
+    await conn.execute(text(f"DELETE FROM {default} WHERE {in_month}"))
+    await conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+
+async def ensure_partitions(
+    db_engine: AsyncEngine, months_ahead: int = PARTITION_MONTHS_AHEAD, today: Optional[date] = None
+) -> List[str]:
+    # Возвращает имена созданных секций. Каждая секция создаётся в своей
+    # транзакции, чтобы блокировка таблицы не держалась на весь проход
+    if db_engine.dialect.name != "postgresql":
+        return []
+    today = today or datetime.now(timezone.utc).date()
+    created = []
+    for table, column in PARTITIONED_TABLES.items():
+        async with db_engine.connect() as conn:
+            if not await _is_partitioned(conn, table):
+                continue
+            existing = await _existing_partitions(conn, table)
+            default_months = []
+            if f"{table}_default" in existing:
+                res = await conn.execute(text(
+                    f"SELECT DISTINCT date_trunc('month', {column} AT TIME ZONE 'UTC')::date FROM {table}_default"
+                ))
+                default_months = res.scalars().all()
+        for month, move in plan_partitions(table, existing, default_months, today, months_ahead):
+            async with db_engine.begin() as conn:
+                await _create_partition(conn, table, column, month, move)
+            created.append(partition_name(table, month))
+    return created
+
+
+async def run_periodically(db_engine: AsyncEngine, interval: float = PARTITION_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            created = await ensure_partitions(db_engine)
+            if created:
+                logging.info("Partitions created: %s", ", ".join(created))
+        except Exception as e:
+            logging.warning("Partition maintenance failed: %s", e)
+
+
+async def _main():
+    from .database import engine
+
+    created = await ensure_partitions(engine)
+    logging.info("Partitions created: %s", ", ".join(created) or "none")
+
+
+if __name__ == "__main__":
+    # python -m app.partitions — создать недостающие секции
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
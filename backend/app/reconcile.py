@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import events, models, schemas
+from .partitions import by_key
+from .versions import bump_versions
+
+# Инкрементальная сверка остатков счетов с журналом операций. Для каждого
+# счёта хранится подтверждённый остаток и наибольшие id уже учтённых
+# расходов, доходов и переводов; очередная сверка суммирует только более
+# новые операции и сравнивает результат с Account.balance.
+#
+# Счета сверяются пачками, каждая в своей короткой транзакции под
+# блокировкой строк счетов. Все записи блокируют счёт до вставки операции,
+# поэтому под блокировкой видны все операции счёта и новых с меньшими id
+# уже не появится — их можно пометить как проверенные по общему max(id).
+#
+# Первая сверка счёта опорная: начального остатка в журнале нет, поэтому
+# текущий остаток принимается как подтверждённый.
+
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "900"))
+RECONCILE_REPAIR = os.getenv("RECONCILE_REPAIR", "false").lower() in ("1", "true", "yes")
+BATCH_SIZE = 100
+
+# (модель, столбец счёта, столбец отметки, знак влияния на остаток)
+_SOURCES = [
+    (models.Expense, models.Expense.account_id, "expense_id", -1),
+    (models.Income, models.Income.account_id, "income_id", 1),
+    (models.Transfer, models.Transfer.to_account_id, "transfer_id", 1),
+    (models.Transfer, models.Transfer.from_account_id, "transfer_id", -1),
+]
+
+
+async def _reconcile_batch(session: AsyncSession, account_ids: List[int], repair: bool, report: schemas.ReconcileReport):
+    state_model = models.AccountReconciliation
+    res = await session.execute(
+        select(models.Account.id, models.Account.balance, models.Account.family_id)
+        .where(models.Account.id.in_(account_ids))
+        .order_by(models.Account.id)
+        .with_for_update()
+    )
+    rows = res.all()
+    balances = {acc_id: balance for acc_id, balance, _ in rows}
+    families = {acc_id: family_id for acc_id, _, family_id in rows}
+    res = await session.execute(select(state_model).where(state_model.account_id.in_(account_ids)))
+    states = {state.account_id: state for state in res.scalars().all()}
+
+    # Суммы операций после отметки каждого счёта одним запросом
+    branches = []
+    for model, account_col, mark, sign in _SOURCES:
+        branches.append(
+            select(account_col.label("account_id"), (model.amount if sign > 0 else -model.amount).label("amount"))
+            .join(state_model, state_model.account_id == account_col)
+            .where(account_col.in_(account_ids), model.id > getattr(state_model, mark))
+        )
+    ledger = union_all(*branches).subquery("ledger")
+    res = await session.execute(
+        select(ledger.c.account_id, func.sum(ledger.c.amount), func.count()).group_by(ledger.c.account_id)
+    )
+    new_rows = {acc_id: (total, count) for acc_id, total, count in res.all()}
+
+    res = await session.execute(select(
+        select(func.coalesce(func.max(models.Expense.id), 0)).scalar_subquery(),
+        select(func.coalesce(func.max(models.Income.id), 0)).scalar_subquery(),
+        select(func.coalesce(func.max(models.Transfer.id), 0)).scalar_subquery(),
+    ))
+    marks = dict(zip(("expense_id", "income_id", "transfer_id"), res.one()))
+
+    repaired = set()
+    fixed = []
+    for acc_id, stored in balances.items():
+        report.checked_accounts += 1
+        state = states.get(acc_id)
+        if state is None:
+            session.add(state_model(account_id=acc_id, balance=stored, **marks))
+            report.baselined += 1
+            continue
+
+        total, count = new_rows.get(acc_id, (Decimal(0), 0))
+        report.new_rows += count
+        expected = state.balance + total
+        if stored != expected:
+            report.mismatches.append(schemas.ReconcileMismatch(
+                account_id=acc_id, stored=stored, expected=expected, difference=stored - expected, repaired=repair,
+            ))
+            if not repair:
+                # Отметку не двигаем: расхождение повторится, пока его не исправят
+                state.checked_at = func.now()
+                continue
+            await session.execute(
+                update(models.Account).where(models.Account.id == acc_id).values(balance=expected)
+            )
+            repaired.add(families[acc_id])
+            fixed.append(acc_id)
+        state.balance = expected
+        state.checked_at = func.now()
+        for mark, value in marks.items():
+            setattr(state, mark, value)
+
+    for family_id in sorted(repaired):
+        await bump_versions(session, family_id, "accounts")
+        await events.record(
+            session, family_id, "accounts", "update",
+            accounts=[acc_id for acc_id in fixed if families[acc_id] == family_id],
+        )
+    await session.commit()
+
+
+async def reconcile(
+    session: AsyncSession,
+    repair: bool = False,
+    batch_size: int = BATCH_SIZE,
+    family_id: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> schemas.ReconcileReport:
+    # family_id — только счета одной семьи (запрос через API); None — все счета.
+    # progress получает число сверенных счетов после каждой пачки
+    report = schemas.ReconcileReport(checked_accounts=0, new_rows=0, baselined=0, mismatches=[])
+    last_id = 0
+    while True:
+        stmt = select(models.Account.id).where(models.Account.id > last_id)
+        if family_id is not None:
+            stmt = stmt.where(models.Account.family_id == family_id)
+        res = await session.execute(stmt.order_by(models.Account.id).limit(batch_size))
+        account_ids = res.scalars().all()
+        if not account_ids:
+            break
+        await _reconcile_batch(session, account_ids, repair, report)
+        last_id = account_ids[-1]
+        if progress is not None:
+            progress(report.checked_accounts)
+    return report
+
+
+async def forget_reconciled(session: AsyncSession, model, keys: Iterable[Tuple[int, datetime]], sign: int):
+    # Удаление уже сверенной операции меняет остаток, а журнал после отметки —
+    # нет; поправка подтверждённого остатка в той же транзакции. sign — как у
+    # shift_checkpoints: +1 для удалённого расхода, -1 для удалённого дохода.
+    # Операции задаются парами (id, время). Вызывать до удаления строк
+    keys = list(keys)
+    if not keys:
+        return
+    operations = by_key(session, model, keys)
+    state_model = models.AccountReconciliation
+    mark = state_model.expense_id if model is models.Expense else state_model.income_id
+    delta = (
+        select(func.coalesce(func.sum(model.amount), 0))
+        .where(operations, model.account_id == state_model.account_id, model.id <= mark)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(state_model)
+        .where(state_model.account_id.in_(select(model.account_id).where(operations)))
+        .values(balance=state_model.balance + sign * delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def log_report(report: schemas.ReconcileReport):
+    for mismatch in report.mismatches:
+        logging.warning(
+            "Balance mismatch on account %d: stored %s, expected %s%s",
+            mismatch.account_id, mismatch.stored, mismatch.expected, " (repaired)" if mismatch.repaired else "",
+        )
+    logging.info(
+        "Reconciled %d accounts, %d new rows, %d mismatches",
+        report.checked_accounts, report.new_rows, len(report.mismatches),
+    )
+
+
+async def run_periodically(session_factory, interval: float = RECONCILE_INTERVAL, repair: bool = RECONCILE_REPAIR):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as session:
+                log_report(await reconcile(session, repair=repair))
+        except Exception as e:
+            logging.warning("Reconciliation failed: %s", e)
+
+
+async def _main(repair: bool):
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        log_report(await reconcile(session, repair=repair))
+
+
+if __name__ == "__main__":
+    # python -m app.reconcile [--repair]
+    parser = argparse.ArgumentParser(description="Сверка остатков счетов с операциями")
+    parser.add_argument("--repair", action="store_true", help="исправить расхождения по журналу")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args().repair))
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from sqlalchemy import select, delete, func, cast, literal_column, Date, DateTime, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .partitions import by_key
+
+# Помесячные итоги (category_month_rollups) обновляются в той же транзакции,
+# что и расходы/доходы. Строки итогов считаются SQL-запросом прямо из
+# журнала, поэтому месяц берётся из фактического времени операции, в том
+# числе проставленного сервером по умолчанию.
+
+ROLLUP_KEY = ["family_id", "month", "category_id", "account_id"]
+
+
+# Начало интервала (день, неделя с понедельника, месяц) для группировки по времени.
+# Модификаторы — литералами: Postgres сопоставляет SELECT и GROUP BY по тексту
+_SQLITE_BUCKETS = {
+    "day": (),
+    "week": ("'weekday 0'", "'-6 days'"),
+    "month": ("'start of month'",),
+}
+
+
+def date_bucket(column, bucket: str, dialect_name: str):
+    # Интервалы — по UTC, как и границы диапазонов в запросах. date_trunc от
+    # timestamptz считает в часовом поясе сессии, поэтому время сначала
+    # переводится в UTC
+    if dialect_name == "sqlite":
+        modifiers = [literal_column(m) for m in _SQLITE_BUCKETS[bucket]]
+        return func.date(column, *modifiers, type_=Date)
+    if isinstance(column.type, DateTime) and column.type.timezone:
+        column = column.op("AT TIME ZONE")(literal_column("'UTC'"))
+    return cast(func.date_trunc(literal_column(f"'{bucket}'"), column), Date)
+
+
+def month_start(column, dialect_name: str):
+    return date_bucket(column, "month", dialect_name)
+
+
+def _ledger_columns(model):
+    if model is models.Expense:
+        return model.spent_at, "expense_total"
+    return model.received_at, "income_total"
+
+
+def _insert(dialect_name: str):
+    return sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+
+
+async def _upsert_from_ledger(session: AsyncSession, model, where, sign: int):
+    dialect_name = session.bind.dialect.name
+    ts, total_column = _ledger_columns(model)
+    month = month_start(ts, dialect_name)
+    # Литералы, а не параметры: Postgres сопоставляет выражения SELECT и
+    # GROUP BY только при совпадении текста
+    category_id = func.coalesce(model.category_id, literal_column("0"))
+    account_id = func.coalesce(model.account_id, literal_column("0"))
+    rows = (
+        select(model.family_id, month, category_id, account_id, sign * func.sum(model.amount))
+        .where(where)
+        .group_by(model.family_id, month, category_id, account_id)
+    )
+
+    rollup = models.CategoryMonthRollup
+    stmt = _insert(dialect_name)(rollup).from_select(ROLLUP_KEY + [total_column], rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=ROLLUP_KEY,
+        set_={total_column: getattr(rollup, total_column) + getattr(stmt.excluded, total_column)},
+    )
+    await session.execute(stmt)
+
+
+async def apply_rollup(session: AsyncSession, model, keys: Iterable[Tuple[int, datetime]], sign: int):
+    # Добавляет (sign=+1) или вычитает (sign=-1) операции с указанными
+    # парами (id, время). Для вычитания вызывать до удаления строк из журнала.
+    keys = list(keys)
+    if keys:
+        await _upsert_from_ledger(session, model, by_key(session, model, keys), sign)
+
+
+async def detach_rollup(session: AsyncSession, family_id: int, column: str, old_id: int):
+    # Перед удалением категории (column="category_id") или счёта
+    # ("account_id"): ссылки журнала на них обнуляются, поэтому их итоги
+    # переносятся в корзину 0 и складываются с уже существующими строками
+    rollup = models.CategoryMonthRollup
+    key = getattr(rollup, column)
+    rows = (
+        select(*[literal_column("0") if name == column else getattr(rollup, name) for name in ROLLUP_KEY],
+               rollup.expense_total, rollup.income_total)
+        .where(rollup.family_id == family_id, key == old_id)
+    )
+    stmt = _insert(session.bind.dialect.name)(rollup).from_select(ROLLUP_KEY + ["expense_total", "income_total"], rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=ROLLUP_KEY,
+        set_={
+            "expense_total": rollup.expense_total + stmt.excluded.expense_total,
+            "income_total": rollup.income_total + stmt.excluded.income_total,
+        },
+    )
+    await session.execute(stmt)
+    await session.execute(delete(rollup).where(rollup.family_id == family_id, key == old_id))
+
+
+async def rebuild_rollup(session: AsyncSession):
+    await session.execute(delete(models.CategoryMonthRollup))
+    await _upsert_from_ledger(session, models.Expense, true(), 1)
+    await _upsert_from_ledger(session, models.Income, true(), 1)
+    await session.commit()
+
+
+async def _main():
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        await rebuild_rollup(session)
+    logging.info("Rollup rebuilt")
+
+
+if __name__ == "__main__":
+    # python -m app.rollup — пересчитать итоги с нуля
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -1,50 +1,214 @@
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
+from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, delete, func, literal, null, cast, tuple_, union_all, Integer, Numeric, String
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_session
-from .. import models, schemas
+from ..database import get_read_session, get_session
+from ..checkpoints import balance_at
+from ..reconcile import reconcile
+from ..rollup import detach_rollup
+from ..versions import bump_versions, conditional_get, history
+from ..pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from ..tenancy import get_family_id
+from .. import events, fastjson, models, schemas
 
 router = APIRouter(prefix="/api/accounts", tags=["accounts"])
 
-@router.get("/", response_model=List[schemas.AccountOut])
-async def list_accounts(session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Account))
+@router.get("/", response_model=List[schemas.AccountOut], dependencies=[Depends(conditional_get("accounts"))])
+async def list_accounts(
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    a = models.Account
+    if fastjson.FAST_LIST_RESPONSES:
+        rows = await fastjson.fetch_rows(session, select(a.id, a.name, a.balance).where(a.family_id == family_id))
+        return fastjson.json_rows(fastjson.account_rows, [row._asdict() for row in rows], response)
+    res = await session.execute(select(a).where(a.family_id == family_id))
     return res.scalars().all()
 
-@router.get("/{account_id}", response_model=schemas.AccountOut)
-async def get_account(account_id: int, session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Account).where(models.Account.id == account_id))
+@router.get("/{account_id}", response_model=schemas.AccountOut, dependencies=[Depends(conditional_get("accounts"))])
+async def get_account(
+    account_id: int,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    res = await session.execute(
+        select(models.Account).where(models.Account.id == account_id, models.Account.family_id == family_id)
+    )
     account = res.scalar()
     if not account:
         raise HTTPException(status_code=404, detail="Счет не найден")
     return account
 
+@router.post("/reconcile", response_model=schemas.ReconcileReport)
+async def reconcile_balances(
+    repair: bool = False,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Сверка остатков счетов семьи с операциями, добавленными после прошлой
+    # сверки; repair=true записывает в счёт остаток, посчитанный по журналу
+    return await reconcile(session, repair=repair, family_id=family_id)
+
+@router.get(
+    "/{account_id}/balance",
+    response_model=schemas.AccountBalanceAt,
+    dependencies=[Depends(conditional_get("accounts", "expenses", "incomes", "transfers"))],
+)
+async def account_balance_at(
+    account_id: int,
+    at: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Остаток на момент at (без операций в сам момент at): от ближайшей
+    # помесячной контрольной точки плюс операции между ней и at
+    at = at or datetime.now(timezone.utc)
+    result = await balance_at(session, family_id, account_id, at)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Счет не найден")
+    balance, checkpoint = result
+    return schemas.AccountBalanceAt(account_id=account_id, at=at, balance=balance, checkpoint=checkpoint)
+
+def _statement_sources():
+    # (вид, модель, время, счёт, сумма со знаком, категория, встречный счёт)
+    e, i, t = models.Expense, models.Income, models.Transfer
+    no_id = cast(null(), Integer)
+    return [
+        ("expense", e, e.spent_at, e.account_id, -e.amount, e.category_id, no_id),
+        ("income", i, i.received_at, i.account_id, i.amount, i.category_id, no_id),
+        ("transfer_in", t, t.transferred_at, t.to_account_id, t.amount, no_id, t.from_account_id),
+        ("transfer_out", t, t.transferred_at, t.from_account_id, -t.amount, no_id, t.to_account_id),
+    ]
+
+@router.get(
+    "/{account_id}/statement",
+    response_model=List[schemas.StatementEntry],
+    dependencies=[Depends(conditional_get("accounts", "expenses", "incomes", "transfers"))],
+)
+async def account_statement(
+    account_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Выписка: расходы, доходы и переводы одним запросом (UNION ALL) с текущим
+    # остатком после каждой операции. Порядок — (время, вид, id) по убыванию.
+    # Курсор несёт остаток на границе страницы, поэтому оконная функция
+    # считается только по строкам страницы, а не по всей истории счёта.
+    after = decode_cursor(cursor, datetime, str, int, Decimal) if cursor else None
+
+    branches = []
+    for kind, model, ts, account_col, amount, category_id, counterparty in _statement_sources():
+        branch = select(
+            cast(literal(kind), String).label("kind"),
+            model.id.label("id"),
+            ts.label("occurred_at"),
+            amount.label("amount"),
+            model.description.label("description"),
+            category_id.label("category_id"),
+            counterparty.label("counterparty_account_id"),
+        ).where(model.family_id == family_id, account_col == account_id)
+        if after:
+            cur_ts, cur_kind, cur_id, _ = after
+            if kind < cur_kind:
+                branch = branch.where(ts <= cur_ts)
+            elif kind == cur_kind:
+                branch = branch.where(tuple_(ts, model.id) < tuple_(cur_ts, cur_id))
+            else:
+                branch = branch.where(ts < cur_ts)
+        # Каждая ветка ограничена отдельно и идёт по индексу (счёт, время, id)
+        branch = branch.order_by(ts.desc(), model.id.desc()).limit(limit + 1).subquery()
+        branches.append(select(branch))
+    entries = union_all(*branches).subquery("entries")
+
+    if after:
+        start_balance = literal(after[3], Numeric(14, 2))
+    else:
+        start_balance = (
+            select(models.Account.balance)
+            .where(models.Account.id == account_id, models.Account.family_id == family_id)
+            .scalar_subquery()
+        )
+    order = (entries.c.occurred_at.desc(), entries.c.kind.desc(), entries.c.id.desc())
+    running = func.sum(entries.c.amount).over(order_by=order, rows=(None, 0))
+    balance_after = cast(start_balance - (running - entries.c.amount), Numeric(14, 2))
+
+    res = await session.execute(
+        select(entries, balance_after.label("balance_after")).order_by(*order).limit(limit + 1)
+    )
+    rows = res.mappings().all()
+
+    if not rows and not after:
+        exists = await session.execute(
+            select(models.Account.id).where(models.Account.id == account_id, models.Account.family_id == family_id)
+        )
+        if exists.scalar() is None:
+            raise HTTPException(status_code=404, detail="Счет не найден")
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        # Остаток до последней операции страницы — стартовый для следующей
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            last["occurred_at"], last["kind"], last["id"], last["balance_after"] - last["amount"]
+        )
+    return [schemas.StatementEntry(**row) for row in rows]
+
 @router.post("/", response_model=schemas.AccountOut)
-async def create_account(payload: schemas.AccountCreate, session: AsyncSession = Depends(get_session)):
-    exists = await session.execute(select(models.Account).where(models.Account.name == payload.name))
+async def create_account(
+    payload: schemas.AccountCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
+    exists = await session.execute(
+        select(models.Account).where(models.Account.family_id == family_id, models.Account.name == payload.name)
+    )
     if exists.scalar():
         raise HTTPException(status_code=400, detail="Account already exists")
-    account = models.Account(**payload.model_dump())
+    account = models.Account(**payload.model_dump(), family_id=family_id)
     session.add(account)
+    await bump_versions(session, family_id, "accounts")
+    await session.flush()
+    await events.record(
+        session, family_id, "accounts", "create", account.id, data=schemas.AccountOut.model_validate(account)
+    )
     await session.commit()
     await session.refresh(account)
     return account
 
 @router.delete("/{account_id}", response_model=schemas.AccountOut)
-async def delete_account(account_id: int, session: AsyncSession = Depends(get_session)):
+async def delete_account(
+    account_id: int,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
     # Сначала проверяем, существует ли счёт
-    res = await session.execute(select(models.Account).where(models.Account.id == account_id))
+    res = await session.execute(
+        select(models.Account).where(models.Account.id == account_id, models.Account.family_id == family_id)
+    )
     account = res.scalar()
     if not account:
         raise HTTPException(status_code=404, detail="Счет не найден")
     
     # Проверка наличия связанных записей (можно добавить позже)
     
-    # Удаляем счёт
+    # Удаляем счёт; ссылки на него в операциях обнуляются (ON DELETE SET NULL),
+    # итоги по нему переходят в «без счёта»
+    await detach_rollup(session, family_id, "account_id", account_id)
     await session.delete(account)
+    # SQLite в тестах не выполняет ON DELETE CASCADE
+    for derived in (models.AccountBalanceCheckpoint, models.AccountReconciliation):
+        await session.execute(delete(derived).where(derived.account_id == account_id))
+    await bump_versions(
+        session, family_id, "accounts", "expenses", "incomes", "transfers", history("expenses"), history("incomes")
+    )
+    await events.record(session, family_id, "accounts", "delete", account_id)
     await session.commit()
     
     return account
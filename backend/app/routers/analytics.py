@@ -0,0 +1,155 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..cache import TTLCache
+from ..database import get_read_session
+from ..rollup import date_bucket
+from ..tenancy import get_family_id
+from ..versions import conditional_get, history, read_versions
+from .. import models, schemas
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+# Больше точек график всё равно не покажет
+MAX_BUCKETS = 1000
+
+# Итоги закрытых интервалов (целиком до начала текущего) не меняются от новых
+# операций, поэтому кэшируются. Ключ включает семью и её версии изменений
+# задним числом, категорий и счетов, так что удаление или импорт старых
+# операций кэш обходят
+SERIES_CACHE_TTL = 3600
+series_cache = TTLCache(maxsize=256, ttl=SERIES_CACHE_TTL)
+
+CACHE_VERSION_TABLES = (history("expenses"), "categories", "accounts")
+
+# Ключ серии и её имя -> {начало интервала: сумма}
+Totals = Dict[Tuple[Optional[int], Optional[str]], Dict[date, Decimal]]
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _series_day(request) -> str:
+    # Без "to" конец диапазона и последний интервал задаются сегодняшней датой:
+    # после полуночи UTC ответ меняется и без новых записей
+    return _today().isoformat()
+
+
+def _bucket_start(value: date, bucket: str) -> date:
+    if bucket == "week":
+        return value - timedelta(days=value.weekday())
+    if bucket == "month":
+        return value.replace(day=1)
+    return value
+
+
+def _next_bucket(value: date, bucket: str) -> date:
+    if bucket == "week":
+        return value + timedelta(days=7)
+    if bucket == "month":
+        return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+    return value + timedelta(days=1)
+
+
+def _timestamps(start: date, end: date, bucket: str) -> List[date]:
+    result = []
+    current = start
+    while current < end:
+        result.append(current)
+        current = _next_bucket(current, bucket)
+    return result
+
+
+def _as_utc(value: date) -> datetime:
+    return datetime.combine(value, time.min, tzinfo=timezone.utc)
+
+
+async def _load_totals(
+    session: AsyncSession, family_id: int, bucket: str, group_by: str, start: date, end: date
+) -> Totals:
+    if start >= end:
+        return {}
+    dialect_name = session.bind.dialect.name
+    if bucket == "month":
+        # Помесячные итоги уже посчитаны в category_month_rollups; 0 означает «без категории/счёта»
+        rollup = models.CategoryMonthRollup
+        key = rollup.category_id if group_by == "category" else rollup.account_id
+        named = models.Category if group_by == "category" else models.Account
+        stmt = (
+            select(rollup.month, key, named.name, func.sum(rollup.expense_total))
+            .outerjoin(named, named.id == key)
+            .where(rollup.family_id == family_id, rollup.month >= start, rollup.month < end, rollup.expense_total != 0)
+            .group_by(rollup.month, key, named.name)
+        )
+    else:
+        expense = models.Expense
+        key = expense.category_id if group_by == "category" else expense.account_id
+        named = models.Category if group_by == "category" else models.Account
+        period = date_bucket(expense.spent_at, bucket, dialect_name)
+        stmt = (
+            select(period, key, named.name, func.sum(expense.amount))
+            .outerjoin(named, named.id == key)
+            .where(expense.family_id == family_id, expense.spent_at >= _as_utc(start), expense.spent_at < _as_utc(end))
+            .group_by(period, key, named.name)
+        )
+
+    totals: Totals = defaultdict(dict)
+    for period_start, series_key, name, total in (await session.execute(stmt)).all():
+        totals[(series_key or None, name)][period_start] = total
+    return totals
+
+
+@router.get(
+    "/series",
+    response_model=schemas.AnalyticsSeries,
+    dependencies=[Depends(conditional_get("expenses", "categories", "accounts", vary=_series_day))],
+)
+async def spending_series(
+    bucket: Literal["day", "week", "month"] = "day",
+    date_from: date = Query(..., alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    group_by: Literal["category", "account"] = "category",
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Расходы по интервалам в колоночном виде: один массив меток времени и
+    # по массиву значений на серию. Пустые интервалы заполняются нулями
+    today = _today()
+    start = _bucket_start(date_from, bucket)
+    end = _next_bucket(_bucket_start(date_to or today, bucket), bucket)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Конец диапазона раньше начала")
+    timestamps = _timestamps(start, end, bucket)
+    if len(timestamps) > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Слишком много интервалов (максимум {MAX_BUCKETS})")
+
+    # Граница закрытой части: начало текущего интервала
+    closed_end = min(end, _bucket_start(today, bucket))
+    closed: Totals = {}
+    if start < closed_end:
+        versions = await read_versions(session, family_id, CACHE_VERSION_TABLES)
+        cache_key = (family_id, bucket, group_by, start, closed_end, tuple(versions.values()))
+        closed = series_cache.get(cache_key)
+        if closed is None:
+            closed = await _load_totals(session, family_id, bucket, group_by, start, closed_end)
+            series_cache.set(cache_key, closed)
+    current = await _load_totals(session, family_id, bucket, group_by, max(start, closed_end), end)
+
+    merged: Totals = defaultdict(dict)
+    for part in (closed, current):
+        for series_key, values in part.items():
+            merged[series_key].update(values)
+
+    zero = Decimal("0")
+    series = [
+        schemas.AnalyticsSeriesItem(key=key, name=name, values=[values.get(ts, zero) for ts in timestamps])
+        for (key, name), values in sorted(merged.items(), key=lambda item: (item[0][1] is None, item[0][1] or ""))
+    ]
+    return schemas.AnalyticsSeries(bucket=bucket, group_by=group_by, timestamps=timestamps, series=series)
@@ -1,23 +1,103 @@
-from typing import List
+from typing import List, Optional
+from datetime import date, datetime
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func, and_
+from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_session
-from .. import models, schemas
+from ..database import get_read_session, get_session
+from ..versions import bump_versions, conditional_get
+from ..rollup import month_start
+from ..tenancy import check_category, get_family_id
+from .. import events, models, schemas
 
 router = APIRouter(prefix="/api/budgets", tags=["budgets"])
 
+def _parse_month(value: str) -> date:
+    # Формат: YYYY-MM
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный формат месяца. Используйте YYYY-MM")
+
+def _next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
 @router.post("/", response_model=schemas.BudgetOut)
-async def create_budget(payload: schemas.BudgetCreate, session: AsyncSession = Depends(get_session)):
-    budget = models.Budget(**payload.model_dump())
+async def create_budget(
+    payload: schemas.BudgetCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
+    await check_category(session, family_id, payload.category_id)
+    budget = models.Budget(**payload.model_dump(), family_id=family_id)
     session.add(budget)
+    await bump_versions(session, family_id, "budgets")
+    await session.flush()
+    await events.record(session, family_id, "budgets", "create", budget.id)
     await session.commit()
-    await session.refresh(budget)
-    return budget
+    # reload with category eagerly loaded: BudgetOut читает budget.category
+    res = await session.execute(
+        select(models.Budget).options(selectinload(models.Budget.category)).where(models.Budget.id == budget.id)
+    )
+    return res.scalar_one()
 
-@router.get("/", response_model=List[schemas.BudgetOut])
-async def list_budgets(session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Budget).order_by(models.Budget.month.desc()))
+@router.get("/", response_model=List[schemas.BudgetOut], dependencies=[Depends(conditional_get("budgets", "categories"))])
+async def list_budgets(
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    res = await session.execute(
+        select(models.Budget)
+        .options(selectinload(models.Budget.category))
+        .where(models.Budget.family_id == family_id)
+        .order_by(models.Budget.month.desc())
+    )
     return res.scalars().all()
+
+@router.get(
+    "/report",
+    response_model=List[schemas.BudgetReportRow],
+    dependencies=[Depends(conditional_get("budgets", "categories", "expenses"))],
+)
+async def budget_report(
+    month_from: str = Query(..., alias="from"),
+    month_to: Optional[str] = Query(None, alias="to"),
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # План против факта одним сгруппированным запросом: бюджеты за диапазон
+    # месяцев соединяются с помесячными итогами расходов по категориям
+    start = _parse_month(month_from)
+    end = _next_month(_parse_month(month_to) if month_to else start)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Конец диапазона раньше начала")
+
+    dialect_name = session.bind.dialect.name
+    budget, rollup = models.Budget, models.CategoryMonthRollup
+    budget_month = month_start(budget.month, dialect_name)
+    spent = func.coalesce(func.sum(rollup.expense_total), 0)
+    res = await session.execute(
+        select(budget_month.label("month"), budget.category_id, models.Category.name, budget.planned, spent)
+        .join(models.Category, models.Category.id == budget.category_id)
+        .outerjoin(rollup, and_(
+            rollup.family_id == family_id, rollup.category_id == budget.category_id, rollup.month == budget_month,
+        ))
+        .where(budget.family_id == family_id, budget.month >= start, budget.month < end)
+        .group_by(budget.id, budget_month, budget.category_id, models.Category.name, budget.planned)
+        .order_by(budget_month, models.Category.name)
+    )
+
+    report = []
+    for month, category_id, category, planned, spent_total in res.all():
+        report.append(schemas.BudgetReportRow(
+            month=month,
+            category_id=category_id,
+            category=category,
+            planned=planned,
+            spent=spent_total,
+            remaining=planned - spent_total,
+            percent_used=round(float(spent_total) * 100 / float(planned), 1) if planned else None,
+        ))
+    return report
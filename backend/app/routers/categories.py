@@ -3,47 +3,77 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
 
-from ..database import get_session
-from .. import models, schemas
+from ..database import get_read_session, get_session
+from ..rollup import detach_rollup
+from ..versions import bump_versions, conditional_get
+from ..tenancy import get_family_id
+from .. import events, models, schemas
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
-@router.get("/", response_model=List[schemas.CategoryOut])
-async def list_categories(session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(models.Category))
+@router.get("/", response_model=List[schemas.CategoryOut], dependencies=[Depends(conditional_get("categories"))])
+async def list_categories(
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    result = await session.execute(select(models.Category).where(models.Category.family_id == family_id))
     return result.scalars().all()
 
-@router.get("/{category_id}", response_model=schemas.CategoryOut)
-async def get_category(category_id: int, session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Category).where(models.Category.id == category_id))
+@router.get("/{category_id}", response_model=schemas.CategoryOut, dependencies=[Depends(conditional_get("categories"))])
+async def get_category(
+    category_id: int,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    res = await session.execute(
+        select(models.Category).where(models.Category.id == category_id, models.Category.family_id == family_id)
+    )
     category = res.scalar()
     if not category:
         raise HTTPException(status_code=404, detail="Категория не найдена")
     return category
 
 @router.post("/", response_model=schemas.CategoryOut)
-async def create_category(payload: schemas.CategoryCreate, session: AsyncSession = Depends(get_session)):
-    exists = await session.execute(select(models.Category).where(models.Category.name == payload.name))
+async def create_category(
+    payload: schemas.CategoryCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
+    exists = await session.execute(
+        select(models.Category).where(models.Category.family_id == family_id, models.Category.name == payload.name)
+    )
     if exists.scalar():
         raise HTTPException(status_code=400, detail="Category already exists")
-    cat = models.Category(**payload.model_dump())
+    cat = models.Category(**payload.model_dump(), family_id=family_id)
     session.add(cat)
+    await bump_versions(session, family_id, "categories")
+    await session.flush()
+    await events.record(session, family_id, "categories", "create", cat.id, data=schemas.CategoryOut.model_validate(cat))
     await session.commit()
     await session.refresh(cat)
     return cat
 
 @router.delete("/{category_id}", response_model=schemas.CategoryOut)
-async def delete_category(category_id: int, session: AsyncSession = Depends(get_session)):
+async def delete_category(
+    category_id: int,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
     # Проверка существования категории
-    res = await session.execute(select(models.Category).where(models.Category.id == category_id))
+    res = await session.execute(
+        select(models.Category).where(models.Category.id == category_id, models.Category.family_id == family_id)
+    )
     category = res.scalar()
     if not category:
         raise HTTPException(status_code=404, detail="Категория не найдена")
     
     # Проверка наличия связанных записей можно добавить позже
     
-    # Удаляем категорию
+    # Удаляем категорию; её итоги переходят в «без категории»
+    await detach_rollup(session, family_id, "category_id", category_id)
     await session.delete(category)
+    await bump_versions(session, family_id, "categories", "expenses", "incomes", "budgets")
+    await events.record(session, family_id, "categories", "delete", category_id)
     await session.commit()
     
     return category
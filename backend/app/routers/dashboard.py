@@ -0,0 +1,62 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from ..database import get_read_session_factory
+from ..versions import conditional_get
+from ..tenancy import get_family_id
+from .expenses import category_summary
+from .. import models, schemas
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+
+
+async def _load_accounts(session_factory, family_id: int):
+    async with session_factory() as session:
+        res = await session.execute(
+            select(models.Account).where(models.Account.family_id == family_id).order_by(models.Account.id)
+        )
+        return res.scalars().all()
+
+
+async def _load_recent_expenses(session_factory, family_id: int, limit: int):
+    async with session_factory() as session:
+        res = await session.execute(
+            select(models.Expense)
+            .options(selectinload(models.Expense.category))
+            .where(models.Expense.family_id == family_id)
+            .order_by(models.Expense.spent_at.desc(), models.Expense.id.desc())
+            .limit(limit)
+        )
+        return res.scalars().all()
+
+
+async def _load_summary(session_factory, family_id: int):
+    async with session_factory() as session:
+        return await category_summary(session, family_id)
+
+
+@router.get(
+    "/",
+    response_model=schemas.Dashboard,
+    dependencies=[Depends(conditional_get("accounts", "expenses", "categories"))],
+)
+async def dashboard(
+    recent: int = Query(20, ge=1, le=100),
+    session_factory=Depends(get_read_session_factory),
+    family_id: int = Depends(get_family_id),
+):
+    # Данные первого экрана одним ответом: запросы идут параллельно, каждый
+    # на своём соединении из пула
+    accounts, expenses, summary = await asyncio.gather(
+        _load_accounts(session_factory, family_id),
+        _load_recent_expenses(session_factory, family_id, recent),
+        _load_summary(session_factory, family_id),
+    )
+    return schemas.Dashboard(
+        accounts=[schemas.AccountOut.model_validate(a) for a in accounts],
+        expenses=[schemas.ExpenseOut.model_validate(e) for e in expenses],
+        summary=summary,
+    )
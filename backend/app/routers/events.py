@@ -0,0 +1,36 @@
+import asyncio
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from ..events import EVENTS_KEEPALIVE, broker, format_event
+from ..tenancy import get_family_id
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+
+@router.get("")
+async def change_feed(family_id: int = Depends(get_family_id)):
+    # Server-Sent Events: изменения данных семьи по мере фиксации. Соединение
+    # с базой поток не держит, только очередь подписчика в памяти процесса
+    queue = broker.subscribe(family_id)
+
+    async def stream():
+        try:
+            # Клиент переподключается через 3 с после обрыва
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    change = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(change)
+        finally:
+            broker.unsubscribe(family_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
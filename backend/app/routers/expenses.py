@@ -1,53 +1,164 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text
+from sqlalchemy import select, delete, func, and_, tuple_
 from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+from decimal import Decimal
 
-from ..database import get_session
-from .. import models, schemas
+from ..database import get_read_session, get_session
+from ..versions import bump_versions, conditional_get, history
+from ..partitions import by_key
+from ..pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from ..bulk import bulk_create
+from ..checkpoints import shift_checkpoints
+from ..reconcile import forget_reconciled
+from ..rollup import apply_rollup
+from ..balances import change_balance, balance_error
+from ..tenancy import check_category, get_family_id
+from ..idempotency import commit_with_response, find_response, get_idempotency_key, request_hash
+from .. import events, fastjson, models, schemas
 
 router = APIRouter(prefix="/api/expenses", tags=["expenses"])
 
+async def category_summary(session: AsyncSession, family_id: int) -> List[schemas.ExpenseSummary]:
+    # Итоги читаются из помесячных агрегатов, а не из всей таблицы расходов
+    rollup = models.CategoryMonthRollup
+    res = await session.execute(
+        select(models.Category.name, func.sum(rollup.expense_total))
+        .join(rollup, and_(rollup.family_id == family_id, rollup.category_id == models.Category.id))
+        .where(models.Category.family_id == family_id)
+        .group_by(models.Category.name)
+        .having(func.sum(rollup.expense_total) > 0)
+    )
+    return [schemas.ExpenseSummary(category=row[0], total=row[1]) for row in res.all()]
+
 @router.post("/", response_model=schemas.ExpenseOut)
-async def create_expense(payload: schemas.ExpenseCreate, session: AsyncSession = Depends(get_session)):
-    expense = models.Expense(**payload.model_dump())
+async def create_expense(
+    payload: schemas.ExpenseCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
+    fingerprint = request_hash("expenses", payload)
+    replay = await find_response(session, family_id, idempotency_key, fingerprint)
+    if replay is not None:
+        return replay
+    await check_category(session, family_id, payload.category_id)
+    # update account balance: проверка остатка и списание одним UPDATE
+    if await change_balance(session, family_id, payload.account_id, -payload.amount, require_funds=True) is None:
+        raise await balance_error(session, family_id, payload.account_id)
+
+    expense = models.Expense(**payload.model_dump(), family_id=family_id)
     session.add(expense)
+    await session.flush()
+    key = [(expense.id, expense.spent_at)]
+    await apply_rollup(session, models.Expense, key, sign=1)
+    await bump_versions(session, family_id, "expenses", "accounts")
+    # Ответ собирается до фиксации: его снимок сохраняется вместе с операцией
+    res = await session.execute(
+        select(models.Expense)
+        .options(selectinload(models.Expense.category))
+        .where(by_key(session, models.Expense, key))
+        .execution_options(populate_existing=True)
+    )
+    out = schemas.ExpenseOut.model_validate(res.scalar_one())
+    await events.record(session, family_id, "expenses", "create", out.id, data=out, accounts=[out.account_id])
+    return await commit_with_response(session, family_id, idempotency_key, fingerprint, out) or out
 
-    # update account balance
-    account = await session.get(models.Account, payload.account_id)
-    if account:
-        if account.balance < payload.amount:
-            raise HTTPException(status_code=400, detail="Insufficient funds on account")
-        account.balance -= payload.amount
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_expenses_bulk(
+    payload: schemas.ExpenseBulkCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
+    return await bulk_create(session, family_id, models.Expense, payload.items, sign=-1)
 
-        await session.commit()
-    # reload with category eagerly loaded to avoid greenlet issues
-    res = await session.execute(
-        select(models.Expense).options(selectinload(models.Expense.category)).where(models.Expense.id == expense.id)
+@router.get("/", response_model=List[schemas.ExpenseOut], dependencies=[Depends(conditional_get("expenses", "categories"))])
+async def list_expenses(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    account_id: Optional[int] = None,
+    amount_min: Optional[Decimal] = None,
+    amount_max: Optional[Decimal] = None,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Keyset-пагинация по (spent_at, id): стоимость страницы не зависит от глубины
+    conditions = [models.Expense.family_id == family_id]
+    if cursor:
+        cur_ts, cur_id = decode_cursor(cursor, datetime, int)
+        conditions.append(tuple_(models.Expense.spent_at, models.Expense.id) < tuple_(cur_ts, cur_id))
+    if date_from is not None:
+        conditions.append(models.Expense.spent_at >= date_from)
+    if date_to is not None:
+        conditions.append(models.Expense.spent_at < date_to)
+    if category_id is not None:
+        conditions.append(models.Expense.category_id == category_id)
+    if account_id is not None:
+        conditions.append(models.Expense.account_id == account_id)
+    if amount_min is not None:
+        conditions.append(models.Expense.amount >= amount_min)
+    if amount_max is not None:
+        conditions.append(models.Expense.amount <= amount_max)
+
+    if fastjson.FAST_LIST_RESPONSES:
+        stmt = fastjson.select_with_category(models.Expense, models.Expense.spent_at)
+    else:
+        stmt = select(models.Expense).options(selectinload(models.Expense.category))
+    stmt = (
+        stmt.where(*conditions)
+        .order_by(models.Expense.spent_at.desc(), models.Expense.id.desc())
+        .limit(limit + 1)
     )
-    return res.scalar_one()
 
-@router.get("/", response_model=List[schemas.ExpenseOut])
-async def list_expenses(session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Expense).options(selectinload(models.Expense.category)).order_by(models.Expense.spent_at.desc()))
-    return res.scalars().all()
+    if fastjson.FAST_LIST_RESPONSES:
+        rows = await fastjson.fetch_rows(session, stmt)
+    else:
+        rows = (await session.execute(stmt)).scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.spent_at, last.id)
+    if fastjson.FAST_LIST_RESPONSES:
+        return fastjson.json_rows(fastjson.expense_rows, fastjson.rows_with_category(rows, "spent_at"), response)
+    return rows
 
-@router.get("/{expense_id:int}", response_model=schemas.ExpenseOut)
-async def get_expense(expense_id: int, session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Expense).options(selectinload(models.Expense.category)).where(models.Expense.id == expense_id))
+@router.get("/{expense_id:int}", response_model=schemas.ExpenseOut, dependencies=[Depends(conditional_get("expenses", "categories"))])
+async def get_expense(
+    expense_id: int,
+    spent_at: Optional[datetime] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Время расхода (из списка или ответа на создание) сужает поиск до
+    # секции его месяца; без него просматриваются все секции
+    match = by_key(session, models.Expense, [(expense_id, spent_at)]) if spent_at else models.Expense.id == expense_id
+    res = await session.execute(
+        select(models.Expense)
+        .options(selectinload(models.Expense.category))
+        .where(match, models.Expense.family_id == family_id)
+    )
     expense = res.scalar()
     if not expense:
         raise HTTPException(status_code=404, detail="Расход не найден")
     return expense
 
 @router.delete("/{expense_id:int}", response_model=schemas.ExpenseOut)
-async def delete_expense(expense_id: int, session: AsyncSession = Depends(get_session)):
+async def delete_expense(
+    expense_id: int,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
     # Загружаем расход вместе с категорией
     res = await session.execute(
         select(models.Expense).options(
             selectinload(models.Expense.category)
-        ).where(models.Expense.id == expense_id)
+        ).where(models.Expense.id == expense_id, models.Expense.family_id == family_id)
     )
     expense = res.scalar()
     if not expense:
@@ -69,48 +180,49 @@ async def delete_expense(expense_id: int, session: AsyncSession = Depends(get_se
     )
     
     # Восстанавливаем баланс счета при удалении расхода
-    res = await session.execute(select(models.Account).where(models.Account.id == expense.account_id))
-    account = res.scalar()
-    if account:
-        account.balance += expense.amount  # Возвращаем потраченную сумму обратно на счет
-        session.add(account)
+    if expense.account_id is not None:
+        await change_balance(session, family_id, expense.account_id, expense.amount)
     
-    await session.delete(expense)
+    key = [(expense.id, expense.spent_at)]
+    await apply_rollup(session, models.Expense, key, sign=-1)
+    await shift_checkpoints(session, models.Expense, key, sign=1)
+    await forget_reconciled(session, models.Expense, key, sign=1)
+    # С ключом секционирования удаление затрагивает только секцию своего месяца
+    await session.execute(
+        delete(models.Expense).where(by_key(session, models.Expense, key))
+    )
+    await bump_versions(session, family_id, "expenses", history("expenses"), "accounts")
+    await events.record(session, family_id, "expenses", "delete", expense.id, data=expense_data, accounts=[expense_data.account_id])
     await session.commit()
     
     return expense_data
 
-@router.get("/summary", response_model=List[schemas.ExpenseSummary])
-async def summary_by_category(session: AsyncSession = Depends(get_session)):
-    res = await session.execute(
-        select(models.Category.name, func.sum(models.Expense.amount))
-        .join(models.Expense, models.Expense.category_id == models.Category.id)
-        .group_by(models.Category.name)
-    )
-    return [schemas.ExpenseSummary(category=row[0], total=row[1]) for row in res.all()]
+@router.get("/summary", response_model=List[schemas.ExpenseSummary], dependencies=[Depends(conditional_get("expenses", "categories"))])
+async def summary_by_category(
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    return await category_summary(session, family_id)
 
-@router.get("/summary/{month}", response_model=List[schemas.ExpenseSummary])
-async def summary_by_category_month(month: str, session: AsyncSession = Depends(get_session)):
+@router.get("/summary/{month}", response_model=List[schemas.ExpenseSummary], dependencies=[Depends(conditional_get("expenses", "categories"))])
+async def summary_by_category_month(
+    month: str,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
     # Формат month: YYYY-MM
     try:
-        year, month_num = month.split('-')
-        start_date = f"{month}-01"
-        if month_num == "12":
-            end_date = f"{int(year) + 1}-01-01"
-        else:
-            end_date = f"{year}-{int(month_num) + 1:02d}-01"
+        month_date = datetime.strptime(month, "%Y-%m").date()
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат месяца. Используйте YYYY-MM")
-    
-    # Используем другой подход с функциями SQLAlchemy для даты
-    sql = text("""
-    SELECT c.name, COALESCE(SUM(e.amount), 0) as total
-    FROM categories c
-    LEFT JOIN expenses e ON e.category_id = c.id AND
-                          e.spent_at >= to_date(:start_date, 'YYYY-MM-DD') AND
-                          e.spent_at < to_date(:end_date, 'YYYY-MM-DD')
-    GROUP BY c.name
-    """)
-    
-    res = await session.execute(sql, {"start_date": start_date, "end_date": end_date})
+
+    rollup = models.CategoryMonthRollup
+    res = await session.execute(
+        select(models.Category.name, func.coalesce(func.sum(rollup.expense_total), 0))
+        .outerjoin(rollup, and_(
+            rollup.family_id == family_id, rollup.category_id == models.Category.id, rollup.month == month_date,
+        ))
+        .where(models.Category.family_id == family_id)
+        .group_by(models.Category.name)
+    )
     return [schemas.ExpenseSummary(category=row[0], total=row[1]) for row in res.all()]
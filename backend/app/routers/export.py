@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, literal, cast, union_all, String
+
+from ..database import get_read_session_factory
+from ..tenancy import get_family_id
+from .. import models
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+LEDGER_COLUMNS = ["kind", "id", "occurred_at", "amount", "category", "account_id", "description"]
+
+# Сколько строк забирать с сервера за одну порцию курсора
+BATCH_SIZE = 1000
+
+
+def ledger_query(family_id: int, kind: str, date_from: Optional[datetime], date_to: Optional[datetime]):
+    branches = []
+    sources = [
+        ("expense", models.Expense, models.Expense.spent_at),
+        ("income", models.Income, models.Income.received_at),
+    ]
+    for name, model, ts in sources:
+        if kind != "all" and kind != name:
+            continue
+        branch = (
+            select(
+                cast(literal(name), String).label("kind"),
+                model.id.label("id"),
+                ts.label("occurred_at"),
+                model.amount.label("amount"),
+                models.Category.name.label("category"),
+                model.account_id.label("account_id"),
+                model.description.label("description"),
+            )
+            .outerjoin(models.Category, models.Category.id == model.category_id)
+            .where(model.family_id == family_id)
+        )
+        if date_from is not None:
+            branch = branch.where(ts >= date_from)
+        if date_to is not None:
+            branch = branch.where(ts < date_to)
+        branches.append(branch)
+    ledger = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery("ledger")
+    # Сортировка только по времени позволяет Postgres слить ветки по индексам
+    # (Merge Append) без общей сортировки всего набора
+    return select(ledger).order_by(ledger.c.occurred_at)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def format_csv(rows, header: bool) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(LEDGER_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            v.isoformat() if isinstance(v, datetime) else ("" if v is None else v)
+            for v in row
+        ])
+    return buf.getvalue()
+
+
+def format_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(LEDGER_COLUMNS, row)), default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+@router.get("/ledger")
+async def export_ledger(
+    format: Literal["csv", "ndjson"] = "csv",
+    kind: Literal["all", "expense", "income"] = "all",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    session_factory=Depends(get_read_session_factory),
+    family_id: int = Depends(get_family_id),
+):
+    stmt = ledger_query(family_id, kind, date_from, date_to)
+
+    async def generate():
+        # Заголовок CSV уходит клиенту до первого обращения к БД
+        if format == "csv":
+            yield format_csv([], header=True)
+        async with session_factory() as session:
+            # Серверный курсор: в памяти одновременно не больше BATCH_SIZE строк
+            result = await session.stream(stmt.execution_options(yield_per=BATCH_SIZE))
+            async for rows in result.partitions():
+                yield format_csv(rows, header=False) if format == "csv" else format_ndjson(rows)
+
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"ledger.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import auth, models, schemas
+from ..database import get_session, get_session_factory
+from ..tenancy import get_family_id
+
+router = APIRouter(prefix="/api/family", tags=["family"])
+
+
+def _require_user(user: Optional[schemas.CurrentUser] = Depends(auth.get_current_user)) -> schemas.CurrentUser:
+    # Без BOT_TOKEN все запросы и так относятся к одной семье
+    if user is None:
+        raise HTTPException(status_code=400, detail="Приглашения работают только с авторизацией Telegram")
+    return user
+
+
+async def _family_out(session: AsyncSession, family_id: int) -> schemas.FamilyOut:
+    family = await session.get(models.Family, family_id)
+    if family is None:
+        raise HTTPException(status_code=404, detail="Семья не найдена")
+    res = await session.execute(
+        select(models.User).where(models.User.family_id == family_id).order_by(models.User.id)
+    )
+    members = [schemas.FamilyMember.model_validate(user) for user in res.scalars().all()]
+    return schemas.FamilyOut(id=family.id, name=family.name, members=members)
+
+
+@router.get("", response_model=schemas.FamilyOut)
+async def get_family(session: AsyncSession = Depends(get_session), family_id: int = Depends(get_family_id)):
+    return await _family_out(session, family_id)
+
+
+@router.post("/invite", response_model=schemas.FamilyInvite)
+async def create_invite(user: schemas.CurrentUser = Depends(_require_user)):
+    code, expires = auth.make_invite(user.family_id, auth.BOT_TOKEN)
+    return schemas.FamilyInvite(code=code, expires_at=datetime.fromtimestamp(expires, timezone.utc))
+
+
+@router.post("/join", response_model=schemas.FamilyOut)
+async def join_family(
+    payload: schemas.FamilyJoin,
+    user: schemas.CurrentUser = Depends(_require_user),
+    session: AsyncSession = Depends(get_session),
+    session_factory=Depends(get_session_factory),
+):
+    try:
+        family_id = auth.check_invite(payload.code, auth.BOT_TOKEN)
+        user = await auth.join_family(session_factory, user, family_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Приглашение недействительно или истекло")
+    return await _family_out(session, user.family_id)
@@ -1,45 +1,96 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_session
-from .. import models, schemas
+from ..database import get_read_session, get_session
+from ..versions import bump_versions, conditional_get, history
+from ..bulk import bulk_create
+from ..partitions import by_key
+from ..checkpoints import shift_checkpoints
+from ..reconcile import forget_reconciled
+from ..rollup import apply_rollup
+from ..balances import change_balance, balance_error
+from ..tenancy import check_category, get_family_id
+from ..idempotency import commit_with_response, find_response, get_idempotency_key, request_hash
+from .. import events, fastjson, models, schemas
 
 router = APIRouter(prefix="/api/incomes", tags=["incomes"])
 
 @router.post("/", response_model=schemas.IncomeOut)
-async def create_income(payload: schemas.IncomeCreate, session: AsyncSession = Depends(get_session)):
-    income = models.Income(**payload.model_dump())
-    session.add(income)
+async def create_income(
+    payload: schemas.IncomeCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
+    fingerprint = request_hash("incomes", payload)
+    replay = await find_response(session, family_id, idempotency_key, fingerprint)
+    if replay is not None:
+        return replay
+    await check_category(session, family_id, payload.category_id)
     # update account balance
-    account = await session.get(models.Account, payload.account_id)
-    if account:
-        account.balance += payload.amount
-        await session.commit()
-    # reload with category eagerly loaded
+    if await change_balance(session, family_id, payload.account_id, payload.amount) is None:
+        raise await balance_error(session, family_id, payload.account_id)
+
+    income = models.Income(**payload.model_dump(), family_id=family_id)
+    session.add(income)
+    await session.flush()
+    key = [(income.id, income.received_at)]
+    await apply_rollup(session, models.Income, key, sign=1)
+    await bump_versions(session, family_id, "incomes", "accounts")
+    # Ответ собирается до фиксации: его снимок сохраняется вместе с операцией
     res = await session.execute(
-        select(models.Income).options(selectinload(models.Income.category)).where(models.Income.id == income.id)
+        select(models.Income)
+        .options(selectinload(models.Income.category))
+        .where(by_key(session, models.Income, key))
+        .execution_options(populate_existing=True)
     )
-    return res.scalar_one()
+    out = schemas.IncomeOut.model_validate(res.scalar_one())
+    await events.record(session, family_id, "incomes", "create", out.id, data=out, accounts=[out.account_id])
+    return await commit_with_response(session, family_id, idempotency_key, fingerprint, out) or out
 
-@router.get("/{income_id}", response_model=schemas.IncomeOut)
-async def get_income(income_id: int, session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Income).options(selectinload(models.Income.category)).where(models.Income.id == income_id))
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_incomes_bulk(
+    payload: schemas.IncomeBulkCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
+    return await bulk_create(session, family_id, models.Income, payload.items, sign=1)
+
+@router.get("/{income_id}", response_model=schemas.IncomeOut, dependencies=[Depends(conditional_get("incomes", "categories"))])
+async def get_income(
+    income_id: int,
+    received_at: Optional[datetime] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    # Время дохода сужает поиск до секции его месяца, как у get_expense
+    match = by_key(session, models.Income, [(income_id, received_at)]) if received_at else models.Income.id == income_id
+    res = await session.execute(
+        select(models.Income)
+        .options(selectinload(models.Income.category))
+        .where(match, models.Income.family_id == family_id)
+    )
     income = res.scalar()
     if not income:
         raise HTTPException(status_code=404, detail="Доход не найден")
     return income
 
 @router.delete("/{income_id}", response_model=schemas.IncomeOut)
-async def delete_income(income_id: int, session: AsyncSession = Depends(get_session)):
+async def delete_income(
+    income_id: int,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+):
     # Загружаем доход вместе с категорией
     res = await session.execute(
         select(models.Income).options(
             selectinload(models.Income.category)
-        ).where(models.Income.id == income_id)
+        ).where(models.Income.id == income_id, models.Income.family_id == family_id)
     )
     income = res.scalar()
     if not income:
@@ -61,19 +112,43 @@ async def delete_income(income_id: int, session: AsyncSession = Depends(get_sess
     )
     
     # Восстанавливаем баланс счета
-    res = await session.execute(select(models.Account).where(models.Account.id == income.account_id))
-    account = res.scalar()
-    if account:
-        account.balance -= income.amount
-        session.add(account)
+    if income.account_id is not None:
+        await change_balance(session, family_id, income.account_id, -income.amount)
         
     # Удаляем доход
-    await session.delete(income)
+    key = [(income.id, income.received_at)]
+    await apply_rollup(session, models.Income, key, sign=-1)
+    await shift_checkpoints(session, models.Income, key, sign=-1)
+    await forget_reconciled(session, models.Income, key, sign=-1)
+    # С ключом секционирования удаление затрагивает только секцию своего месяца
+    await session.execute(
+        delete(models.Income).where(by_key(session, models.Income, key))
+    )
+    await bump_versions(session, family_id, "incomes", history("incomes"), "accounts")
+    await events.record(session, family_id, "incomes", "delete", income.id, data=income_data, accounts=[income_data.account_id])
     await session.commit()
     
     return income_data
 
-@router.get("/", response_model=List[schemas.IncomeOut])
-async def list_incomes(session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Income).options(selectinload(models.Income.category)).order_by(models.Income.received_at.desc()))
+@router.get("/", response_model=List[schemas.IncomeOut], dependencies=[Depends(conditional_get("incomes", "categories"))])
+async def list_incomes(
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    in_family = models.Income.family_id == family_id
+    if fastjson.FAST_LIST_RESPONSES:
+        rows = await fastjson.fetch_rows(
+            session,
+            fastjson.select_with_category(models.Income, models.Income.received_at)
+            .where(in_family)
+            .order_by(models.Income.received_at.desc()),
+        )
+        return fastjson.json_rows(fastjson.income_rows, fastjson.rows_with_category(rows, "received_at"), response)
+    res = await session.execute(
+        select(models.Income)
+        .options(selectinload(models.Income.category))
+        .where(in_family)
+        .order_by(models.Income.received_at.desc())
+    )
     return res.scalars().all()
@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+from datetime import date, datetime, timezone
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+from sqlalchemy import func, select
+
+from ..database import get_read_session_factory, get_session_factory
+from ..jobs import JOB_FILE_DIR
+from ..reconcile import reconcile
+from ..tenancy import get_family_id
+from .export import BATCH_SIZE, format_csv, format_ndjson, ledger_query
+from .. import models, schemas
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+def _next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+async def run_summary(job, session_factory):
+    # Помесячные итоги по категориям за несколько лет из агрегатов; каждый год
+    # читается в своей сессии, соединение не держится на весь отчёт
+    params = job.params
+    start = params.date_from.replace(day=1)
+    end = _next_month((params.date_to or datetime.now(timezone.utc).date()).replace(day=1))
+    if end <= start:
+        raise ValueError("Конец диапазона раньше начала")
+    rollup = models.CategoryMonthRollup
+    years = range(start.year, end.year + 1)
+    rows = []
+    for done, year in enumerate(years, 1):
+        chunk_start, chunk_end = max(start, date(year, 1, 1)), min(end, date(year + 1, 1, 1))
+        if chunk_start < chunk_end:
+            async with session_factory() as session:
+                res = await session.execute(
+                    select(
+                        rollup.month, rollup.category_id, models.Category.name,
+                        func.sum(rollup.expense_total), func.sum(rollup.income_total),
+                    )
+                    .outerjoin(models.Category, models.Category.id == rollup.category_id)
+                    .where(rollup.family_id == job.family_id, rollup.month >= chunk_start, rollup.month < chunk_end)
+                    .group_by(rollup.month, rollup.category_id, models.Category.name)
+                    .order_by(rollup.month, rollup.category_id)
+                )
+                rows.extend(
+                    schemas.MonthSummaryRow(
+                        month=month, category_id=category_id or None, category=name,
+                        expense_total=expense_total, income_total=income_total,
+                    ).model_dump(mode="json")
+                    for month, category_id, name, expense_total, income_total in res.all()
+                    if expense_total or income_total
+                )
+        job.progress = done / len(years)
+    return rows
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite возвращает время без пояса, Postgres — в UTC
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+async def run_export(job, session_factory):
+    # Журнал пишется во временный файл по мере чтения; файл отдаётся через
+    # /api/jobs/{id}/result и удаляется вместе с результатом задачи. Строки
+    # идут по времени, поэтому прогресс — доля диапазона до последней
+    # прочитанной строки, без отдельного подсчёта
+    params = job.params
+    stmt = ledger_query(job.family_id, params.kind, params.date_from, params.date_to)
+    end = _timestamp(params.date_to or job.created_at)
+    start = _timestamp(params.date_from) if params.date_from else None
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{params.format}", dir=JOB_FILE_DIR)
+    try:
+        with open(fd, "w", encoding="utf-8", newline="") as out:
+            if params.format == "csv":
+                out.write(format_csv([], header=True))
+            async with session_factory() as session:
+                result = await session.stream(stmt.execution_options(yield_per=BATCH_SIZE))
+                async for rows in result.partitions():
+                    out.write(format_csv(rows, header=False) if params.format == "csv" else format_ndjson(rows))
+                    job.processed += len(rows)
+                    if start is None:
+                        start = _timestamp(rows[0].occurred_at)
+                    if end > start:
+                        job.progress = min(1.0, max(0.0, (_timestamp(rows[-1].occurred_at) - start) / (end - start)))
+    except BaseException:
+        os.unlink(path)
+        raise
+    media_type = "text/csv; charset=utf-8" if params.format == "csv" else "application/x-ndjson"
+    job.file = (path, media_type, f"ledger.{params.format}")
+    return {"rows": job.processed, "url": f"/api/jobs/{job.id}/result"}
+
+
+async def run_reconcile(job, session_factory):
+    async with session_factory() as session:
+        res = await session.execute(
+            select(func.count()).select_from(models.Account).where(models.Account.family_id == job.family_id)
+        )
+        total = res.scalar()
+
+        def progress(checked: int):
+            job.progress = checked / total if total else 1.0
+
+        report = await reconcile(session, repair=job.params.repair, family_id=job.family_id, progress=progress)
+    return report.model_dump(mode="json")
+
+
+# Тип задачи -> (параметры, исполнитель, пишет ли задача в базу)
+JOB_KINDS = {
+    "summary": (schemas.JobSummaryParams, run_summary, False),
+    "export": (schemas.JobExportParams, run_export, False),
+    "reconcile": (schemas.JobReconcileParams, run_reconcile, True),
+}
+
+
+def _job_or_404(request: Request, job_id: str, family_id: int):
+    job = request.app.state.jobs.get(job_id)
+    if job is None or job.family_id != family_id:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@router.post("/{kind}", response_model=schemas.JobOut, status_code=202)
+async def create_job(
+    kind: str,
+    request: Request,
+    body: dict = Body(default_factory=dict),
+    read_session_factory=Depends(get_read_session_factory),
+    session_factory=Depends(get_session_factory),
+    family_id: int = Depends(get_family_id),
+):
+    if kind not in JOB_KINDS:
+        raise HTTPException(status_code=404, detail="Неизвестный тип задачи")
+    params_model, runner, writes = JOB_KINDS[kind]
+    try:
+        params = params_model.model_validate(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    job = request.app.state.jobs.submit(
+        kind, family_id, params, runner, session_factory if writes else read_session_factory
+    )
+    if job is None:
+        raise HTTPException(status_code=503, detail="Очередь задач переполнена, повторите позже")
+    return job
+
+
+@router.get("/{job_id}", response_model=schemas.JobOut)
+async def get_job(job_id: str, request: Request, family_id: int = Depends(get_family_id)):
+    return _job_or_404(request, job_id, family_id)
+
+
+@router.get("/{job_id}/result")
+async def get_job_file(job_id: str, request: Request, family_id: int = Depends(get_family_id)):
+    job = _job_or_404(request, job_id, family_id)
+    if job.file is None:
+        raise HTTPException(status_code=404, detail="У задачи нет файла результата")
+    path, media_type, filename = job.file
+    return FileResponse(path, media_type=media_type, filename=filename)
@@ -1,36 +1,59 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_session
-from .. import models, schemas
+from ..database import get_read_session, get_session
+from ..versions import bump_versions, conditional_get
+from ..balances import transfer_balance
+from ..tenancy import get_family_id
+from ..idempotency import commit_with_response, find_response, get_idempotency_key, request_hash
+from .. import events, fastjson, models, schemas
 
 router = APIRouter(prefix="/api/transfers", tags=["transfers"])
 
 @router.post("/", response_model=schemas.TransferOut)
-async def create_transfer(payload: schemas.TransferCreate, session: AsyncSession = Depends(get_session)):
+async def create_transfer(
+    payload: schemas.TransferCreate,
+    session: AsyncSession = Depends(get_session),
+    family_id: int = Depends(get_family_id),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
     if payload.from_account_id == payload.to_account_id:
         raise HTTPException(status_code=400, detail="Accounts must be different")
+    fingerprint = request_hash("transfers", payload)
+    replay = await find_response(session, family_id, idempotency_key, fingerprint)
+    if replay is not None:
+        return replay
 
-    from_acc = await session.get(models.Account, payload.from_account_id)
-    to_acc = await session.get(models.Account, payload.to_account_id)
-    if not from_acc or not to_acc:
-        raise HTTPException(status_code=404, detail="Account not found")
-    if from_acc.balance < payload.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-
-    transfer = models.Transfer(**payload.model_dump())
-    from_acc.balance -= payload.amount
-    to_acc.balance += payload.amount
+    await transfer_balance(session, family_id, payload.from_account_id, payload.to_account_id, payload.amount)
 
+    transfer = models.Transfer(**payload.model_dump(), family_id=family_id)
     session.add(transfer)
-    await session.commit()
+    await bump_versions(session, family_id, "transfers", "accounts")
+    await session.flush()
     await session.refresh(transfer)
-    return transfer
-
-@router.get("/", response_model=List[schemas.TransferOut])
-async def list_transfers(session: AsyncSession = Depends(get_session)):
-    res = await session.execute(select(models.Transfer).order_by(models.Transfer.transferred_at.desc()))
+    out = schemas.TransferOut.model_validate(transfer)
+    await events.record(
+        session, family_id, "transfers", "create", out.id, data=out, accounts=[out.from_account_id, out.to_account_id]
+    )
+    return await commit_with_response(session, family_id, idempotency_key, fingerprint, out) or out
+
+@router.get("/", response_model=List[schemas.TransferOut], dependencies=[Depends(conditional_get("transfers"))])
+async def list_transfers(
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    family_id: int = Depends(get_family_id),
+):
+    t = models.Transfer
+    if fastjson.FAST_LIST_RESPONSES:
+        rows = await fastjson.fetch_rows(
+            session,
+            select(t.id, t.from_account_id, t.to_account_id, t.amount, t.description, t.transferred_at)
+            .where(t.family_id == family_id)
+            .order_by(t.transferred_at.desc()),
+        )
+        return fastjson.json_rows(fastjson.transfer_rows, [row._asdict() for row in rows], response)
+    res = await session.execute(select(t).where(t.family_id == family_id).order_by(t.transferred_at.desc()))
     return res.scalars().all()
@@ -0,0 +1,25 @@
+import hmac
+import json
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from .. import bot
+
+router = APIRouter(prefix="/webhook", tags=["webhook"])
+
+
+@router.post("/telegram", include_in_schema=False)
+async def telegram_webhook(request: Request):
+    # Секрет задаётся в setWebhook(secret_token=...); без него вебхук закрыт.
+    # Сравниваются байты: compare_digest не принимает строки с не-ASCII символами
+    secret = request.headers.get("x-telegram-bot-api-secret-token", "").encode()
+    if bot.TELEGRAM_WEBHOOK_SECRET is None or not hmac.compare_digest(secret, bot.TELEGRAM_WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="Неверный секрет вебхука")
+    try:
+        update = json.loads(await request.body())
+    except ValueError:
+        update = None
+    # Ответ не ждёт обработки: повторная доставка того же update ничего не исправит
+    if isinstance(update, dict):
+        request.app.state.bot.enqueue(update)
+    return Response(status_code=200)
@@ -1,6 +1,6 @@
-from typing import Optional, List, Literal
-from datetime import datetime
-from pydantic import BaseModel, condecimal
+from typing import Any, Optional, List, Literal
+from datetime import date, datetime
+from pydantic import BaseModel, condecimal, conlist
 
 
 class CategoryCreate(BaseModel):
@@ -30,6 +30,12 @@ class ExpenseOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ExpenseBulkItem(ExpenseCreate):
+    spent_at: Optional[datetime] = None
+
+class ExpenseBulkCreate(BaseModel):
+    items: conlist(ExpenseBulkItem, min_length=1, max_length=10000)
+
 class IncomeCreate(BaseModel):
     amount: condecimal(max_digits=14, decimal_places=2)
     category_id: Optional[int] = None
@@ -47,6 +53,21 @@ class IncomeOut(BaseModel):
     class Config:
         from_attributes = True
 
+class IncomeBulkItem(IncomeCreate):
+    received_at: Optional[datetime] = None
+
+class IncomeBulkCreate(BaseModel):
+    items: conlist(IncomeBulkItem, min_length=1, max_length=10000)
+
+class BulkRowResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    created: int
+    results: List[BulkRowResult]
+
 class AccountCreate(BaseModel):
     name: str
     balance: Optional[condecimal(max_digits=14, decimal_places=2)] = 0
@@ -59,6 +80,22 @@ class AccountOut(BaseModel):
     class Config:
         from_attributes = True
 
+class AccountBalanceAt(BaseModel):
+    account_id: int
+    at: datetime
+    balance: condecimal(max_digits=14, decimal_places=2)
+    checkpoint: Optional[date] = None
+
+class StatementEntry(BaseModel):
+    kind: Literal["expense", "income", "transfer_in", "transfer_out"]
+    id: int
+    occurred_at: datetime
+    amount: condecimal(max_digits=14, decimal_places=2)
+    balance_after: condecimal(max_digits=14, decimal_places=2)
+    description: Optional[str] = None
+    category_id: Optional[int] = None
+    counterparty_account_id: Optional[int] = None
+
 class TransferCreate(BaseModel):
     from_account_id: int
     to_account_id: int
@@ -90,6 +127,105 @@ class BudgetOut(BaseModel):
     class Config:
         from_attributes = True
 
+class BudgetReportRow(BaseModel):
+    month: date
+    category_id: int
+    category: Optional[str] = None
+    planned: condecimal(max_digits=14, decimal_places=2)
+    spent: condecimal(max_digits=14, decimal_places=2)
+    remaining: condecimal(max_digits=14, decimal_places=2)
+    percent_used: Optional[float] = None
+
 class ExpenseSummary(BaseModel):
     category: Optional[str]
     total: condecimal(max_digits=14, decimal_places=2)
+
+class Dashboard(BaseModel):
+    accounts: List[AccountOut]
+    expenses: List[ExpenseOut]
+    summary: List[ExpenseSummary]
+
+class AnalyticsSeriesItem(BaseModel):
+    key: Optional[int] = None
+    name: Optional[str] = None
+    values: List[condecimal(max_digits=14, decimal_places=2)]
+
+class AnalyticsSeries(BaseModel):
+    bucket: Literal["day", "week", "month"]
+    group_by: Literal["category", "account"]
+    timestamps: List[date]
+    series: List[AnalyticsSeriesItem]
+
+class ReconcileMismatch(BaseModel):
+    account_id: int
+    stored: condecimal(max_digits=14, decimal_places=2)
+    expected: condecimal(max_digits=14, decimal_places=2)
+    difference: condecimal(max_digits=14, decimal_places=2)
+    repaired: bool
+
+class ReconcileReport(BaseModel):
+    checked_accounts: int
+    new_rows: int
+    baselined: int
+    mismatches: List[ReconcileMismatch]
+
+class CurrentUser(BaseModel):
+    id: int
+    telegram_id: int
+    family_id: int
+
+    class Config:
+        from_attributes = True
+
+class FamilyMember(BaseModel):
+    first_name: Optional[str] = None
+    username: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class FamilyOut(BaseModel):
+    id: int
+    name: str
+    members: List[FamilyMember] = []
+
+class FamilyInvite(BaseModel):
+    code: str
+    expires_at: datetime
+
+class FamilyJoin(BaseModel):
+    code: str
+
+class JobSummaryParams(BaseModel):
+    date_from: date
+    date_to: Optional[date] = None
+
+class JobExportParams(BaseModel):
+    format: Literal["csv", "ndjson"] = "csv"
+    kind: Literal["all", "expense", "income"] = "all"
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+class JobReconcileParams(BaseModel):
+    repair: bool = False
+
+class MonthSummaryRow(BaseModel):
+    month: date
+    category_id: Optional[int] = None
+    category: Optional[str] = None
+    expense_total: condecimal(max_digits=14, decimal_places=2)
+    income_total: condecimal(max_digits=14, decimal_places=2)
+
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    status: Literal["queued", "running", "done", "failed"]
+    progress: float
+    processed: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .auth import get_current_user
+
+# Семья — единица изоляции данных. Каждая сущность принадлежит одной семье,
+# все запросы роутеров фильтруются по family_id, а индексы начинаются с него,
+# поэтому стоимость запроса зависит от данных одной семьи, а не всей установки.
+# Семья берётся из пользователя Telegram (app/auth.py); без проверки initData
+# (не задан BOT_TOKEN) — семья по умолчанию.
+
+DEFAULT_FAMILY_ID = models.DEFAULT_FAMILY_ID
+
+
+async def get_family_id(user: Optional[schemas.CurrentUser] = Depends(get_current_user)) -> int:
+    return user.family_id if user is not None else DEFAULT_FAMILY_ID
+
+
+async def ensure_default_family(session: AsyncSession):
+    dialect_name = session.bind.dialect.name
+    dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    await session.execute(
+        dialect_insert(models.Family).values(id=DEFAULT_FAMILY_ID, name="Моя семья").on_conflict_do_nothing()
+    )
+    if dialect_name == "postgresql":
+        # id задан явно, последовательность нужно догнать вручную
+        max_id = (await session.execute(select(func.max(models.Family.id)))).scalar()
+        await session.execute(
+            text("SELECT setval(pg_get_serial_sequence('families', 'id'), :value)"), {"value": max_id}
+        )
+    await session.commit()
+
+
+async def check_category(session: AsyncSession, family_id: int, category_id: Optional[int]):
+    # Ссылка на категорию другой семьи — то же, что на несуществующую
+    if category_id is None:
+        return
+    res = await session.execute(
+        select(models.Category.id).where(models.Category.id == category_id, models.Category.family_id == family_id)
+    )
+    if res.scalar() is None:
+        raise HTTPException(status_code=404, detail="Категория не найдена")
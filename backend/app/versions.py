@@ -0,0 +1,75 @@
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import get_read_session
+from .tenancy import get_family_id
+from . import models
+
+# Версии таблиц для условных GET, отдельные для каждой семьи. Каждая запись в
+# роутерах увеличивает версию затронутых таблиц в той же транзакции; GET строит ETag из версий таблиц,
+# от которых зависит ответ, и отвечает 304 по If-None-Match, не читая сами данные.
+
+
+def history(table: str) -> str:
+    # Отдельная версия для изменений задним числом (удаление, импорт с датой):
+    # по ней инвалидируются кэши закрытых периодов, которым не важны новые записи
+    return f"{table}:history"
+
+
+async def bump_versions(session: AsyncSession, family_id: int, *tables: str):
+    dialect_insert = sqlite.insert if session.bind.dialect.name == "sqlite" else postgresql.insert
+    table_version = models.TableVersion
+    # Порядок по имени — чтобы параллельные транзакции блокировали строки одинаково
+    for name in sorted(set(tables)):
+        stmt = dialect_insert(table_version).values(family_id=family_id, name=name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table_version.family_id, table_version.name],
+            set_={"version": table_version.version + 1},
+        )
+        await session.execute(stmt)
+
+
+async def read_versions(session: AsyncSession, family_id: int, tables: Iterable[str]) -> Dict[str, int]:
+    tables = list(tables)
+    table_version = models.TableVersion
+    res = await session.execute(
+        select(table_version.name, table_version.version)
+        .where(table_version.family_id == family_id, table_version.name.in_(tables))
+    )
+    versions = dict(res.all())
+    return {name: versions.get(name, 0) for name in tables}
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Слабое сравнение, как требует RFC 9110 для If-None-Match
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag.removeprefix("W/") for tag in candidates)
+
+
+def conditional_get(*tables: str, vary: Optional[Callable[[Request], str]] = None):
+    # Зависимость для GET: выставляет ETag и прерывает запрос ответом 304,
+    # если клиент уже имеет актуальную версию. vary — то, от чего ответ
+    # зависит помимо версий таблиц (например, текущая дата)
+    async def dependency(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_read_session),
+        family_id: int = Depends(get_family_id),
+    ):
+        versions = await read_versions(session, family_id, tables)
+        # Семья в ETag: после перехода в другую семью совпадение версий не даёт 304
+        etag = f'{family_id}.' + "-".join(str(versions[name]) for name in tables)
+        if vary is not None:
+            etag += "." + vary(request)
+        etag = f'"{etag}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
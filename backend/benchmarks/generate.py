@@ -0,0 +1,380 @@
+"""Генератор больших синтетических журналов семейного бюджета.
+
+Строки строятся векторно пачками NumPy и грузятся в Postgres через COPY в
+двоичном формате (в SQLite — executemany). Распределения приближены к
+реальным: зарплата по фиксированным дням, перекос в пользу частых категорий,
+сезонность и выходные, переводы с зарплатных счетов на остальные. Остатки
+счетов согласованы с журналом и нигде не уходят в минус.
+
+Запуск из каталога backend (нужен numpy, см. benchmarks/requirements.txt):
+
+    python -m benchmarks.generate --expenses 10000000 --years 5 --accounts 6
+    python -m benchmarks.generate --database-url sqlite+aiosqlite:///bench.db --expenses 200000
+
+База должна быть отдельной: генератор добавляет категории и новые счета,
+а при повторном запуске отказывается работать, если его счета уже есть.
+"""
+import argparse
+import asyncio
+import logging
+import struct
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import select, insert, update, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.checkpoints import close_months
+from app.database import DATABASE_URL, Base
+from app.rollup import rebuild_rollup
+from app.tenancy import DEFAULT_FAMILY_ID, ensure_default_family
+from app.versions import bump_versions, history
+
+# Категории по убыванию частоты и медианная сумма покупки, руб.
+CATEGORIES = [
+    ("Продукты", 900), ("Транспорт", 250), ("Кафе и рестораны", 1200), ("Развлечения", 1500),
+    ("Здоровье", 1500), ("Связь", 600), ("Дом", 2000), ("Одежда", 3500),
+    ("Коммунальные услуги", 4500), ("Подарки", 2500), ("Образование", 5000), ("Путешествия", 15000),
+]
+NOTES = ["Супермаркет", "Магазин у дома", "Онлайн-заказ", "Рынок", "Аптека", "Такси", "Кофе", "Подписка"]
+ACCOUNT_PREFIX = "Синтетический счёт"
+AMOUNT_SIGMA = 0.8
+# Доли пустых категорий и описаний
+NO_CATEGORY_SHARE = 0.05
+NO_NOTE_SHARE = 0.3
+SALARY_DAYS = (5, 20)
+TRANSFER_DAY = 6
+
+US = 1_000_000
+DAY_US = 86400 * US
+PG_EPOCH_US = 946_684_800 * US  # 2000-01-01 — начало отсчёта timestamptz в COPY
+_PG_BINARY_TYPES = {"int4": ">i4", "int8": ">i8", "timestamptz": ">i8"}
+
+
+def pg_copy_binary(columns) -> bytes:
+    # Двоичный формат COPY для столбцов фиксированной ширины: строки
+    # собираются одним структурированным массивом без цикла по строкам.
+    # columns — список (массив значений, тип Postgres); NULL не поддерживается
+    fields = [("count", ">i2")]
+    for i, (_, pg_type) in enumerate(columns):
+        fields += [(f"len{i}", ">i4"), (f"val{i}", _PG_BINARY_TYPES[pg_type])]
+    rows = np.empty(len(columns[0][0]), dtype=np.dtype(fields))
+    rows["count"] = len(columns)
+    for i, (values, pg_type) in enumerate(columns):
+        rows[f"len{i}"] = np.dtype(_PG_BINARY_TYPES[pg_type]).itemsize
+        rows[f"val{i}"] = values - PG_EPOCH_US if pg_type == "timestamptz" else values
+    return b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0) + rows.tobytes() + struct.pack(">h", -1)
+
+
+def _sqlite_timestamps(ts_us: np.ndarray) -> list:
+    # Формат хранения DateTime в SQLite у SQLAlchemy
+    return np.char.replace(np.datetime_as_string(ts_us.astype("datetime64[us]"), unit="us"), "T", " ").tolist()
+
+
+def _or_none(values: np.ndarray) -> list:
+    # 0 — пустое значение
+    return [v or None for v in values.tolist()]
+
+
+# (столбцы staging-таблицы, перенос в целевую таблицу)
+_PG_TARGETS = {
+    "expenses": (
+        [("amount_cents", "int8"), ("category_id", "int4"), ("account_id", "int4"), ("note", "int4"), ("ts", "timestamptz")],
+        "INSERT INTO expenses (family_id, amount, category_id, account_id, description, spent_at) "
+        "SELECT :family_id, amount_cents::numeric / 100, NULLIF(category_id, 0), account_id, "
+        "(CAST(:notes AS text[]))[NULLIF(note, 0)], ts "
+        "FROM gen_expenses",
+    ),
+    "incomes": (
+        [("amount_cents", "int8"), ("account_id", "int4"), ("ts", "timestamptz")],
+        "INSERT INTO incomes (family_id, amount, account_id, description, received_at) "
+        "SELECT :family_id, amount_cents::numeric / 100, account_id, 'Зарплата', ts FROM gen_incomes",
+    ),
+    "transfers": (
+        [("amount_cents", "int8"), ("from_account_id", "int4"), ("to_account_id", "int4"), ("ts", "timestamptz")],
+        "INSERT INTO transfers (family_id, amount, from_account_id, to_account_id, description, transferred_at) "
+        "SELECT :family_id, amount_cents::numeric / 100, from_account_id, to_account_id, 'Перевод', ts FROM gen_transfers",
+    ),
+}
+
+_SQLITE_TARGETS = {
+    "expenses": (
+        "INSERT INTO expenses (family_id, amount, category_id, account_id, description, spent_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    ),
+    "incomes": (
+        "INSERT INTO incomes (family_id, amount, account_id, description, received_at) "
+        "VALUES (?, ?, ?, 'Зарплата', ?)"
+    ),
+    "transfers": (
+        "INSERT INTO transfers (family_id, amount, from_account_id, to_account_id, description, transferred_at) "
+        "VALUES (?, ?, ?, ?, 'Перевод', ?)"
+    ),
+}
+
+
+async def _load(session: AsyncSession, family_id: int, target: str, columns: dict):
+    # columns — массивы в порядке столбцов staging-таблицы
+    if session.bind.dialect.name == "sqlite":
+        values = [[family_id] * len(next(iter(columns.values())))]
+        for name, array in columns.items():
+            if name == "amount_cents":
+                values.append((array / 100).tolist())
+            elif name == "ts":
+                values.append(_sqlite_timestamps(array))
+            elif name == "note":
+                values.append([NOTES[n - 1] if n else None for n in array.tolist()])
+            elif name == "category_id":
+                values.append(_or_none(array))
+            else:
+                values.append(array.tolist())
+        conn = await session.connection()
+        await conn.exec_driver_sql(_SQLITE_TARGETS[target], list(zip(*values)))
+        return
+
+    staging_columns, move = _PG_TARGETS[target]
+    conn = await session.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+    await raw.copy_to_table(
+        f"gen_{target}",
+        source=pg_copy_binary([(columns[name], pg_type) for name, pg_type in staging_columns]),
+        columns=[name for name, _ in staging_columns],
+        format="binary",
+    )
+    params = {"family_id": family_id, "notes": NOTES} if target == "expenses" else {"family_id": family_id}
+    await session.execute(text(move), params)
+    await session.execute(text(f"TRUNCATE gen_{target}"))
+
+
+async def _create_staging(session: AsyncSession):
+    for target, (staging_columns, _) in _PG_TARGETS.items():
+        column_sql = ", ".join(f"{name} {pg_type}" for name, pg_type in staging_columns)
+        await session.execute(text(f"CREATE TEMP TABLE gen_{target} ({column_sql}) ON COMMIT DROP"))
+
+
+def _day_weights(start: date, days: int) -> np.ndarray:
+    dates = np.datetime64(start, "D") + np.arange(days)
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(np.int64)
+    weekday = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 — четверг
+    # Пик трат в декабре, провал летом, выходные на треть дороже будней
+    seasonal = 1 + 0.25 * np.cos(2 * np.pi * (day_of_year - 350) / 365)
+    weights = seasonal * np.where(weekday >= 5, 1.35, 1.0)
+    return weights / weights.sum()
+
+
+def _month_days(start: date, end: date, day: int) -> list:
+    result = []
+    month = date(start.year, start.month, 1)
+    while month < end:
+        current = month.replace(day=day)
+        if start <= current < end:
+            result.append(current)
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return result
+
+
+def _us(value: date, hour: int = 0) -> int:
+    return int(datetime(value.year, value.month, value.day, hour, tzinfo=timezone.utc).timestamp()) * US
+
+
+class BalanceTracker:
+    # Текущий остаток каждого счёта по ходу журнала и его минимум — из
+    # минимума получается начальный остаток, при котором счёт не уходит в минус
+    def __init__(self, accounts: int):
+        self.balance = np.zeros(accounts, dtype=np.int64)
+        self.lowest = np.zeros(accounts, dtype=np.int64)
+
+    def apply(self, account_idx: np.ndarray, ts_us: np.ndarray, cents: np.ndarray):
+        order = np.argsort(ts_us, kind="stable")
+        account_idx, cents = account_idx[order], cents[order]
+        for acc in np.unique(account_idx):
+            running = self.balance[acc] + np.cumsum(cents[account_idx == acc])
+            self.lowest[acc] = min(self.lowest[acc], running.min())
+            self.balance[acc] = running[-1]
+
+
+async def generate(
+    session: AsyncSession,
+    expenses: int,
+    years: float = 5,
+    accounts: int = 6,
+    salary_accounts: int = 2,
+    batch_size: int = 1_000_000,
+    seed: int = 1,
+    family_id: int = DEFAULT_FAMILY_ID,
+) -> dict:
+    rng = np.random.default_rng(seed)
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=int(365 * years))
+    days = (end - start).days
+    salary_accounts = max(1, min(salary_accounts, accounts))
+
+    res = await session.execute(
+        select(models.Account.id)
+        .where(models.Account.family_id == family_id, models.Account.name.like(f"{ACCOUNT_PREFIX}%"))
+    )
+    if res.first() is not None:
+        raise SystemExit("В базе уже есть сгенерированные счета — используйте пустую базу")
+
+    res = await session.execute(
+        select(models.Category.name, models.Category.id).where(models.Category.family_id == family_id)
+    )
+    known = dict(res.all())
+    missing = [name for name, _ in CATEGORIES if name not in known]
+    if missing:
+        res = await session.execute(
+            insert(models.Category).returning(models.Category.name, models.Category.id),
+            [{"family_id": family_id, "name": name} for name in missing],
+        )
+        known.update(res.all())
+    category_ids = np.array([known[name] for name, _ in CATEGORIES], dtype=np.int32)
+
+    res = await session.execute(
+        insert(models.Account).returning(models.Account.id, sort_by_parameter_order=True),
+        [{"family_id": family_id, "name": f"{ACCOUNT_PREFIX} {i + 1}", "balance": 0} for i in range(accounts)],
+    )
+    account_ids = np.array(res.scalars().all(), dtype=np.int32)
+
+    if session.bind.dialect.name != "sqlite":
+        await _create_staging(session)
+
+    # Категории по закону Ципфа, счета — с перекосом в сторону первых
+    category_p = 1 / np.arange(1, len(CATEGORIES) + 1) ** 1.1
+    category_p /= category_p.sum()
+    account_p = 1 / np.arange(1, accounts + 1) ** 0.7
+    account_p /= account_p.sum()
+    log_medians = np.log([median * 100 for _, median in CATEGORIES])
+
+    # Ожидаемые траты счёта в месяц — под них подбираются зарплаты и переводы
+    mean_cents = float((category_p * np.exp(log_medians + AMOUNT_SIGMA ** 2 / 2)).sum())
+    monthly_spend = expenses / (days / 30.4) * mean_cents * account_p
+
+    # Переводы раз в месяц пополняют остальные счета под их траты, зарплата
+    # дважды в месяц покрывает траты зарплатного счёта и его переводы с запасом
+    transfer_dates = _month_days(start, end, TRANSFER_DAY)
+    others = np.arange(salary_accounts, accounts)
+    to_acc = np.tile(others, len(transfer_dates))
+    from_acc = to_acc % salary_accounts
+    transfer_ts = np.repeat([_us(d, 10) for d in transfer_dates], len(others)).astype(np.int64)
+    transfer_cents = np.round(monthly_spend[to_acc] * rng.uniform(1.0, 1.15, len(to_acc))).astype(np.int64)
+
+    outflow = monthly_spend[:salary_accounts].copy()
+    np.add.at(outflow, others % salary_accounts, monthly_spend[others] * 1.075)
+    salary_dates = sorted(d for day_of_month in SALARY_DAYS for d in _month_days(start, end, day_of_month))
+    income_acc = np.tile(np.arange(salary_accounts), len(salary_dates))
+    income_ts = np.repeat([_us(d, 9) for d in salary_dates], salary_accounts).astype(np.int64)
+    income_cents = np.round(
+        outflow[income_acc] * 1.03 / len(SALARY_DAYS) * rng.uniform(0.95, 1.05, len(income_acc))
+    ).astype(np.int64)
+
+    # Движения по зарплатам и переводам учитываются в остатках вместе с
+    # расходами своего интервала времени
+    movement_ts = np.concatenate([income_ts, transfer_ts, transfer_ts])
+    order = np.argsort(movement_ts, kind="stable")
+    movement_ts = movement_ts[order]
+    movement_acc = np.concatenate([income_acc, to_acc, from_acc])[order]
+    movement_cents = np.concatenate([income_cents, transfer_cents, -transfer_cents])[order]
+
+    tracker = BalanceTracker(accounts)
+    per_day = rng.multinomial(expenses, _day_weights(start, days))
+    start_us = _us(start)
+    loaded = 0
+    day = 0
+    while day < days:
+        # Пачка — несколько целых дней, чтобы остатки считались по порядку времени
+        last = day + max(1, int(np.searchsorted(np.cumsum(per_day[day:]), batch_size, side="right")))
+        counts = per_day[day:last]
+        n = int(counts.sum())
+        day_index = np.repeat(np.arange(day, last), counts)
+        seconds = np.clip(rng.normal(15 * 3600, 3.5 * 3600, n), 7 * 3600, 86399).astype(np.int64)
+        ts_us = start_us + day_index * DAY_US + seconds * US + rng.integers(0, US, n)
+        category_idx = rng.choice(len(CATEGORIES), n, p=category_p)
+        account_idx = rng.choice(accounts, n, p=account_p)
+        cents = np.maximum(100, np.round(np.exp(log_medians[category_idx] + rng.normal(0, AMOUNT_SIGMA, n)))).astype(np.int64)
+        category = np.where(rng.random(n) < NO_CATEGORY_SHARE, 0, category_ids[category_idx])
+        note = np.where(rng.random(n) < NO_NOTE_SHARE, 0, rng.integers(1, len(NOTES) + 1, n))
+
+        window = slice(*np.searchsorted(movement_ts, [start_us + day * DAY_US, start_us + last * DAY_US]))
+        tracker.apply(
+            np.concatenate([account_idx, movement_acc[window]]),
+            np.concatenate([ts_us, movement_ts[window]]),
+            np.concatenate([-cents, movement_cents[window]]),
+        )
+        await _load(session, family_id, "expenses", {
+            "amount_cents": cents, "category_id": category, "account_id": account_ids[account_idx],
+            "note": note, "ts": ts_us,
+        })
+        loaded += n
+        logging.info("Expenses: %d / %d", loaded, expenses)
+        day = last
+
+    if len(income_acc):
+        await _load(session, family_id, "incomes", {
+            "amount_cents": income_cents, "account_id": account_ids[income_acc], "ts": income_ts,
+        })
+    if len(to_acc):
+        await _load(session, family_id, "transfers", {
+            "amount_cents": transfer_cents, "from_account_id": account_ids[from_acc],
+            "to_account_id": account_ids[to_acc], "ts": transfer_ts,
+        })
+
+    # Начальный остаток — ровно столько, чтобы ни один счёт не уходил в минус
+    opening = -tracker.lowest
+    for acc, account_id in enumerate(account_ids.tolist()):
+        balance = int(opening[acc] + tracker.balance[acc])
+        await session.execute(
+            update(models.Account).where(models.Account.id == account_id).values(balance=Decimal(balance).scaleb(-2))
+        )
+    await bump_versions(
+        session, family_id, "categories", "accounts", "expenses", "incomes", "transfers", history("expenses"), history("incomes"),
+    )
+    await session.commit()
+
+    await rebuild_rollup(session)
+    await close_months(session)
+    return {
+        "expenses": expenses,
+        "incomes": len(income_acc),
+        "transfers": len(to_acc),
+        "accounts": accounts,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+    }
+
+
+async def main(args):
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    started = time.perf_counter()
+    async with session_factory() as session:
+        await ensure_default_family(session)
+        summary = await generate(
+            session,
+            expenses=args.expenses,
+            years=args.years,
+            accounts=args.accounts,
+            salary_accounts=args.salary_accounts,
+            batch_size=args.batch_size,
+            seed=args.seed,
+        )
+    await engine.dispose()
+    logging.info("Generated %s in %.1fs", summary, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--expenses", type=int, default=1_000_000)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--accounts", type=int, default=6)
+    parser.add_argument("--salary-accounts", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
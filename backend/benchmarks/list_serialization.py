@@ -0,0 +1,96 @@
+"""Сравнение CPU на строку для списков: ORM + response_model против быстрого пути.
+
+Запуск из каталога backend:
+
+    python -m benchmarks.list_serialization --rows 500 --repeat 50
+
+Приложение работает со своим движком на временном файле SQLite,
+без dependency_overrides: с подменами FastAPI заново разбирает сигнатуры
+зависимостей на каждый запрос, и эта лишняя работа попадала в оба замера.
+
+Печатаются две величины: CPU на строку вместе с постоянной ценой запроса
+(middleware, зависимости, запрос версий для ETag, клиент httpx) и цена
+строки за вычетом запроса из одной строки — то, что меняет быстрый путь.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmpdir.name}/bench.db"
+
+from httpx import AsyncClient, ASGITransport
+
+from app import fastjson
+from app.database import AsyncSessionLocal, Base, engine
+from app.main import app
+from app.models import Account, Category, Expense
+from app.tenancy import ensure_default_family
+
+
+async def seed(session_factory, rows: int):
+    async with session_factory() as session:
+        await ensure_default_family(session)
+        categories = [Category(name=f"Категория {i}") for i in range(10)]
+        account = Account(name="Счёт", balance=Decimal("0"))
+        session.add_all([*categories, account])
+        await session.flush()
+        base = datetime(2024, 1, 1)
+        session.add_all([
+            Expense(
+                amount=Decimal(i % 1000) + Decimal("0.99"),
+                category_id=categories[i % 10].id if i % 7 else None,
+                account_id=account.id,
+                description=f"Расход номер {i}",
+                spent_at=base + timedelta(minutes=i),
+            )
+            for i in range(rows)
+        ])
+        await session.commit()
+
+
+async def measure(client: AsyncClient, url: str, repeat: int) -> float:
+    await client.get(url)  # прогрев
+    start = time.process_time()
+    for _ in range(repeat):
+        response = await client.get(url)
+        response.raise_for_status()
+    return time.process_time() - start
+
+
+async def main(rows: int, repeat: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(AsyncSessionLocal, rows)
+
+    results, marginal = {}, {}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for name, enabled in (("orm", False), ("fast", True)):
+            fastjson.FAST_LIST_RESPONSES = enabled
+            results[name] = await measure(client, f"/api/expenses/?limit={rows}", repeat)
+            single = await measure(client, "/api/expenses/?limit=1", repeat)
+            marginal[name] = (results[name] - single) / max(rows - 1, 1)
+    await engine.dispose()
+
+    listed = rows * repeat
+    for name, seconds in results.items():
+        print(
+            f"{name:>5}: {seconds * 1e6 / listed:8.2f} us CPU/row, "
+            f"{marginal[name] * 1e6 / repeat:8.2f} us without request overhead"
+        )
+    print(
+        f"speedup: {results['orm'] / results['fast']:.1f}x, "
+        f"without request overhead {marginal['orm'] / marginal['fast']:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,148 @@
+"""Синтетический набор данных для нагрузочных замеров.
+
+Счета, категории, бюджеты и операции за несколько лет. Остатки счетов
+согласованы с операциями, помесячные итоги и контрольные точки остатков
+пересчитываются после загрузки.
+
+С families > 1 у каждой семьи свои счета и категории (accounts и categories
+на семью), а расходы за день (expenses_per_day — на всю базу) распределяются
+между семьями случайно. Так индексы с family_id работают на базе с чужими
+строками, как в установке с несколькими семьями.
+"""
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import insert, update
+
+from app import models
+from app.checkpoints import close_months
+from app.rollup import rebuild_rollup
+from app.tenancy import DEFAULT_FAMILY_ID, ensure_default_family
+
+# Строк в одном INSERT
+CHUNK_SIZE = 5000
+OPENING_BALANCE = Decimal("1000000.00")
+
+
+def _amount(rng: random.Random, median: float) -> Decimal:
+    # Логнормальное распределение: много мелких трат и редкие крупные
+    return Decimal(str(round(rng.lognormvariate(0, 0.9) * median, 2))) + Decimal("0.01")
+
+
+async def _insert_chunks(session, model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        await session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+
+
+async def seed_dataset(
+    session_factory,
+    accounts: int = 5,
+    categories: int = 12,
+    years: float = 1,
+    expenses_per_day: int = 20,
+    seed: int = 42,
+    families: int = 1,
+) -> dict:
+    rng = random.Random(seed)
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=int(365 * years))
+    days = (end - start).days
+
+    async with session_factory() as session:
+        await ensure_default_family(session)
+        family_rows = [models.Family(name=f"Семья {i + 2}") for i in range(families - 1)]
+        session.add_all(family_rows)
+        await session.flush()
+        family_ids = [DEFAULT_FAMILY_ID] + [f.id for f in family_rows]
+
+        category_rows, account_rows = {}, {}
+        for family_id in family_ids:
+            category_rows[family_id] = [
+                models.Category(family_id=family_id, name=f"Категория {i + 1}") for i in range(categories)
+            ]
+            account_rows[family_id] = [
+                models.Account(family_id=family_id, name=f"Счёт {i + 1}", balance=OPENING_BALANCE)
+                for i in range(accounts)
+            ]
+            session.add_all([*category_rows[family_id], *account_rows[family_id]])
+        await session.flush()
+        category_ids = {family_id: [c.id for c in rows] for family_id, rows in category_rows.items()}
+        account_ids = {family_id: [a.id for a in rows] for family_id, rows in account_rows.items()}
+        deltas = defaultdict(Decimal)
+
+        expenses = []
+        for day in range(days):
+            day_start = start + timedelta(days=day)
+            for _ in range(expenses_per_day):
+                family_id = rng.choice(family_ids)
+                account_id = rng.choice(account_ids[family_id])
+                amount = _amount(rng, 400)
+                deltas[account_id] -= amount
+                expenses.append({
+                    "family_id": family_id,
+                    "amount": amount,
+                    "category_id": rng.choice(category_ids[family_id]) if rng.random() > 0.1 else None,
+                    "account_id": account_id,
+                    "description": f"Покупка {rng.randrange(1000)}",
+                    "spent_at": day_start + timedelta(seconds=rng.randrange(86400)),
+                })
+        await _insert_chunks(session, models.Expense, expenses)
+
+        # Зарплата дважды в месяц на каждый счёт и переводы между счетами семьи
+        incomes, transfers = [], []
+        monthly_spend = Decimal(400 * 1.5 * 30 * expenses_per_day / (accounts * families))
+        for day in range(0, days, 15):
+            ts = start + timedelta(days=day, hours=9)
+            for family_id in family_ids:
+                for account_id in account_ids[family_id]:
+                    amount = (monthly_spend / 2 * Decimal(str(rng.uniform(0.9, 1.3)))).quantize(Decimal("0.01"))
+                    deltas[account_id] += amount
+                    incomes.append({
+                        "family_id": family_id, "amount": amount, "category_id": None, "account_id": account_id,
+                        "description": "Зарплата", "received_at": ts,
+                    })
+                if len(account_ids[family_id]) > 1:
+                    from_id, to_id = rng.sample(account_ids[family_id], 2)
+                    amount = _amount(rng, 5000)
+                    deltas[from_id] -= amount
+                    deltas[to_id] += amount
+                    transfers.append({
+                        "family_id": family_id, "from_account_id": from_id, "to_account_id": to_id, "amount": amount,
+                        "description": "Перевод", "transferred_at": ts + timedelta(hours=1),
+                    })
+        await _insert_chunks(session, models.Income, incomes)
+        await _insert_chunks(session, models.Transfer, transfers)
+
+        month = date(start.year, start.month, 1)
+        budgets = []
+        while month <= end.date():
+            budgets += [
+                {"family_id": family_id, "category_id": category_id, "month": month, "planned": Decimal(rng.randrange(5, 50) * 1000)}
+                for family_id in family_ids
+                for category_id in category_ids[family_id]
+            ]
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        await _insert_chunks(session, models.Budget, budgets)
+
+        for account_id, delta in deltas.items():
+            await session.execute(
+                update(models.Account).where(models.Account.id == account_id).values(balance=OPENING_BALANCE + delta)
+            )
+        await session.commit()
+
+        await rebuild_rollup(session)
+        await close_months(session)
+
+    return {
+        "families": families,
+        "accounts": accounts,
+        "categories": categories,
+        "expenses": len(expenses),
+        "incomes": len(incomes),
+        "transfers": len(transfers),
+        "budgets": len(budgets),
+        "from": start.date().isoformat(),
+        "to": end.date().isoformat(),
+    }
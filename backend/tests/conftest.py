@@ -1,4 +1,5 @@
 import asyncio
+import os
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
@@ -6,7 +7,10 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from app.database import Base, get_db
+# Приложение не должно ждать Postgres при старте в тестах
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from app.database import Base, get_db, get_session_factory
 from app.main import app
 
 # Создаем тестовую in-memory SQLite базу данных
@@ -52,6 +56,7 @@ def test_client(monkeypatch):
 
     # Заменяем оригинальную функцию на тестовую
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestSessionLocal
     
     # Создаем тестовый клиент
     with TestClient(app) as client:
@@ -116,3 +116,156 @@ async def test_delete_account(test_client, test_db):
     # Проверяем, что счёт действительно удалён
     response = test_client.get(f"/api/accounts/{account_id}")
     assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_account_statement(test_client, test_db):
+    # Счёт с расходом, доходом и переводами в обе стороны
+    from datetime import datetime
+    from app.models import Expense, Income, Transfer
+
+    main = Account(name="Основной счёт", balance=Decimal("1150.0"))
+    other = Account(name="Другой счёт", balance=Decimal("0"))
+    async with test_db.begin():
+        test_db.add_all([main, other])
+        await test_db.flush()
+        test_db.add_all([
+            Income(amount=Decimal("1000.0"), account_id=main.id, received_at=datetime(2025, 1, 1, 10)),
+            Expense(amount=Decimal("200.0"), account_id=main.id, spent_at=datetime(2025, 1, 2, 10)),
+            Transfer(from_account_id=other.id, to_account_id=main.id, amount=Decimal("500.0"),
+                     transferred_at=datetime(2025, 1, 3, 10)),
+            Transfer(from_account_id=main.id, to_account_id=other.id, amount=Decimal("150.0"),
+                     transferred_at=datetime(2025, 1, 3, 10)),
+        ])
+        await test_db.flush()
+        main_id, other_id = main.id, other.id
+
+    # Первая страница: самые свежие операции и остаток после каждой
+    response = test_client.get(f"/api/accounts/{main_id}/statement", params={"limit": 2})
+    assert response.status_code == 200
+    page = response.json()
+    assert [(e["kind"], float(e["amount"]), float(e["balance_after"])) for e in page] == [
+        ("transfer_out", -150.0, 1150.0),
+        ("transfer_in", 500.0, 1300.0),
+    ]
+    assert page[0]["counterparty_account_id"] == other_id
+
+    # Вторая страница продолжает остаток по курсору
+    cursor = response.headers["X-Next-Cursor"]
+    response = test_client.get(f"/api/accounts/{main_id}/statement", params={"limit": 2, "cursor": cursor})
+    page = response.json()
+    assert [(e["kind"], float(e["balance_after"])) for e in page] == [
+        ("expense", 800.0),
+        ("income", 1000.0),
+    ]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = test_client.get("/api/accounts/999999/statement")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_accounts_conditional_get(test_client, test_db):
+    # Создаём счёт через API, чтобы увеличилась версия таблицы
+    response = test_client.post("/api/accounts/", json={"name": "Счёт с ETag", "balance": 100.0})
+    account_id = response.json()["id"]
+
+    response = test_client.get("/api/accounts/")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    # Пока данные не менялись — 304 без тела
+    response = test_client.get("/api/accounts/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # Любая запись, меняющая баланс, сбрасывает ETag
+    test_client.post("/api/expenses/", json={"amount": 10.0, "account_id": account_id})
+    response = test_client.get("/api/accounts/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_account_balance_at(test_client, test_db):
+    # Операции за несколько месяцев и контрольные точки на начало каждого
+    from datetime import datetime, timezone
+    from app.models import Expense, Income, Transfer
+    from app.checkpoints import close_months
+
+    main = Account(name="Счёт с историей", balance=Decimal("1150.0"))
+    other = Account(name="Счёт получателя", balance=Decimal("50.0"))
+    async with test_db.begin():
+        test_db.add_all([main, other])
+        await test_db.flush()
+        test_db.add_all([
+            Income(amount=Decimal("500.0"), account_id=main.id, received_at=datetime(2025, 5, 10, 10)),
+            Expense(amount=Decimal("200.0"), account_id=main.id, spent_at=datetime(2025, 6, 15, 10)),
+            Expense(amount=Decimal("100.0"), account_id=main.id, spent_at=datetime(2025, 7, 20, 10)),
+            Transfer(from_account_id=main.id, to_account_id=other.id, amount=Decimal("50.0"),
+                     transferred_at=datetime(2025, 7, 25, 10)),
+        ])
+        await test_db.flush()
+        main_id = main.id
+
+    now = datetime(2025, 8, 5, tzinfo=timezone.utc)
+    assert await close_months(test_db, now=now) == 6
+    assert await close_months(test_db, now=now) == 0
+
+    def balance(at):
+        response = test_client.get(f"/api/accounts/{main_id}/balance", params={"at": at})
+        assert response.status_code == 200
+        data = response.json()
+        return float(data["balance"]), data["checkpoint"]
+
+    assert balance("2025-04-01T00:00:00") == (1000.0, "2025-05-01")
+    assert balance("2025-05-01T00:00:00") == (1000.0, "2025-05-01")
+    assert balance("2025-06-10T00:00:00") == (1500.0, "2025-06-01")
+    assert balance("2025-06-20T00:00:00") == (1300.0, "2025-07-01")
+    assert balance("2025-07-22T00:00:00") == (1200.0, "2025-08-01")
+    assert balance("2030-01-01T00:00:00") == (1150.0, "2025-08-01")
+
+    # Удаление старого расхода сдвигает точки после него
+    expense_id = [e["id"] for e in test_client.get("/api/expenses/").json() if e["spent_at"].startswith("2025-06")][0]
+    assert test_client.delete(f"/api/expenses/{expense_id}").status_code == 200
+    assert balance("2025-07-10T00:00:00") == (1500.0, "2025-07-01")
+    assert balance("2030-01-01T00:00:00") == (1350.0, "2025-08-01")
+
+    response = test_client.get("/api/accounts/999999/balance")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_reconcile_balances(test_client, test_db):
+    from sqlalchemy import update
+
+    card = test_client.post("/api/accounts/", json={"name": "Сверяемая карта", "balance": 1000.0}).json()
+    cash = test_client.post("/api/accounts/", json={"name": "Сверяемые наличные", "balance": 0}).json()
+
+    # Первая сверка опорная: текущие остатки принимаются как подтверждённые
+    report = test_client.post("/api/accounts/reconcile").json()
+    assert (report["baselined"], report["mismatches"]) == (2, [])
+
+    expense = test_client.post("/api/expenses/", json={"amount": 100.0, "account_id": card["id"]}).json()
+    test_client.post("/api/incomes/", json={"amount": 50.0, "account_id": cash["id"]})
+    test_client.post("/api/transfers/", json={"from_account_id": card["id"], "to_account_id": cash["id"], "amount": 300.0})
+    report = test_client.post("/api/accounts/reconcile").json()
+    assert (report["new_rows"], report["baselined"], report["mismatches"]) == (4, 0, [])
+
+    # Удаление уже сверенной операции не считается расхождением
+    assert test_client.delete(f"/api/expenses/{expense['id']}").status_code == 200
+    report = test_client.post("/api/accounts/reconcile").json()
+    assert (report["new_rows"], report["mismatches"]) == (0, [])
+
+    # Остаток, изменённый в обход журнала, находится и исправляется
+    async with test_db.begin():
+        await test_db.execute(update(Account).where(Account.id == card["id"]).values(balance=Decimal("1.0")))
+    report = test_client.post("/api/accounts/reconcile").json()
+    assert [(m["account_id"], float(m["expected"]), m["repaired"]) for m in report["mismatches"]] == [
+        (card["id"], 700.0, False),
+    ]
+    report = test_client.post("/api/accounts/reconcile", params={"repair": True}).json()
+    assert [m["repaired"] for m in report["mismatches"]] == [True]
+    assert float(test_client.get(f"/api/accounts/{card['id']}").json()["balance"]) == 700.0
+    assert test_client.post("/api/accounts/reconcile").json()["mismatches"] == []
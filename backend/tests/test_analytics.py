@@ -0,0 +1,109 @@
+import pytest
+from decimal import Decimal
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from app.models import Expense, Category, Account, Budget
+from app.rollup import date_bucket, rebuild_rollup
+from app.routers import analytics
+from app.routers.analytics import series_cache
+
+
+async def _seed(test_db):
+    food = Category(name="Еда")
+    taxi = Category(name="Такси")
+    card = Account(name="Карта", balance=Decimal("10000.0"))
+    cash = Account(name="Наличные", balance=Decimal("10000.0"))
+    async with test_db.begin():
+        test_db.add_all([food, taxi, card, cash])
+        await test_db.flush()
+        test_db.add_all([
+            Expense(amount=Decimal("100.0"), category_id=food.id, account_id=card.id, spent_at=datetime(2025, 6, 2, 10)),
+            Expense(amount=Decimal("50.0"), category_id=food.id, account_id=cash.id, spent_at=datetime(2025, 6, 2, 18)),
+            Expense(amount=Decimal("300.0"), category_id=taxi.id, account_id=card.id, spent_at=datetime(2025, 6, 4, 9)),
+            Expense(amount=Decimal("70.0"), category_id=None, account_id=card.id, spent_at=datetime(2025, 6, 9, 9)),
+            Expense(amount=Decimal("20.0"), category_id=food.id, account_id=card.id, spent_at=datetime(2025, 8, 1, 9)),
+        ])
+    await rebuild_rollup(test_db)
+    series_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_daily_series_by_category(test_client, test_db):
+    await _seed(test_db)
+
+    response = test_client.get("/api/analytics/series", params={"bucket": "day", "from": "2025-06-01", "to": "2025-06-04"})
+
+    assert response.status_code == 200
+    data = response.json()
+    # Пустые дни заполнены нулями, серии — колонками
+    assert data["timestamps"] == ["2025-06-01", "2025-06-02", "2025-06-03", "2025-06-04"]
+    series = {s["name"]: [float(v) for v in s["values"]] for s in data["series"]}
+    assert series == {"Еда": [0.0, 150.0, 0.0, 0.0], "Такси": [0.0, 0.0, 0.0, 300.0]}
+
+
+@pytest.mark.asyncio
+async def test_weekly_and_monthly_series(test_client, test_db):
+    await _seed(test_db)
+
+    # Недели начинаются с понедельника; расход без категории — отдельная серия
+    response = test_client.get("/api/analytics/series", params={"bucket": "week", "from": "2025-06-03", "to": "2025-06-10"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["timestamps"] == ["2025-06-02", "2025-06-09"]
+    series = {s["name"]: [float(v) for v in s["values"]] for s in data["series"]}
+    assert series == {"Еда": [150.0, 0.0], "Такси": [300.0, 0.0], None: [0.0, 70.0]}
+
+    response = test_client.get(
+        "/api/analytics/series",
+        params={"bucket": "month", "from": "2025-06-01", "to": "2025-08-31", "group_by": "account"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["timestamps"] == ["2025-06-01", "2025-07-01", "2025-08-01"]
+    series = {s["name"]: [float(v) for v in s["values"]] for s in data["series"]}
+    assert series == {"Карта": [470.0, 0.0, 20.0], "Наличные": [50.0, 0.0, 0.0]}
+
+
+@pytest.mark.asyncio
+async def test_series_closed_period_cache(test_client, test_db):
+    await _seed(test_db)
+    params = {"bucket": "month", "from": "2025-06-01", "to": "2025-06-30"}
+
+    first = test_client.get("/api/analytics/series", params=params).json()
+    assert len(series_cache) == 1
+
+    # Удаление операции задним числом сбрасывает закэшированные итоги
+    expense_id = test_client.get("/api/expenses/").json()[-1]["id"]
+    assert test_client.delete(f"/api/expenses/{expense_id}").status_code == 200
+    second = test_client.get("/api/analytics/series", params=params).json()
+    assert second != first
+
+    response = test_client.get("/api/analytics/series", params={"bucket": "day", "from": "2020-01-01", "to": "2025-01-01"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_series_etag_changes_with_the_day(test_client, test_db, monkeypatch):
+    # Без "to" ответ зависит от сегодняшней даты: после полуночи 304 не отдаётся
+    await _seed(test_db)
+    monkeypatch.setattr(analytics, "_today", lambda: datetime(2025, 8, 1).date())
+    params = {"bucket": "day", "from": "2025-07-30"}
+    response = test_client.get("/api/analytics/series", params=params)
+    etag = response.headers["etag"]
+    assert test_client.get("/api/analytics/series", params=params, headers={"If-None-Match": etag}).status_code == 304
+
+    monkeypatch.setattr(analytics, "_today", lambda: datetime(2025, 8, 2).date())
+    response = test_client.get("/api/analytics/series", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["timestamps"][-1] == "2025-08-02"
+
+
+def test_postgres_buckets_are_utc():
+    # Границы диапазонов в UTC, значит и интервалы не должны зависеть от пояса сессии
+    sql = str(date_bucket(Expense.spent_at, "week", "postgresql").compile(dialect=postgresql.dialect()))
+    assert sql == "CAST(date_trunc('week', expenses.spent_at AT TIME ZONE 'UTC') AS DATE)"
+    # У даты без времени пояса нет
+    sql = str(date_bucket(Budget.month, "month", "postgresql").compile(dialect=postgresql.dialect()))
+    assert sql == "CAST(date_trunc('month', budgets.month) AS DATE)"
@@ -0,0 +1,117 @@
+import json
+import time
+
+import pytest
+
+from app import auth
+from app.models import Family
+
+BOT_TOKEN = "123456:test-token"
+
+
+def _init_data(user_id: int, auth_date: int = None, **user) -> str:
+    return auth.sign_init_data(
+        {
+            "auth_date": str(auth_date or int(time.time())),
+            "query_id": "AAH",
+            "user": json.dumps({"id": user_id, "first_name": "Тест", **user}, ensure_ascii=False),
+        },
+        BOT_TOKEN,
+    )
+
+
+@pytest.fixture
+def telegram_auth(monkeypatch):
+    monkeypatch.setattr(auth, "BOT_TOKEN", BOT_TOKEN)
+    auth.verified_cache.clear()
+    auth.user_cache.clear()
+    yield
+    auth.verified_cache.clear()
+    auth.user_cache.clear()
+
+
+def test_verify_init_data():
+    init_data = _init_data(42, username="papa")
+    user, _ = auth.verify_init_data(init_data, BOT_TOKEN)
+    assert user["id"] == 42
+    assert user["username"] == "papa"
+
+    with pytest.raises(ValueError):
+        auth.verify_init_data(init_data, "654321:other-token")
+    with pytest.raises(ValueError):
+        auth.verify_init_data(init_data.replace("query_id=AAH", "query_id=AAX"), BOT_TOKEN)
+    with pytest.raises(ValueError):
+        auth.verify_init_data(_init_data(42, auth_date=int(time.time()) - 2 * 86400), BOT_TOKEN)
+
+
+@pytest.mark.asyncio
+async def test_requests_are_scoped_to_telegram_user_family(test_client, test_db, telegram_auth, monkeypatch):
+    async with test_db.begin():
+        test_db.add(Family(id=1, name="Моя семья"))
+
+    assert test_client.get("/api/accounts/").status_code == 401
+    headers = {"Authorization": "tma " + _init_data(1001)}
+    assert test_client.get("/api/accounts/", headers={"Authorization": "tma hash=bad"}).status_code == 401
+
+    response = test_client.post("/api/accounts/", json={"name": "Карта", "balance": "100.00"}, headers=headers)
+    assert response.status_code == 200
+
+    # Повторные запросы той же сессии не проверяют подпись заново
+    calls = []
+    verify = auth.verify_init_data
+    monkeypatch.setattr(auth, "verify_init_data", lambda *args: calls.append(1) or verify(*args))
+    assert [a["name"] for a in test_client.get("/api/accounts/", headers=headers).json()] == ["Карта"]
+    assert calls == []
+
+    # Другой пользователь Telegram получает свою семью
+    other = {"X-Telegram-Init-Data": _init_data(2002)}
+    assert test_client.get("/api/accounts/", headers=other).json() == []
+    assert calls == [1]
+    assert len(auth.user_cache) == 2
+    assert auth.user_cache.get(1001).family_id != auth.user_cache.get(2002).family_id
+
+
+@pytest.mark.asyncio
+async def test_default_family_and_invites(test_client, test_db, telegram_auth, monkeypatch):
+    async with test_db.begin():
+        test_db.add(Family(id=1, name="Моя семья"))
+    test_client.post("/api/accounts/", json={"name": "Общий счёт", "balance": "100.00"}, headers={
+        "Authorization": "tma " + _init_data(1001),
+    })
+
+    # Первый вошедший пользователь получает семью по умолчанию с её данными,
+    # следующий — свою
+    owner = {"Authorization": "tma " + _init_data(1001)}
+    member = {"Authorization": "tma " + _init_data(2002, username="mama")}
+    assert auth.user_cache.get(1001).family_id == 1
+    assert test_client.get("/api/accounts/", headers=member).json() == []
+    etag = test_client.get("/api/accounts/", headers=member).headers["etag"]
+
+    invite = test_client.post("/api/family/invite", headers=owner).json()
+    assert test_client.post("/api/family/join", json={"code": invite["code"] + "0"}, headers=member).status_code == 400
+    response = test_client.post("/api/family/join", json={"code": invite["code"]}, headers=member)
+    assert response.status_code == 200
+    assert response.json()["id"] == 1
+    assert [m["username"] for m in response.json()["members"]] == [None, "mama"]
+
+    response = test_client.get("/api/accounts/", headers={**member, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert [a["name"] for a in response.json()] == ["Общий счёт"]
+    assert test_client.get("/api/family", headers=owner).json()["id"] == 1
+
+    # Просроченное приглашение не принимается
+    code, _ = auth.make_invite(1, BOT_TOKEN, now=time.time() - auth.FAMILY_INVITE_TTL - 1)
+    with pytest.raises(ValueError):
+        auth.check_invite(code, BOT_TOKEN)
+
+
+@pytest.mark.asyncio
+async def test_configured_owner_adopts_default_family(test_client, test_db, telegram_auth, monkeypatch):
+    monkeypatch.setattr(auth, "DEFAULT_FAMILY_OWNER", 3003)
+    async with test_db.begin():
+        test_db.add(Family(id=1, name="Моя семья"))
+    test_client.get("/api/accounts/", headers={"Authorization": "tma " + _init_data(1001)})
+    test_client.get("/api/accounts/", headers={"Authorization": "tma " + _init_data(3003)})
+    assert auth.user_cache.get(1001).family_id != 1
+    assert auth.user_cache.get(3003).family_id == 1
+    assert test_client.post("/api/family/invite").status_code == 401
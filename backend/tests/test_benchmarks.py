@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.models import Account, Category, Expense, Family
+from benchmarks.load import compare, percentile
+from benchmarks.seed import seed_dataset
+from tests.conftest import TestSessionLocal
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+def test_compare_flags_p95_regressions():
+    baseline = {"routes": {"/api/expenses/": {"p95_ms": 10.0}, "/api/accounts/": {"p95_ms": 10.0}}}
+    report = {"routes": {
+        "/api/expenses/": {"p95_ms": 13.0},
+        "/api/accounts/": {"p95_ms": 11.0},
+        "/api/dashboard/": {"p95_ms": 50.0},
+    }}
+
+    # Новые маршруты без базового замера не считаются регрессией
+    assert compare(report, baseline, tolerance=0.2) == [
+        {"route": "/api/expenses/", "baseline_p95_ms": 10.0, "p95_ms": 13.0, "ratio": 1.3},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_seed_spreads_rows_across_families(test_db):
+    dataset = await seed_dataset(TestSessionLocal, accounts=2, categories=3, years=0.1, expenses_per_day=30, families=3)
+    assert dataset["families"] == 3
+
+    assert (await test_db.execute(select(func.count()).select_from(Family))).scalar() == 3
+    res = await test_db.execute(select(Account.family_id, func.count()).group_by(Account.family_id))
+    assert dict(res.all()) == {1: 2, 2: 2, 3: 2}
+    # Операции ссылаются только на счета и категории своей семьи
+    res = await test_db.execute(
+        select(Expense.family_id, func.count())
+        .join(Account, Account.id == Expense.account_id)
+        .outerjoin(Category, Category.id == Expense.category_id)
+        .where(Account.family_id == Expense.family_id, func.coalesce(Category.family_id, Expense.family_id) == Expense.family_id)
+        .group_by(Expense.family_id)
+    )
+    per_family = dict(res.all())
+    assert sorted(per_family) == [1, 2, 3]
+    assert sum(per_family.values()) == dataset["expenses"]
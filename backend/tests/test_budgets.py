@@ -0,0 +1,69 @@
+import pytest
+from decimal import Decimal
+from datetime import date, datetime
+
+from app.models import Budget, Expense, Category, Account
+from app.rollup import rebuild_rollup
+
+
+@pytest.mark.asyncio
+async def test_create_and_list_budgets(test_client, test_db):
+    async with test_db.begin():
+        test_category = Category(name="Категория бюджета")
+        test_db.add(test_category)
+        await test_db.flush()
+        category_id = test_category.id
+
+    response = test_client.post("/api/budgets/", json={
+        "category_id": category_id, "month": "2025-06-01T00:00:00", "planned": 5000.0
+    })
+    assert response.status_code == 200
+    assert response.json()["category"]["name"] == "Категория бюджета"
+
+    response = test_client.get("/api/budgets/")
+    assert response.status_code == 200
+    assert [b["category"]["name"] for b in response.json()] == ["Категория бюджета"]
+
+
+@pytest.mark.asyncio
+async def test_budget_report(test_client, test_db):
+    # Бюджеты на два месяца и расходы, часть из которых вне диапазона
+    food = Category(name="Еда")
+    fun = Category(name="Развлечения")
+    test_account = Account(name="Счёт бюджета", balance=Decimal("10000.0"))
+
+    async with test_db.begin():
+        test_db.add_all([food, fun, test_account])
+        await test_db.flush()
+        test_db.add_all([
+            Budget(category_id=food.id, month=date(2025, 6, 1), planned=Decimal("1000.0")),
+            Budget(category_id=fun.id, month=date(2025, 6, 1), planned=Decimal("500.0")),
+            Budget(category_id=food.id, month=date(2025, 7, 1), planned=Decimal("800.0")),
+            Expense(amount=Decimal("250.0"), category_id=food.id, account_id=test_account.id,
+                    spent_at=datetime(2025, 6, 3, 12)),
+            Expense(amount=Decimal("500.0"), category_id=food.id, account_id=test_account.id,
+                    spent_at=datetime(2025, 6, 20, 12)),
+            Expense(amount=Decimal("1000.0"), category_id=food.id, account_id=test_account.id,
+                    spent_at=datetime(2025, 7, 2, 12)),
+            Expense(amount=Decimal("99.0"), category_id=fun.id, account_id=test_account.id,
+                    spent_at=datetime(2025, 8, 2, 12)),
+        ])
+    await rebuild_rollup(test_db)
+
+    response = test_client.get("/api/budgets/report", params={"from": "2025-06", "to": "2025-07"})
+
+    assert response.status_code == 200
+    rows = [
+        (r["month"], r["category"], float(r["planned"]), float(r["spent"]), float(r["remaining"]), r["percent_used"])
+        for r in response.json()
+    ]
+    assert rows == [
+        ("2025-06-01", "Еда", 1000.0, 750.0, 250.0, 75.0),
+        ("2025-06-01", "Развлечения", 500.0, 0.0, 500.0, 0.0),
+        ("2025-07-01", "Еда", 800.0, 1000.0, -200.0, 125.0),
+    ]
+
+    response = test_client.get("/api/budgets/report", params={"from": "2025-6"})
+    assert response.status_code == 200
+    response = test_client.get("/api/budgets/report", params={"from": "июнь"})
+    assert response.status_code == 400
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from decimal import Decimal
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, get_db
+from app.main import app
+from app.models import Account, Expense
+
+
+@pytest.fixture
+async def file_db(tmp_path):
+    # Отдельная файловая БД: у каждого запроса своё соединение и своя транзакция,
+    # как у параллельных клиентов в продакшене
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stress.db'}", connect_args={"timeout": 30})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield session_factory
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_expenses_never_overdraw(file_db):
+    async with file_db() as session:
+        account = Account(name="Горячий счёт", balance=Decimal("1000.0"))
+        session.add(account)
+        await session.commit()
+        account_id = account.id
+
+    # 40 одновременных списаний по 30 с остатка 1000: пройти могут ровно 33
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*[
+            client.post("/api/expenses/", json={"amount": 30, "account_id": account_id})
+            for _ in range(40)
+        ])
+
+    statuses = [r.status_code for r in responses]
+    assert statuses.count(200) == 33
+    assert statuses.count(400) == 7
+
+    async with file_db() as session:
+        balance = await session.scalar(select(Account.balance).where(Account.id == account_id))
+        count = await session.scalar(select(func.count(Expense.id)))
+    assert balance == Decimal("10.00")
+    assert count == 33
+
+
+@pytest.mark.asyncio
+async def test_concurrent_opposite_transfers_keep_total(file_db):
+    async with file_db() as session:
+        first = Account(name="Счёт А", balance=Decimal("500.0"))
+        second = Account(name="Счёт Б", balance=Decimal("500.0"))
+        session.add_all([first, second])
+        await session.commit()
+        first_id, second_id = first.id, second.id
+
+    # Встречные переводы между одной парой счетов не должны ни терять деньги, ни блокироваться
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*[
+            client.post("/api/transfers/", json={
+                "from_account_id": first_id if i % 2 else second_id,
+                "to_account_id": second_id if i % 2 else first_id,
+                "amount": 10,
+            })
+            for i in range(30)
+        ])
+
+    assert all(r.status_code == 200 for r in responses)
+    async with file_db() as session:
+        balances = (await session.execute(select(Account.id, Account.balance))).all()
+    assert sum(balance for _, balance in balances) == Decimal("1000.00")
+    assert dict(balances) == {first_id: Decimal("500.00"), second_id: Decimal("500.00")}
@@ -0,0 +1,40 @@
+import pytest
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+from app.models import Expense, Category, Account
+from app.rollup import rebuild_rollup
+
+
+@pytest.mark.asyncio
+async def test_dashboard(test_client, test_db):
+    # Счёт, категория и несколько расходов
+    test_category = Category(name="Категория дашборда")
+    test_account = Account(name="Счёт дашборда", balance=Decimal("900.0"))
+
+    async with test_db.begin():
+        test_db.add_all([test_category, test_account])
+        await test_db.flush()
+        test_db.add_all([
+            Expense(
+                description=f"Расход дашборда {i}",
+                amount=Decimal("25.0"),
+                spent_at=datetime(2025, 5, 1) + timedelta(days=i),
+                category_id=test_category.id,
+                account_id=test_account.id
+            )
+            for i in range(4)
+        ])
+    await rebuild_rollup(test_db)
+
+    response = test_client.get("/api/dashboard/", params={"recent": 3})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [a["name"] for a in data["accounts"]] == ["Счёт дашборда"]
+    assert [e["description"] for e in data["expenses"]] == [
+        "Расход дашборда 3", "Расход дашборда 2", "Расход дашборда 1"
+    ]
+    assert data["expenses"][0]["category"]["name"] == "Категория дашборда"
+    assert {s["category"]: float(s["total"]) for s in data["summary"]} == {"Категория дашборда": 100.0}
+    assert "ETag" in response.headers
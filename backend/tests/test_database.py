@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import database
+from app.database import TimedQueuePool, pool_status
+
+
+@pytest.mark.asyncio
+async def test_pool_status_counts_waits():
+    # Пул с учётом времени ожидания на SQLite вместо Postgres
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=TimedQueuePool, pool_size=2)
+    other = create_async_engine("sqlite+aiosqlite://", poolclass=TimedQueuePool, pool_size=2)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        status = pool_status(engine)
+    await engine.dispose()
+
+    assert status["size"] == 2
+    assert status["checked_out"] == 1
+    assert status["waits"] == 1
+    # Статистика у каждого пула своя и переживает dispose()
+    assert pool_status(other)["waits"] == 0
+    assert pool_status(engine)["waits"] == 1
+    await other.dispose()
+
+
+def test_health_db(test_client):
+    response = test_client.get("/api/health/db")
+
+    assert response.status_code == 200
+    assert "waits" in response.json()
+
+
+def test_reads_go_to_replica_until_client_writes(test_client, test_db, monkeypatch):
+    # «Реплика» — отдельная пустая база: чтения с неё не видят записей основной
+    replica = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    replica_sessions = sessionmaker(replica, class_=AsyncSession, expire_on_commit=False)
+
+    async def create_tables():
+        async with replica.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+
+    test_client.portal.call(create_tables)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", replica_sessions)
+
+    test_client.post("/api/categories/", json={"name": "Продукты"})
+    assert database.PRIMARY_COOKIE in test_client.cookies
+    assert [c["name"] for c in test_client.get("/api/categories/").json()] == ["Продукты"]
+
+    # Окно после записи истекло — чтение снова с реплики
+    test_client.cookies.set(database.PRIMARY_COOKIE, "0")
+    assert test_client.get("/api/categories/").json() == []
+
+    test_client.portal.call(replica.dispose)
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from decimal import Decimal
+
+from app import events
+from app.models import Account, Category
+from app.routers.events import change_feed
+
+
+def _drain(queue):
+    changes = []
+    while not queue.empty():
+        changes.append(queue.get_nowait())
+    return changes
+
+
+@pytest.fixture
+def subscriptions():
+    queues = []
+
+    def subscribe(family_id):
+        queue = events.broker.subscribe(family_id)
+        queues.append((family_id, queue))
+        return queue
+
+    yield subscribe
+    for family_id, queue in queues:
+        events.broker.unsubscribe(family_id, queue)
+
+
+@pytest.mark.asyncio
+async def test_committed_changes_are_published(test_client, test_db, subscriptions):
+    card = Account(name="Карта", balance=Decimal("1000.00"))
+    category = Category(name="Продукты")
+    async with test_db.begin():
+        test_db.add_all([card, category])
+        await test_db.flush()
+        card_id, category_id = card.id, category.id
+
+    mine, other = subscriptions(1), subscriptions(2)
+
+    expense = test_client.post("/api/expenses/", json={
+        "amount": "100.00", "account_id": card_id, "category_id": category_id,
+    }).json()
+    (change,) = _drain(mine)
+    assert change["entity"] == "expenses"
+    assert change["op"] == "create"
+    assert change["id"] == expense["id"]
+    assert change["data"]["category"]["name"] == "Продукты"
+    assert change["accounts"] == [{"id": card_id, "balance": "900.00"}]
+
+    # Откаченная операция и повтор по Idempotency-Key событий не дают
+    assert test_client.post("/api/expenses/", json={"amount": "5000.00", "account_id": card_id}).status_code == 400
+    headers = {"Idempotency-Key": "once"}
+    test_client.post("/api/incomes/", json={"amount": "50.00", "account_id": card_id}, headers=headers)
+    test_client.post("/api/incomes/", json={"amount": "50.00", "account_id": card_id}, headers=headers)
+    assert [(c["entity"], c["op"], c["accounts"][0]["balance"]) for c in _drain(mine)] == [
+        ("incomes", "create", "950.00"),
+    ]
+
+    test_client.delete(f"/api/expenses/{expense['id']}")
+    test_client.post("/api/expenses/bulk", json={"items": [
+        {"amount": "1.00", "account_id": card_id}, {"amount": "2.00", "account_id": card_id},
+    ]})
+    changes = _drain(mine)
+    assert [(c["entity"], c["op"], c["id"]) for c in changes] == [
+        ("expenses", "delete", expense["id"]),
+        ("expenses", "bulk", None),
+    ]
+    assert changes[0]["accounts"] == [{"id": card_id, "balance": "1050.00"}]
+    assert changes[1]["accounts"] == [{"id": card_id, "balance": "1047.00"}]
+
+    assert _drain(other) == []
+
+
+def test_slow_subscriber_gets_reset():
+    broker = events.EventBroker(queue_size=2)
+    queue = broker.subscribe(1)
+    for index in range(3):
+        broker.publish(1, {"entity": "expenses", "op": "create", "id": index, "accounts": []})
+    assert _drain(queue) == [events.RESET]
+    broker.unsubscribe(1, queue)
+    assert broker.status() == {"families": 0, "subscribers": 0}
+
+
+def test_large_notify_payload_drops_data():
+    change = {"entity": "expenses", "op": "create", "id": 1, "accounts": [], "data": {"description": "ы" * 100}}
+    assert json.loads(events.notify_payload(1, change)) == {"family_id": 1, "event": change}
+
+    change["data"]["description"] = "ы" * 4000
+    payload = events.notify_payload(1, change)
+    assert len(payload.encode()) <= events.NOTIFY_PAYLOAD_LIMIT
+    assert json.loads(payload) == {
+        "family_id": 1, "event": {"entity": "expenses", "op": "create", "id": 1, "accounts": []},
+    }
+
+
+@pytest.mark.asyncio
+async def test_event_stream_format(test_client, test_db):
+    async def read_stream():
+        response = await change_feed(family_id=1)
+        assert response.media_type == "text/event-stream"
+        chunks = response.body_iterator
+        first = await chunks.__anext__()
+        events.broker.publish(1, {"entity": "accounts", "op": "delete", "id": 7, "accounts": []})
+        second = await chunks.__anext__()
+        await chunks.aclose()
+        return first, second
+
+    first, second = test_client.portal.call(read_stream)
+    assert first == "retry: 3000\n\n"
+    assert second.startswith("event: change\ndata: ")
+    assert json.loads(second.split("data: ", 1)[1]) == {"entity": "accounts", "op": "delete", "id": 7, "accounts": []}
+    # Закрытый поток отписывается
+    assert events.broker.status()["subscribers"] == 0
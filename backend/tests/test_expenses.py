@@ -2,7 +2,10 @@ import pytest
 from decimal import Decimal
 from datetime import datetime, timedelta
 
-from app.models import Expense, Category, Account
+from sqlalchemy import func, select
+
+from app.models import Expense, Income, Category, Account, CategoryMonthRollup
+from app.rollup import rebuild_rollup
 
 
 @pytest.mark.asyncio
@@ -219,6 +222,9 @@ async def test_get_expenses_summary(test_client, test_db):
             ),
         ]
         test_db.add_all(test_expenses)
+
+    # Расходы добавлены в обход API, поэтому помесячные итоги пересчитываем
+    await rebuild_rollup(test_db)
     
     # Запрашиваем сводку по расходам
     current_month = datetime.now().strftime("%Y-%m")
@@ -234,3 +240,188 @@ async def test_get_expenses_summary(test_client, test_db):
     assert "Транспорт" in summary_dict
     assert float(summary_dict["Еда"]) == 800.0
     assert float(summary_dict["Транспорт"]) == 600.0
+
+
+@pytest.mark.asyncio
+async def test_list_expenses_cursor_pagination(test_client, test_db):
+    # Создаём счёт и пять расходов с разными датами
+    test_account = Account(name="Счёт для пагинации", balance=Decimal("10000.0"))
+
+    async with test_db.begin():
+        test_db.add(test_account)
+        await test_db.flush()
+        account_id = test_account.id
+        base = datetime(2025, 1, 10, 12, 0, 0)
+        test_db.add_all([
+            Expense(
+                description=f"Страница {i}",
+                amount=Decimal(100 * (i + 1)),
+                spent_at=base - timedelta(days=i),
+                account_id=account_id
+            )
+            for i in range(5)
+        ])
+
+    # Первая страница содержит две самые свежие траты и курсор
+    response = test_client.get("/api/expenses/", params={"limit": 2, "account_id": account_id})
+    assert response.status_code == 200
+    assert [e["description"] for e in response.json()] == ["Страница 0", "Страница 1"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    # Проходим оставшиеся страницы по курсору
+    response = test_client.get("/api/expenses/", params={"limit": 2, "account_id": account_id, "cursor": cursor})
+    assert [e["description"] for e in response.json()] == ["Страница 2", "Страница 3"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = test_client.get("/api/expenses/", params={"limit": 2, "account_id": account_id, "cursor": cursor})
+    assert [e["description"] for e in response.json()] == ["Страница 4"]
+    assert "X-Next-Cursor" not in response.headers
+
+    # Фильтры по сумме и дате
+    response = test_client.get("/api/expenses/", params={"amount_min": 200, "amount_max": 300})
+    assert sorted(e["description"] for e in response.json()) == ["Страница 1", "Страница 2"]
+    response = test_client.get("/api/expenses/", params={"date_from": "2025-01-09T00:00:00"})
+    assert [e["description"] for e in response.json()] == ["Страница 0", "Страница 1"]
+
+    # Испорченный курсор
+    response = test_client.get("/api/expenses/", params={"cursor": "мусор"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_expenses_bulk(test_client, test_db):
+    # Два счёта: на одном хватает средств на весь пакет, на другом — нет
+    rich = Account(name="Счёт для импорта", balance=Decimal("1000.0"))
+    poor = Account(name="Пустой счёт для импорта", balance=Decimal("50.0"))
+
+    async with test_db.begin():
+        test_db.add_all([rich, poor])
+        await test_db.flush()
+        rich_id, poor_id = rich.id, poor.id
+
+    payload = {"items": [
+        {"amount": 100.0, "account_id": rich_id, "description": "Импорт 1", "spent_at": "2025-02-01T10:00:00"},
+        {"amount": 250.5, "account_id": rich_id, "description": "Импорт 2"},
+        {"amount": 40.0, "account_id": poor_id, "description": "Импорт 3"},
+        {"amount": 20.0, "account_id": poor_id, "description": "Импорт 4"},
+        {"amount": 10.0, "account_id": 999999, "description": "Импорт 5"},
+    ]}
+    response = test_client.post("/api/expenses/bulk", json=payload)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 2
+    assert [r["id"] is not None for r in result["results"]] == [True, True, False, False, False]
+    assert result["results"][2]["error"] == "Insufficient funds on account"
+    assert result["results"][4]["error"] == "Счет не найден"
+
+    # Баланс изменён одной суммой по каждому счёту
+    response = test_client.get(f"/api/accounts/{rich_id}")
+    assert float(response.json()["balance"]) == 649.5
+    response = test_client.get(f"/api/accounts/{poor_id}")
+    assert float(response.json()["balance"]) == 50.0
+
+    response = test_client.get(f"/api/expenses/{result['results'][0]['id']}")
+    assert response.json()["spent_at"].startswith("2025-02-01T10:00:00")
+
+
+@pytest.mark.asyncio
+async def test_summary_follows_created_and_deleted_expenses(test_client, test_db):
+    # Итоги обновляются в той же транзакции, что и расходы
+    test_category = Category(name="Категория итогов")
+    test_account = Account(name="Счёт итогов", balance=Decimal("1000.0"))
+
+    async with test_db.begin():
+        test_db.add_all([test_category, test_account])
+        await test_db.flush()
+        category_id = test_category.id
+        account_id = test_account.id
+
+    ids = []
+    for amount in (120.0, 80.0):
+        response = test_client.post("/api/expenses/", json={
+            "amount": amount, "category_id": category_id, "account_id": account_id
+        })
+        ids.append(response.json()["id"])
+
+    current_month = datetime.now().strftime("%Y-%m")
+    response = test_client.get(f"/api/expenses/summary/{current_month}")
+    summary_dict = {item["category"]: float(item["total"]) for item in response.json()}
+    assert summary_dict["Категория итогов"] == 200.0
+
+    test_client.delete(f"/api/expenses/{ids[0]}")
+    response = test_client.get("/api/expenses/summary")
+    summary_dict = {item["category"]: float(item["total"]) for item in response.json()}
+    assert summary_dict["Категория итогов"] == 80.0
+
+    response = test_client.get("/api/expenses/summary/2025-13")
+    assert response.status_code == 400
+
+
+async def _rollup_and_ledger(session):
+    rollup = CategoryMonthRollup
+    res = await session.execute(
+        select(rollup.category_id, rollup.account_id, func.sum(rollup.expense_total), func.sum(rollup.income_total))
+        .group_by(rollup.category_id, rollup.account_id)
+    )
+    from_rollup = {(c, a): (e, i) for c, a, e, i in res.all() if e or i}
+    ledger = {}
+    for model, index in ((Expense, 0), (Income, 1)):
+        category_id, account_id = func.coalesce(model.category_id, 0), func.coalesce(model.account_id, 0)
+        res = await session.execute(
+            select(category_id, account_id, func.sum(model.amount)).group_by(category_id, account_id)
+        )
+        for c, a, total in res.all():
+            totals = list(ledger.get((c, a), (Decimal("0"), Decimal("0"))))
+            totals[index] += total
+            ledger[(c, a)] = tuple(totals)
+    return from_rollup, ledger
+
+
+@pytest.mark.asyncio
+async def test_summary_after_deleting_category_and_account(test_client, test_db):
+    # Итоги удалённых категории и счёта переходят в корзину 0, как и ссылки журнала
+    card = test_client.post("/api/accounts/", json={"name": "Карта", "balance": "1000.00"}).json()["id"]
+    cash = test_client.post("/api/accounts/", json={"name": "Наличные", "balance": "1000.00"}).json()["id"]
+    food = test_client.post("/api/categories/", json={"name": "Продукты"}).json()["id"]
+    taxi = test_client.post("/api/categories/", json={"name": "Такси"}).json()["id"]
+    for amount, category_id, account_id in (
+        ("100.00", taxi, card), ("40.00", taxi, cash), ("50.00", food, card), ("25.00", None, card),
+    ):
+        test_client.post("/api/expenses/", json={"amount": amount, "category_id": category_id, "account_id": account_id})
+    test_client.post("/api/incomes/", json={"amount": "30.00", "category_id": taxi, "account_id": cash})
+
+    assert test_client.delete(f"/api/categories/{taxi}").status_code == 200
+    assert test_client.delete(f"/api/accounts/{cash}").status_code == 200
+    # SQLite может выдать новой категории id удалённой
+    test_client.post("/api/categories/", json={"name": "Кафе"})
+
+    from_rollup, ledger = await _rollup_and_ledger(test_db)
+    assert from_rollup == ledger
+    assert ledger[(0, 0)] == (Decimal("40.00"), Decimal("30.00"))
+
+    summary = {item["category"]: Decimal(item["total"]) for item in test_client.get("/api/expenses/summary").json()}
+    res = await test_db.execute(
+        select(Category.name, func.sum(Expense.amount)).join(Expense, Expense.category_id == Category.id).group_by(Category.name)
+    )
+    assert summary == dict(res.all()) == {"Продукты": Decimal("50.00")}
+
+
+@pytest.mark.asyncio
+async def test_get_expense_by_id_and_time(test_client, test_db):
+    # Время, проставленное сервером, возвращается при создании и сужает поиск по id
+    test_account = Account(name="Счёт для поиска по времени", balance=Decimal("1000.0"))
+
+    async with test_db.begin():
+        test_db.add(test_account)
+        await test_db.flush()
+        account_id = test_account.id
+
+    response = test_client.post("/api/expenses/", json={"amount": 100.0, "account_id": account_id})
+    assert response.status_code == 200
+    created = response.json()
+    assert created["spent_at"] is not None
+
+    response = test_client.get(f"/api/expenses/{created['id']}", params={"spent_at": created["spent_at"]})
+    assert response.status_code == 200
+    assert response.json()["id"] == created["id"]
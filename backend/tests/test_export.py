@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import pytest
+from decimal import Decimal
+from datetime import datetime
+
+from app.models import Expense, Income, Category, Account
+
+
+async def _seed_ledger(test_db):
+    test_category = Category(name="Категория выгрузки")
+    test_account = Account(name="Счёт выгрузки", balance=Decimal("1000.0"))
+
+    async with test_db.begin():
+        test_db.add_all([test_category, test_account])
+        await test_db.flush()
+        test_db.add_all([
+            Income(description="Аванс", amount=Decimal("700.0"), received_at=datetime(2025, 3, 1, 9),
+                   category_id=test_category.id, account_id=test_account.id),
+            Expense(description="Кофе, с собой", amount=Decimal("150.5"), spent_at=datetime(2025, 3, 2, 9),
+                    category_id=test_category.id, account_id=test_account.id),
+            Expense(description="Старый расход", amount=Decimal("10.0"), spent_at=datetime(2024, 1, 1, 9),
+                    account_id=test_account.id),
+        ])
+
+
+@pytest.mark.asyncio
+async def test_export_ledger_csv(test_client, test_db):
+    await _seed_ledger(test_db)
+
+    response = test_client.get("/api/export/ledger", params={"date_from": "2025-01-01T00:00:00"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(r["kind"], r["description"]) for r in rows] == [
+        ("income", "Аванс"),
+        ("expense", "Кофе, с собой"),
+    ]
+    assert Decimal(rows[1]["amount"]) == Decimal("150.5")
+    assert rows[1]["category"] == "Категория выгрузки"
+
+
+@pytest.mark.asyncio
+async def test_export_ledger_ndjson(test_client, test_db):
+    await _seed_ledger(test_db)
+
+    response = test_client.get("/api/export/ledger", params={"format": "ndjson", "kind": "expense"})
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["description"] for r in rows] == ["Старый расход", "Кофе, с собой"]
+    assert rows[0]["category"] is None
+    assert Decimal(rows[1]["amount"]) == Decimal("150.5")
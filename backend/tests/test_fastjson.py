@@ -0,0 +1,37 @@
+import pytest
+from decimal import Decimal
+from datetime import datetime
+
+from app import fastjson
+from app.models import Expense, Income, Transfer, Category, Account
+
+
+@pytest.mark.asyncio
+async def test_fast_list_responses_match_schema_output(test_client, test_db, monkeypatch):
+    # Быстрый путь должен отдавать байт-в-байт тот же JSON, что и response_model
+    category = Category(name="Категория быстрого пути")
+    first = Account(name="Счёт быстрого пути", balance=Decimal("1234.5"))
+    second = Account(name="Второй счёт быстрого пути", balance=Decimal("0"))
+
+    async with test_db.begin():
+        test_db.add_all([category, first, second])
+        await test_db.flush()
+        test_db.add_all([
+            Expense(amount=Decimal("10.01"), category_id=category.id, account_id=first.id,
+                    description="С категорией", spent_at=datetime(2025, 4, 1, 8, 30, 15, 120000)),
+            Expense(amount=Decimal("7"), account_id=first.id, spent_at=datetime(2025, 4, 2, 9)),
+            Income(amount=Decimal("99.9"), category_id=category.id, account_id=first.id,
+                   received_at=datetime(2025, 4, 3, 10)),
+            Transfer(from_account_id=first.id, to_account_id=second.id, amount=Decimal("5"),
+                     transferred_at=datetime(2025, 4, 4, 11)),
+        ])
+
+    for url in ("/api/expenses/?limit=1", "/api/incomes/", "/api/transfers/", "/api/accounts/"):
+        monkeypatch.setattr(fastjson, "FAST_LIST_RESPONSES", False)
+        slow = test_client.get(url)
+        monkeypatch.setattr(fastjson, "FAST_LIST_RESPONSES", True)
+        fast = test_client.get(url)
+
+        assert fast.status_code == slow.status_code == 200
+        assert fast.content == slow.content, url
+        assert fast.headers.get("X-Next-Cursor") == slow.headers.get("X-Next-Cursor")
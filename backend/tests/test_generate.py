@@ -0,0 +1,46 @@
+import pytest
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app.models import Account, Expense, Income, Transfer
+
+np = pytest.importorskip("numpy")
+
+from benchmarks.generate import generate, pg_copy_binary
+
+
+def test_pg_copy_binary_layout():
+    data = pg_copy_binary([(np.array([1, 2]), "int4"), (np.array([10, 20]), "int8")])
+    # Заголовок 19 байт, строка: число полей + (длина, значение) на поле, завершающий -1
+    assert data.startswith(b"PGCOPY\n\xff\r\n\x00")
+    assert len(data) == 19 + 2 * (2 + 4 + 4 + 4 + 8) + 2
+    assert data[19:41] == b"\x00\x02" + b"\x00\x00\x00\x04\x00\x00\x00\x01" + b"\x00\x00\x00\x08" + (10).to_bytes(8, "big")
+    assert data.endswith(b"\xff\xff")
+
+
+@pytest.mark.asyncio
+async def test_generated_balances_match_ledger(test_db):
+    summary = await generate(test_db, expenses=3000, years=1, accounts=4, batch_size=700, seed=7)
+    assert summary["expenses"] == 3000
+
+    accounts = dict((await test_db.execute(select(Account.id, Account.balance))).all())
+    movements = []
+    for account_col, ts, amount, sign in [
+        (Expense.account_id, Expense.spent_at, Expense.amount, -1),
+        (Income.account_id, Income.received_at, Income.amount, 1),
+        (Transfer.to_account_id, Transfer.transferred_at, Transfer.amount, 1),
+        (Transfer.from_account_id, Transfer.transferred_at, Transfer.amount, -1),
+    ]:
+        rows = (await test_db.execute(select(account_col, ts, amount))).all()
+        movements += [(ts_value, acc, sign * Decimal(str(value))) for acc, ts_value, value in rows]
+    assert sum(1 for m in movements if m[2] < 0) >= 3000
+
+    # Остаток в журнале с начального никогда не уходит в минус и сходится с Account.balance
+    totals = {acc: sum((m[2] for m in movements if m[1] == acc), Decimal(0)) for acc in accounts}
+    running = {acc: accounts[acc] - totals[acc] for acc in accounts}
+    assert all(opening >= 0 for opening in running.values())
+    for _, acc, delta in sorted(movements, key=lambda m: m[0]):
+        running[acc] += delta
+        assert running[acc] >= Decimal("-0.01")
+    assert all(abs(running[acc] - accounts[acc]) < Decimal("0.01") for acc in accounts)
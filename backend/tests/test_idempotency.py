@@ -0,0 +1,108 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import select, update
+
+from app import idempotency
+from app.models import Account, IdempotencyKey
+from app.routers import expenses
+from tests.conftest import TestSessionLocal
+
+
+async def _accounts(test_db):
+    card = Account(name="Карта", balance=Decimal("1000.00"))
+    cash = Account(name="Наличные", balance=Decimal("0.00"))
+    async with test_db.begin():
+        test_db.add_all([card, cash])
+        await test_db.flush()
+        return card.id, cash.id
+
+
+def _balance(test_client, account_id):
+    return Decimal(test_client.get(f"/api/accounts/{account_id}").json()["balance"])
+
+
+@pytest.mark.asyncio
+async def test_retried_posts_do_not_move_money_twice(test_client, test_db):
+    card_id, cash_id = await _accounts(test_db)
+    requests = [
+        ("/api/expenses/", {"amount": "100.00", "account_id": card_id, "description": "Такси"}),
+        ("/api/incomes/", {"amount": "50.00", "account_id": card_id}),
+        ("/api/transfers/", {"from_account_id": card_id, "to_account_id": cash_id, "amount": "200.00"}),
+    ]
+    for index, (url, body) in enumerate(requests):
+        headers = {"Idempotency-Key": f"key-{index}"}
+        first = test_client.post(url, json=body, headers=headers)
+        assert first.status_code == 200
+        assert idempotency.REPLAYED_HEADER not in first.headers
+        retry = test_client.post(url, json=body, headers=headers)
+        assert retry.status_code == 200
+        assert retry.headers[idempotency.REPLAYED_HEADER] == "true"
+        assert retry.json() == first.json()
+
+    assert _balance(test_client, card_id) == Decimal("750.00")
+    assert _balance(test_client, cash_id) == Decimal("200.00")
+    assert len(test_client.get("/api/expenses/").json()) == 1
+    assert len(test_client.get("/api/transfers/").json()) == 1
+
+    # Тот же ключ с другим телом — ошибка, без ключа — обычная запись
+    response = test_client.post(
+        "/api/expenses/", json={"amount": "1.00", "account_id": card_id}, headers={"Idempotency-Key": "key-0"}
+    )
+    assert response.status_code == 422
+    assert test_client.post("/api/expenses/", json={"amount": "1.00", "account_id": card_id}).status_code == 200
+    assert test_client.post("/api/expenses/", json={"amount": "1.00", "account_id": card_id}).status_code == 200
+    assert _balance(test_client, card_id) == Decimal("748.00")
+
+
+@pytest.mark.asyncio
+async def test_failed_request_and_expired_key_are_not_replayed(test_client, test_db):
+    card_id, _ = await _accounts(test_db)
+    headers = {"Idempotency-Key": "retry-me"}
+    body = {"amount": "1500.00", "account_id": card_id}
+
+    # Ошибка не сохраняется: после пополнения повтор с тем же ключом проходит
+    assert test_client.post("/api/expenses/", json=body, headers=headers).status_code == 400
+    test_client.post("/api/incomes/", json={"amount": "1000.00", "account_id": card_id})
+    assert test_client.post("/api/expenses/", json=body, headers=headers).status_code == 200
+    assert _balance(test_client, card_id) == Decimal("500.00")
+
+    async with TestSessionLocal() as session:
+        await session.execute(
+            update(IdempotencyKey).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        await session.commit()
+        # Просроченный ключ снова свободен
+        body = {"amount": "100.00", "account_id": card_id}
+        response = test_client.post("/api/expenses/", json=body, headers=headers)
+        assert response.status_code == 200
+        assert idempotency.REPLAYED_HEADER not in response.headers
+        assert _balance(test_client, card_id) == Decimal("400.00")
+
+        await session.execute(
+            update(IdempotencyKey).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        await session.commit()
+        assert await idempotency.purge_expired(session) == 1
+        assert (await session.execute(select(IdempotencyKey))).scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_rolls_back(test_client, test_db, monkeypatch):
+    # Параллельный запрос с тем же ключом успел зафиксироваться между
+    # проверкой и записью: вторая операция откатывается целиком
+    card_id, _ = await _accounts(test_db)
+    body = {"amount": "100.00", "account_id": card_id}
+    first = test_client.post("/api/expenses/", json=body, headers={"Idempotency-Key": "race"})
+
+    async def no_lookup(*args):
+        return None
+
+    monkeypatch.setattr(expenses, "find_response", no_lookup)
+    second = test_client.post("/api/expenses/", json=body, headers={"Idempotency-Key": "race"})
+
+    assert second.status_code == 200
+    assert second.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert second.json() == first.json()
+    assert _balance(test_client, card_id) == Decimal("900.00")
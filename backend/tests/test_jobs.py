@@ -0,0 +1,127 @@
+import asyncio
+import csv
+import io
+import os
+
+import pytest
+
+from app.main import app
+from app.routers import jobs
+from app.tenancy import get_family_id
+
+
+def _wait_jobs(test_client):
+    test_client.portal.call(test_client.app.state.jobs.queue.join)
+
+
+def _seed(test_client):
+    account_id = test_client.post("/api/accounts/", json={"name": "Карта", "balance": "1000.00"}).json()["id"]
+    category_id = test_client.post("/api/categories/", json={"name": "Продукты"}).json()["id"]
+    response = test_client.post("/api/expenses/bulk", json={"items": [
+        {"amount": "100.00", "account_id": account_id, "category_id": category_id, "spent_at": "2023-05-10T10:00:00"},
+        {"amount": "50.00", "account_id": account_id, "category_id": category_id, "spent_at": "2024-02-01T10:00:00"},
+        {"amount": "25.00", "account_id": account_id, "spent_at": "2024-02-03T10:00:00"},
+    ]})
+    assert response.json()["created"] == 3
+    response = test_client.post("/api/incomes/bulk", json={"items": [
+        {"amount": "300.00", "account_id": account_id, "received_at": "2024-02-05T10:00:00"},
+    ]})
+    assert response.json()["created"] == 1
+    return account_id
+
+
+@pytest.mark.asyncio
+async def test_summary_job(test_client, test_db):
+    _seed(test_client)
+
+    response = test_client.post("/api/jobs/summary", json={"date_from": "2023-01-01", "date_to": "2024-12-31"})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    _wait_jobs(test_client)
+
+    job = test_client.get(f"/api/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert job["progress"] == 1.0
+    assert [(r["month"], r["category"], float(r["expense_total"]), float(r["income_total"])) for r in job["result"]] == [
+        ("2023-05-01", "Продукты", 100.0, 0.0),
+        ("2024-02-01", None, 25.0, 300.0),
+        ("2024-02-01", "Продукты", 50.0, 0.0),
+    ]
+
+    # Неверный диапазон — задача завершается ошибкой, а не запрос
+    job_id = test_client.post("/api/jobs/summary", json={"date_from": "2024-01-01", "date_to": "2023-01-01"}).json()["id"]
+    _wait_jobs(test_client)
+    job = test_client.get(f"/api/jobs/{job_id}").json()
+    assert job["status"] == "failed"
+    assert job["error"] == "Конец диапазона раньше начала"
+
+    assert test_client.post("/api/jobs/summary", json={}).status_code == 422
+    assert test_client.post("/api/jobs/unknown").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_export_and_reconcile_jobs(test_client, test_db):
+    _seed(test_client)
+
+    export_id = test_client.post("/api/jobs/export", json={"kind": "expense"}).json()["id"]
+    reconcile_id = test_client.post("/api/jobs/reconcile").json()["id"]
+    _wait_jobs(test_client)
+
+    job = test_client.get(f"/api/jobs/{export_id}").json()
+    assert job["result"] == {"rows": 3, "url": f"/api/jobs/{export_id}/result"}
+    assert job["processed"] == 3
+    response = test_client.get(job["result"]["url"])
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="ledger.csv"'
+    assert [r["amount"] for r in csv.DictReader(io.StringIO(response.text))] == ["100.00", "50.00", "25.00"]
+
+    # Файл выгрузки живёт, пока хранится результат задачи
+    manager = test_client.app.state.jobs
+    path = manager.get(export_id).file[0]
+    assert os.path.exists(path)
+    manager.results.set(export_id, manager.get(export_id), ttl=-1)
+    assert manager.results.expire() == 1
+    assert not os.path.exists(path)
+    assert test_client.get(f"/api/jobs/{export_id}/result").status_code == 404
+
+    report = test_client.get(f"/api/jobs/{reconcile_id}").json()["result"]
+    assert report["checked_accounts"] == 1
+    assert report["mismatches"] == []
+    assert test_client.get(f"/api/jobs/{reconcile_id}/result").status_code == 404
+
+    # Задачи другой семьи не видны
+    app.dependency_overrides[get_family_id] = lambda: 2
+    assert test_client.get(f"/api/jobs/{reconcile_id}").status_code == 404
+    app.dependency_overrides.pop(get_family_id)
+
+
+@pytest.mark.asyncio
+async def test_identical_jobs_share_one_run(test_client, test_db, monkeypatch):
+    gate = asyncio.Event()
+    runs = []
+
+    async def slow_summary(job, session_factory):
+        runs.append(job.id)
+        job.progress = 0.5
+        await gate.wait()
+        return []
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "summary", (jobs.JOB_KINDS["summary"][0], slow_summary, False))
+
+    first = test_client.post("/api/jobs/summary", json={"date_from": "2020-01-01"}).json()
+    second = test_client.post("/api/jobs/summary", json={"date_from": "2020-01-01"}).json()
+    other = test_client.post("/api/jobs/summary", json={"date_from": "2021-01-01"}).json()
+    assert first["id"] == second["id"]
+    assert other["id"] != first["id"]
+    test_client.portal.call(asyncio.sleep, 0)
+    assert test_client.get(f"/api/jobs/{first['id']}").json()["progress"] == 0.5
+
+    test_client.portal.call(gate.set)
+    _wait_jobs(test_client)
+    assert sorted(runs) == sorted([first["id"], other["id"]])
+    assert test_client.get(f"/api/jobs/{first['id']}").json()["status"] == "done"
+
+    # Завершённая задача больше не объединяет новые запросы
+    third = test_client.post("/api/jobs/summary", json={"date_from": "2020-01-01"}).json()
+    assert third["id"] != first["id"]
+    _wait_jobs(test_client)
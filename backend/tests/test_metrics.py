@@ -0,0 +1,44 @@
+import pytest
+
+from app.metrics import render_labelled_gauges
+
+
+@pytest.mark.asyncio
+async def test_metrics_exposes_route_latency(test_client, test_db):
+    # Запрос к маршруту с параметром учитывается по шаблону пути
+    response = test_client.get("/api/accounts/999999")
+    assert response.status_code == 404
+    assert response.headers["Server-Timing"].startswith("app;dur=")
+
+    response = test_client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/accounts/{account_id}",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/accounts/{account_id}",le="+Inf"}' in body
+    assert "http_requests_in_flight 1" in body
+    assert 'db_pool_waits{pool="primary"}' in body
+
+
+@pytest.mark.asyncio
+async def test_metrics_unmatched_route_label(test_client):
+    test_client.get("/no/such/path")
+
+    body = test_client.get("/api/metrics").text
+
+    assert 'route="unmatched",status="404"' in body
+    assert "/no/such/path" not in body
+
+
+def test_labelled_gauges_declare_each_metric_once():
+    body = render_labelled_gauges("db_pool", "pool", {
+        "primary": {"pool": "TimedQueuePool", "waits": 3}, "replica": {"waits": 1, "idle": 2},
+    })
+    assert body.splitlines() == [
+        "# TYPE db_pool_waits gauge",
+        'db_pool_waits{pool="primary"} 3',
+        'db_pool_waits{pool="replica"} 1',
+        "# TYPE db_pool_idle gauge",
+        'db_pool_idle{pool="replica"} 2',
+    ]
@@ -0,0 +1,18 @@
+from datetime import date
+
+from app.partitions import partition_name, plan_partitions
+
+
+def test_plan_partitions_ahead_and_from_default():
+    existing = {"expenses_default", "expenses_p2025_05", "expenses_p2025_06"}
+
+    plan = plan_partitions("expenses", existing, [date(2024, 12, 1)], today=date(2025, 6, 18), months_ahead=2)
+
+    # Прошлый и текущий месяц уже есть; впереди два месяца; декабрь переносится из DEFAULT
+    assert plan == [
+        (date(2024, 12, 1), True),
+        (date(2025, 7, 1), False),
+        (date(2025, 8, 1), False),
+    ]
+    assert partition_name("incomes", date(2026, 1, 1)) == "incomes_p2026_01"
+    assert plan_partitions("expenses", existing, [], today=date(2025, 12, 3), months_ahead=1)[-1] == (date(2026, 1, 1), False)
@@ -0,0 +1,54 @@
+import pytest
+from decimal import Decimal
+
+from app.main import app
+from app.models import Account, Category
+from app.tenancy import get_family_id
+
+
+@pytest.mark.asyncio
+async def test_families_do_not_see_each_other(test_client, test_db):
+    # Данные первой семьи создаются напрямую, запросы идут от второй
+    own = Account(family_id=1, name="Общий счёт", balance=Decimal("1000.00"))
+    category = Category(family_id=1, name="Продукты")
+    async with test_db.begin():
+        test_db.add_all([own, category])
+        await test_db.flush()
+        account_id, category_id = own.id, category.id
+
+    response = test_client.post("/api/expenses/", json={"amount": "10.00", "account_id": account_id})
+    assert response.status_code == 200
+    etag = test_client.get("/api/accounts/").headers["etag"]
+
+    app.dependency_overrides[get_family_id] = lambda: 2
+
+    assert test_client.get("/api/accounts/").json() == []
+    assert test_client.get("/api/expenses/").json() == []
+    assert test_client.get("/api/categories/").json() == []
+    assert test_client.get(f"/api/accounts/{account_id}").status_code == 404
+    assert test_client.get(f"/api/accounts/{account_id}/statement").status_code == 404
+    # Версии таблиц у каждой семьи свои
+    assert test_client.get("/api/accounts/").headers["etag"] != etag
+
+    # Чужой счёт и чужая категория не принимаются
+    response = test_client.post("/api/expenses/", json={"amount": "10.00", "account_id": account_id})
+    assert response.status_code == 404
+    response = test_client.post("/api/transfers/", json={
+        "from_account_id": account_id, "to_account_id": account_id + 1, "amount": "1.00",
+    })
+    assert response.status_code == 404
+
+    mine = test_client.post("/api/accounts/", json={"name": "Общий счёт", "balance": "50.00"})
+    assert mine.status_code == 200
+    response = test_client.post("/api/expenses/", json={
+        "amount": "5.00", "account_id": mine.json()["id"], "category_id": category_id,
+    })
+    assert response.status_code == 404
+
+    # Имена уникальны в пределах семьи, а не всей установки
+    assert test_client.post("/api/categories/", json={"name": "Продукты"}).status_code == 200
+    assert test_client.get("/api/expenses/summary").json() == []
+
+    app.dependency_overrides.pop(get_family_id)
+    assert float(test_client.get(f"/api/accounts/{account_id}").json()["balance"]) == 990.0
+    assert [c["name"] for c in test_client.get("/api/categories/").json()] == ["Продукты"]
@@ -0,0 +1,149 @@
+from decimal import Decimal
+
+import pytest
+
+from app import auth, bot
+from app.models import Account, Category, Family, User
+from tests.conftest import TestSessionLocal
+
+SECRET = "webhook-secret"
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+    async def close(self):
+        pass
+
+
+def _update(update_id: int, text: str, telegram_id: int = 1001) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "from": {"id": telegram_id, "first_name": "Папа"},
+            "chat": {"id": telegram_id, "type": "private"},
+            "text": text,
+        },
+    }
+
+
+@pytest.fixture
+def fake_telegram(test_client, monkeypatch):
+    monkeypatch.setattr(bot, "TELEGRAM_WEBHOOK_SECRET", SECRET)
+    auth.user_cache.clear()
+    dispatcher = test_client.app.state.bot
+    monkeypatch.setattr(dispatcher, "session_factory", TestSessionLocal)
+    monkeypatch.setattr(dispatcher, "client", FakeTelegram())
+    yield dispatcher.client
+    auth.user_cache.clear()
+
+
+def test_parse_helpers():
+    assert bot.parse_command("/spent@family_bot 500 еда") == ("spent", "500 еда")
+    assert bot.parse_command("привет") == (None, "привет")
+    assert bot.parse_amount("99,90") == Decimal("99.90")
+    assert bot.parse_amount("0") is None
+    assert bot.parse_amount("1.001") is None
+    assert bot.parse_amount("NaN") is None
+    categories = {"еда": 1, "еда вне дома": 2}
+    assert bot.match_category("Еда вне дома пицца", categories) == (2, "пицца")
+    assert bot.match_category("едадом", categories) == (None, "едадом")
+
+
+@pytest.mark.asyncio
+async def test_webhook_records_expenses_in_batches(test_client, test_db, fake_telegram):
+    async with test_db.begin():
+        test_db.add(Family(id=1, name="Моя семья"))
+        test_db.add_all([
+            User(telegram_id=1001, family_id=1, first_name="Папа"),
+            Account(family_id=1, name="Карта", balance=Decimal("1000.00")),
+            Category(family_id=1, name="Продукты"),
+        ])
+
+    updates = [
+        _update(1, "/spent 500 продукты хлеб"),
+        _update(2, "/spent 99,50"),
+        _update(3, "/spent 1000"),
+        _update(4, "/spent много"),
+    ]
+    # Без секрета или с неверным секретом updates не принимаются
+    assert test_client.post("/webhook/telegram", json=updates[0]).status_code == 403
+    response = test_client.post(
+        "/webhook/telegram", json=updates[0], headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+    )
+    assert response.status_code == 403
+    response = test_client.post(
+        "/webhook/telegram", json=updates[0], headers={"X-Telegram-Bot-Api-Secret-Token": "секрет".encode()}
+    )
+    assert response.status_code == 403
+
+    # Все updates ставятся в очередь без переключения цикла: воркер забирает их одной пачкой
+    dispatcher = test_client.app.state.bot
+
+    async def deliver():
+        for update in updates:
+            dispatcher.enqueue(update)
+        await dispatcher.queue.join()
+
+    test_client.portal.call(deliver)
+
+    expenses = test_client.get("/api/expenses/").json()
+    assert sorted(float(e["amount"]) for e in expenses) == [99.5, 500.0]
+    food = next(e for e in expenses if float(e["amount"]) == 500)
+    assert food["category"]["name"] == "Продукты"
+    assert food["description"] == "хлеб"
+    assert float(test_client.get("/api/accounts/").json()[0]["balance"]) == 400.5
+
+    replies = sorted(text for _, text in fake_telegram.sent)
+    assert replies == sorted([
+        "Записан расход 500 — Продукты (хлеб)",
+        "Записан расход 99.50",
+        "Расход 1000 не записан: Insufficient funds on account",
+        bot.HELP_TEXT,
+    ])
+
+
+@pytest.mark.asyncio
+async def test_webhook_acknowledges_immediately(test_client, test_db, fake_telegram, monkeypatch):
+    # Воркеры заняты или база недоступна: ответ Telegram всё равно 200
+    dispatcher = bot.WebhookDispatcher(TestSessionLocal, fake_telegram, queue_size=1)
+    monkeypatch.setattr(test_client.app.state, "bot", dispatcher)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    assert test_client.post("/webhook/telegram", json=_update(1, "/spent 10"), headers=headers).status_code == 200
+    assert test_client.post("/webhook/telegram", json=_update(2, "/spent 20"), headers=headers).status_code == 200
+    assert test_client.post("/webhook/telegram", content=b"not json", headers=headers).status_code == 200
+    assert dispatcher.status() == {
+        "queue_size": 1, "queue_capacity": 1, "received": 2, "dropped": 1, "processed": 0,
+    }
+    assert fake_telegram.sent == []
+
+
+@pytest.mark.asyncio
+async def test_failed_update_does_not_drop_the_batch(test_client, test_db, fake_telegram, monkeypatch):
+    resolve_user = auth.resolve_user
+
+    async def flaky_resolve_user(session_factory, tg_user):
+        if tg_user["id"] == 666:
+            raise RuntimeError("database is down")
+        return await resolve_user(session_factory, tg_user)
+
+    monkeypatch.setattr(auth, "resolve_user", flaky_resolve_user)
+    dispatcher = test_client.app.state.bot
+    test_client.portal.call(dispatcher.process, [
+        _update(1, "/spent 10", telegram_id=666),
+        {"update_id": 2, "message": "not a message"},
+        _update(3, "/help", telegram_id=1001),
+        _update(4, "/spent 20", telegram_id=1001),
+    ])
+
+    assert sorted(fake_telegram.sent) == [
+        (666, bot.FAILURE_TEXT),
+        (1001, bot.HELP_TEXT),
+        (1001, "Сначала создайте счёт в приложении"),
+    ]
@@ -1,66 +1,180 @@
 -- Initial schema for family budget app
 
+-- Семьи: все данные принадлежат одной семье, и все индексы начинаются с
+-- family_id, чтобы запросы семьи читали только её строки (app/tenancy.py)
+CREATE TABLE IF NOT EXISTS families (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Семья по умолчанию
+INSERT INTO families(id, name) VALUES (1, 'Моя семья') ON CONFLICT DO NOTHING;
+SELECT setval(pg_get_serial_sequence('families', 'id'), (SELECT max(id) FROM families));
+
+-- Пользователи Telegram; при первом входе пользователь получает семью по
+-- умолчанию или новую (app/auth.py), в общую переходит по приглашению
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    telegram_id BIGINT NOT NULL UNIQUE,
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    first_name TEXT,
+    username TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_users_family_id ON users (family_id);
+
 CREATE TABLE IF NOT EXISTS categories (
     id SERIAL PRIMARY KEY,
-    name TEXT NOT NULL UNIQUE
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    CONSTRAINT uq_categories_family_name UNIQUE (family_id, name)
 );
 
 -- Счета (кошельки, карты и т.д.)
 CREATE TABLE IF NOT EXISTS accounts (
     id SERIAL PRIMARY KEY,
-    name TEXT NOT NULL UNIQUE,
-    balance NUMERIC(14,2) NOT NULL DEFAULT 0
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    balance NUMERIC(14,2) NOT NULL DEFAULT 0,
+    CONSTRAINT uq_accounts_family_name UNIQUE (family_id, name)
 );
 
--- Таблица расходов
+-- Таблица расходов, секционированная по месяцам spent_at. Секции на
+-- ближайшие месяцы создаёт приложение (app/partitions.py); строки вне
+-- созданных секций попадают в expenses_default и переносятся оттуда при
+-- создании нужной секции. Ключ секционирования входит в первичный ключ.
+-- TIMESTAMPTZ — как у параметров запросов, иначе сравнение идёт через
+-- приведение столбца и секции не отсекаются
 CREATE TABLE IF NOT EXISTS expenses (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
     amount NUMERIC(14,2) NOT NULL,
     category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
     account_id INTEGER REFERENCES accounts(id) ON DELETE SET NULL,
     description TEXT,
-    spent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
+    spent_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, spent_at)
+) PARTITION BY RANGE (spent_at);
+
+CREATE TABLE IF NOT EXISTS expenses_default PARTITION OF expenses DEFAULT;
+
+-- Индексы под keyset-пагинацию (spent_at, id) и фильтры списка расходов
+CREATE INDEX IF NOT EXISTS ix_expenses_family_spent_at_id ON expenses (family_id, spent_at, id);
+CREATE INDEX IF NOT EXISTS ix_expenses_family_account_spent_at_id ON expenses (family_id, account_id, spent_at, id);
+CREATE INDEX IF NOT EXISTS ix_expenses_family_category_spent_at_id ON expenses (family_id, category_id, spent_at, id);
 
 -- Seed default categories
-INSERT INTO categories(name) VALUES ('Продукты') ON CONFLICT DO NOTHING;
-INSERT INTO categories(name) VALUES ('Транспорт') ON CONFLICT DO NOTHING;
-INSERT INTO categories(name) VALUES ('Развлечения') ON CONFLICT DO NOTHING;
+INSERT INTO categories(family_id, name) VALUES (1, 'Продукты') ON CONFLICT DO NOTHING;
+INSERT INTO categories(family_id, name) VALUES (1, 'Транспорт') ON CONFLICT DO NOTHING;
+INSERT INTO categories(family_id, name) VALUES (1, 'Развлечения') ON CONFLICT DO NOTHING;
 
 -- =============================================================
 -- Дополнительные таблицы для расширенного учёта семейного бюджета
 -- =============================================================
 
--- Доходы
+-- Доходы, секционированы по месяцам received_at так же, как расходы
 CREATE TABLE IF NOT EXISTS incomes (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
     amount NUMERIC(14,2) NOT NULL,
     category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
     account_id INTEGER REFERENCES accounts(id) ON DELETE SET NULL,
     description TEXT,
-    received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
+    received_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, received_at)
+) PARTITION BY RANGE (received_at);
+
+CREATE TABLE IF NOT EXISTS incomes_default PARTITION OF incomes DEFAULT;
+
+CREATE INDEX IF NOT EXISTS ix_incomes_family_received_at_id ON incomes (family_id, received_at, id);
+CREATE INDEX IF NOT EXISTS ix_incomes_family_account_received_at_id ON incomes (family_id, account_id, received_at, id);
 
--- Переводы между счетами
+-- Переводы между счетами. Время — TIMESTAMPTZ, как у расходов и доходов:
+-- остаток на момент и выписки сравнивают его с теми же границами UTC
 CREATE TABLE IF NOT EXISTS transfers (
     id SERIAL PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
     from_account_id INTEGER REFERENCES accounts(id) ON DELETE SET NULL,
     to_account_id INTEGER REFERENCES accounts(id) ON DELETE SET NULL,
     amount NUMERIC(14,2) NOT NULL,
     description TEXT,
-    transferred_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    transferred_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
     CHECK (from_account_id <> to_account_id)
 );
 
+-- Индексы под список и выписку по счёту: обе стороны перевода ищутся отдельно
+CREATE INDEX IF NOT EXISTS ix_transfers_family_transferred_at_id ON transfers (family_id, transferred_at, id);
+CREATE INDEX IF NOT EXISTS ix_transfers_family_from_account_transferred_at_id ON transfers (family_id, from_account_id, transferred_at, id);
+CREATE INDEX IF NOT EXISTS ix_transfers_family_to_account_transferred_at_id ON transfers (family_id, to_account_id, transferred_at, id);
+
 -- Месячные бюджеты по категориям
 CREATE TABLE IF NOT EXISTS budgets (
     id SERIAL PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
     category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
     month DATE NOT NULL,
     planned NUMERIC(14,2) NOT NULL,
-    UNIQUE(category_id, month)
+    UNIQUE(family_id, category_id, month)
+);
+
+CREATE INDEX IF NOT EXISTS ix_budgets_family_month ON budgets (family_id, month);
+
+-- Помесячные итоги по (категория, счёт), поддерживаются вместе с расходами и доходами.
+-- 0 в category_id/account_id — «без категории»/«без счёта»
+CREATE TABLE IF NOT EXISTS category_month_rollups (
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    category_id INTEGER NOT NULL DEFAULT 0,
+    account_id INTEGER NOT NULL DEFAULT 0,
+    expense_total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    income_total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, month, category_id, account_id)
+);
+
+-- Остатки счетов на начало каждого закрытого месяца. Семья не хранится:
+-- строки читаются только по счёту, а счёт принадлежит одной семье
+CREATE TABLE IF NOT EXISTS account_balance_checkpoints (
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    balance NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (account_id, month)
+);
+
+-- Состояние инкрементальной сверки остатков: подтверждённый остаток и
+-- наибольшие id уже проверенных операций
+CREATE TABLE IF NOT EXISTS account_reconciliations (
+    account_id INTEGER PRIMARY KEY REFERENCES accounts(id) ON DELETE CASCADE,
+    balance NUMERIC(14,2) NOT NULL,
+    expense_id INTEGER NOT NULL DEFAULT 0,
+    income_id INTEGER NOT NULL DEFAULT 0,
+    transfer_id INTEGER NOT NULL DEFAULT 0,
+    checked_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ключи Idempotency-Key со снимками ответов; просроченные удаляет бэкенд
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (family_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+
+-- Счётчики изменений таблиц по семьям для ETag / условных GET
+CREATE TABLE IF NOT EXISTS table_versions (
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, name)
 );
 
 -- Seed default accounts
-INSERT INTO accounts(name) VALUES ('Наличные') ON CONFLICT DO NOTHING;
-INSERT INTO accounts(name) VALUES ('Банковская карта') ON CONFLICT DO NOTHING;
+INSERT INTO accounts(family_id, name) VALUES (1, 'Наличные') ON CONFLICT DO NOTHING;
+INSERT INTO accounts(family_id, name) VALUES (1, 'Банковская карта') ON CONFLICT DO NOTHING;
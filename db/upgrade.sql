@@ -0,0 +1,188 @@
+-- Обновление существующей базы до схемы db/init.sql: семьи, секционирование
+-- expenses/incomes, TIMESTAMPTZ и новые таблицы. Скрипт идемпотентен и
+-- выполняется одной транзакцией; повторный запуск ничего не меняет.
+-- Новая база создаётся из init.sql, этот скрипт ей не нужен.
+
+BEGIN;
+
+-- Семьи и семья по умолчанию, которой достаются все существующие данные
+CREATE TABLE IF NOT EXISTS families (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO families(id, name) VALUES (1, 'Моя семья') ON CONFLICT DO NOTHING;
+SELECT setval(pg_get_serial_sequence('families', 'id'), (SELECT max(id) FROM families));
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    telegram_id BIGINT NOT NULL UNIQUE,
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    first_name TEXT,
+    username TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_users_family_id ON users (family_id);
+
+-- family_id: столбец, перенос существующих строк в семью по умолчанию, NOT NULL
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS family_id INTEGER REFERENCES families(id) ON DELETE CASCADE;
+UPDATE categories SET family_id = 1 WHERE family_id IS NULL;
+ALTER TABLE categories ALTER COLUMN family_id SET NOT NULL;
+
+ALTER TABLE accounts ADD COLUMN IF NOT EXISTS family_id INTEGER REFERENCES families(id) ON DELETE CASCADE;
+UPDATE accounts SET family_id = 1 WHERE family_id IS NULL;
+ALTER TABLE accounts ALTER COLUMN family_id SET NOT NULL;
+
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS family_id INTEGER REFERENCES families(id) ON DELETE CASCADE;
+UPDATE expenses SET family_id = 1 WHERE family_id IS NULL;
+ALTER TABLE expenses ALTER COLUMN family_id SET NOT NULL;
+
+ALTER TABLE incomes ADD COLUMN IF NOT EXISTS family_id INTEGER REFERENCES families(id) ON DELETE CASCADE;
+UPDATE incomes SET family_id = 1 WHERE family_id IS NULL;
+ALTER TABLE incomes ALTER COLUMN family_id SET NOT NULL;
+
+ALTER TABLE transfers ADD COLUMN IF NOT EXISTS family_id INTEGER REFERENCES families(id) ON DELETE CASCADE;
+UPDATE transfers SET family_id = 1 WHERE family_id IS NULL;
+ALTER TABLE transfers ALTER COLUMN family_id SET NOT NULL;
+
+ALTER TABLE budgets ADD COLUMN IF NOT EXISTS family_id INTEGER REFERENCES families(id) ON DELETE CASCADE;
+UPDATE budgets SET family_id = 1 WHERE family_id IS NULL;
+ALTER TABLE budgets ALTER COLUMN family_id SET NOT NULL;
+
+-- Уникальность имён и бюджетов — в пределах семьи. Ограничения
+-- пересоздаются, поэтому повторный запуск не падает на существующих
+ALTER TABLE categories
+    DROP CONSTRAINT IF EXISTS categories_name_key,
+    DROP CONSTRAINT IF EXISTS uq_categories_family_name,
+    ADD CONSTRAINT uq_categories_family_name UNIQUE (family_id, name);
+
+ALTER TABLE accounts
+    DROP CONSTRAINT IF EXISTS accounts_name_key,
+    DROP CONSTRAINT IF EXISTS uq_accounts_family_name,
+    ADD CONSTRAINT uq_accounts_family_name UNIQUE (family_id, name);
+
+ALTER TABLE budgets
+    DROP CONSTRAINT IF EXISTS budgets_category_id_month_key,
+    DROP CONSTRAINT IF EXISTS budgets_family_id_category_id_month_key,
+    ADD CONSTRAINT budgets_family_id_category_id_month_key UNIQUE (family_id, category_id, month);
+
+-- TIMESTAMP -> TIMESTAMPTZ. Прежние значения без пояса записаны в поясе
+-- сервера базы (UTC в образе postgres) и читаются как UTC. Столбцы, уже
+-- имеющие тип TIMESTAMPTZ, пропускаются: повторное приведение сдвинуло бы время
+DO $$
+DECLARE
+    col RECORD;
+BEGIN
+    FOR col IN
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND (table_name, column_name) IN (
+              ('expenses', 'spent_at'), ('incomes', 'received_at'), ('transfers', 'transferred_at'),
+              ('account_reconciliations', 'checked_at'))
+          AND data_type = 'timestamp without time zone'
+    LOOP
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN %I TYPE TIMESTAMPTZ USING %I AT TIME ZONE ''UTC''',
+                       col.table_name, col.column_name, col.column_name);
+    END LOOP;
+END $$;
+
+-- Секционирование expenses и incomes. Обычную таблицу нельзя сделать
+-- секционированной на месте: строки копируются в новую таблицу с той же
+-- последовательностью id (на id ссылается состояние сверки), сначала в
+-- секцию DEFAULT. По месяцам их разносит приложение при старте
+-- (app/partitions.py) или python -m app.partitions.
+-- Первичный ключ создаётся после удаления старой таблицы: имя его индекса
+-- совпадает со старым
+DO $$
+DECLARE
+    part RECORD;
+    seq TEXT;
+BEGIN
+    FOR part IN SELECT * FROM (VALUES ('expenses', 'spent_at'), ('incomes', 'received_at')) AS t(tbl, col) LOOP
+        IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(part.tbl)) THEN
+            EXECUTE format('ALTER TABLE %I RENAME TO %I', part.tbl, part.tbl || '_unpartitioned');
+            seq := pg_get_serial_sequence(part.tbl || '_unpartitioned', 'id');
+            EXECUTE format(
+                'CREATE TABLE %I ('
+                '    id INTEGER NOT NULL DEFAULT nextval(%L::regclass),'
+                '    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,'
+                '    amount NUMERIC(14,2) NOT NULL,'
+                '    category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,'
+                '    account_id INTEGER REFERENCES accounts(id) ON DELETE SET NULL,'
+                '    description TEXT,'
+                '    %I TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP'
+                ') PARTITION BY RANGE (%I)',
+                part.tbl, seq, part.col, part.col);
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', part.tbl || '_default', part.tbl);
+            EXECUTE format(
+                'INSERT INTO %I (id, family_id, amount, category_id, account_id, description, %I) '
+                'SELECT id, family_id, amount, category_id, account_id, description, %I FROM %I',
+                part.tbl, part.col, part.col, part.tbl || '_unpartitioned');
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, part.tbl);
+            EXECUTE format('DROP TABLE %I', part.tbl || '_unpartitioned');
+            EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, %I)', part.tbl, part.col);
+        END IF;
+    END LOOP;
+END $$;
+
+-- Индексы, начинающиеся с family_id
+CREATE INDEX IF NOT EXISTS ix_expenses_family_spent_at_id ON expenses (family_id, spent_at, id);
+CREATE INDEX IF NOT EXISTS ix_expenses_family_account_spent_at_id ON expenses (family_id, account_id, spent_at, id);
+CREATE INDEX IF NOT EXISTS ix_expenses_family_category_spent_at_id ON expenses (family_id, category_id, spent_at, id);
+CREATE INDEX IF NOT EXISTS ix_incomes_family_received_at_id ON incomes (family_id, received_at, id);
+CREATE INDEX IF NOT EXISTS ix_incomes_family_account_received_at_id ON incomes (family_id, account_id, received_at, id);
+CREATE INDEX IF NOT EXISTS ix_transfers_family_transferred_at_id ON transfers (family_id, transferred_at, id);
+CREATE INDEX IF NOT EXISTS ix_transfers_family_from_account_transferred_at_id ON transfers (family_id, from_account_id, transferred_at, id);
+CREATE INDEX IF NOT EXISTS ix_transfers_family_to_account_transferred_at_id ON transfers (family_id, to_account_id, transferred_at, id);
+CREATE INDEX IF NOT EXISTS ix_budgets_family_month ON budgets (family_id, month);
+
+-- Новые таблицы, как в db/init.sql
+CREATE TABLE IF NOT EXISTS category_month_rollups (
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    category_id INTEGER NOT NULL DEFAULT 0,
+    account_id INTEGER NOT NULL DEFAULT 0,
+    expense_total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    income_total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, month, category_id, account_id)
+);
+
+CREATE TABLE IF NOT EXISTS account_balance_checkpoints (
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    balance NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (account_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS account_reconciliations (
+    account_id INTEGER PRIMARY KEY REFERENCES accounts(id) ON DELETE CASCADE,
+    balance NUMERIC(14,2) NOT NULL,
+    expense_id INTEGER NOT NULL DEFAULT 0,
+    income_id INTEGER NOT NULL DEFAULT 0,
+    transfer_id INTEGER NOT NULL DEFAULT 0,
+    checked_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (family_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    family_id INTEGER NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, name)
+);
+
+COMMIT;
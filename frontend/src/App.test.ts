@@ -12,28 +12,17 @@ describe('App', () => {
     
     // Настраиваем моки для fetch
     mockFetch.mockImplementation((url: string) => {
-      if (url.includes('/api/expenses')) {
+      if (url.includes('/api/dashboard')) {
         return Promise.resolve({
-          json: () => Promise.resolve([
-            { id: '1', description: 'Продукты', amount: 1000, spent_at: '2025-06-28' }
-          ])
+          ok: true,
+          json: () => Promise.resolve({
+            accounts: [{ id: '1', name: 'Наличные', balance: 5000 }],
+            expenses: [{ id: '1', description: 'Продукты', amount: 1000, spent_at: '2025-06-28' }],
+            summary: [{ category: 'Продукты', total: 1000 }]
+          })
         });
       }
-      if (url.includes('/api/expenses/summary')) {
-        return Promise.resolve({
-          json: () => Promise.resolve([
-            { category: 'Продукты', total: 1000 }
-          ])
-        });
-      }
-      if (url.includes('/api/accounts')) {
-        return Promise.resolve({
-          json: () => Promise.resolve([
-            { id: '1', name: 'Наличные', balance: 5000 }
-          ])
-        });
-      }
-      return Promise.resolve({ json: () => Promise.resolve([]) });
+      return Promise.resolve({ ok: true, json: () => Promise.resolve([]) });
     });
   });
 
@@ -49,9 +38,9 @@ describe('App', () => {
     const expensesButton = screen.getByText('Расходы');
     expect(expensesButton).toHaveClass('active');
     
-    // Проверяем, что запрос к API выполнен
+    // Проверяем, что данные первого экрана запрошены одним запросом
     expect(global.fetch).toHaveBeenCalledWith(
-      expect.stringMatching(/\/api\/expenses\/.+/), 
+      expect.stringMatching(/\/api\/dashboard\/.+/), 
       expect.anything()
     );
   });
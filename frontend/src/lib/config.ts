@@ -53,3 +53,25 @@ if (import.meta.env.PROD && typeof window !== 'undefined') {
     return originalFetch(input, init);
   };
 }
+
+// --- Подпись Telegram (initData) в каждом запросе к API ---
+// Бэкенд проверяет её и по ней определяет пользователя и его семью
+if (typeof window !== 'undefined') {
+  const fetchWithBase = window.fetch.bind(window);
+
+  window.fetch = (input: RequestInfo | URL, init?: RequestInit): Promise<Response> => {
+    // @ts-ignore – Telegram WebApp SDK подключается скриптом в index.html
+    const initData: string | undefined = window.Telegram?.WebApp?.initData;
+    const url = typeof input === 'string' ? input : input instanceof URL ? input.toString() : input.url;
+
+    const isApi = url.startsWith('/api/') || (!!API_BASE_URL && url.startsWith(`${API_BASE_URL}/api/`));
+
+    if (initData && isApi) {
+      const headers = new Headers(init?.headers ?? (input instanceof Request ? input.headers : undefined));
+      headers.set('Authorization', `tma ${initData}`);
+      init = { ...init, headers };
+    }
+
+    return fetchWithBase(input, init);
+  };
+}
@@ -0,0 +1,79 @@
+/**
+ * Подписка на ленту изменений /api/events (Server-Sent Events)
+ */
+import { API_BASE_URL } from './config';
+import type { ChangeEvent } from './types';
+import { debug, warn } from './logger';
+
+// Пауза перед переподключением после обрыва, мс
+const RECONNECT_DELAY = 3000;
+
+/**
+ * Поток читается через fetch, а не EventSource: EventSource не умеет
+ * передавать заголовок Authorization с подписью Telegram
+ * @param onEvent - обработчик каждого события
+ * @param onOpen - вызывается при каждом (пере)подключении
+ * @param onClose - вызывается при обрыве соединения
+ * @returns функция отписки
+ */
+export const subscribeChanges = (
+  onEvent: (change: ChangeEvent) => void,
+  onOpen: (reconnected: boolean) => void,
+  onClose: () => void
+): (() => void) => {
+  const controller = new AbortController();
+  let stopped = false;
+
+  const run = async () => {
+    let reconnected = false;
+    while (!stopped) {
+      let opened = false;
+      try {
+        const res = await fetch(`${API_BASE_URL}/api/events`, {
+          headers: { Accept: 'text/event-stream' },
+          signal: controller.signal
+        });
+        if (!res.ok || !res.body) {
+          throw new Error(`API error: ${res.status}`);
+        }
+        debug('Лента изменений подключена');
+        opened = true;
+        onOpen(reconnected);
+
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let end: number;
+          // События разделяются пустой строкой; строки-комментарии (": keepalive") пропускаются
+          while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            const data = block
+              .split('\n')
+              .filter(line => line.startsWith('data:'))
+              .map(line => line.slice(5).trimStart())
+              .join('\n');
+            if (data) {
+              onEvent(JSON.parse(data));
+            }
+          }
+        }
+      } catch (err) {
+        if (stopped) return;
+        warn('Лента изменений недоступна:', err);
+      }
+      if (opened) onClose();
+      reconnected = true;
+      await new Promise(resolve => setTimeout(resolve, RECONNECT_DELAY));
+    }
+  };
+
+  run();
+  return () => {
+    stopped = true;
+    controller.abort();
+  };
+};
@@ -32,3 +32,12 @@ export interface SummaryItem {
   category: string;
   total: number;
 }
+
+// Событие ленты /api/events: что изменилось и новые остатки затронутых счетов
+export interface ChangeEvent {
+  entity: 'expenses' | 'incomes' | 'transfers' | 'accounts' | 'categories' | 'budgets' | 'all';
+  op: 'create' | 'delete' | 'update' | 'bulk' | 'reset';
+  id: number | null;
+  accounts: { id: number; balance: string }[];
+  data?: any;
+}